@@ -0,0 +1,140 @@
+"""Collection reports for chairmen, computed on pandas frames.
+
+Completed payments, dues and member types are pulled with projected,
+batched cursors into columnar frames, and every report is a vectorized
+group-by over them. Results are cached per ``(society_id, version, day)``.
+The society version is bumped on every payment state change and overdue
+ageing only moves with the date, so a cached report is never stale and
+repeat views skip Mongo entirely.
+"""
+import asyncio
+import time
+from datetime import date, datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from billing import DUES_COLLECTION
+from cache import TTLCache
+from codec import utcnow
+
+ANALYTICS_BATCH_SIZE = 5000
+AGEING_BUCKETS = [
+    (-np.inf, 0, "current"),
+    (0, 30, "1-30"),
+    (30, 60, "31-60"),
+    (60, 90, "61-90"),
+    (90, np.inf, "90+"),
+]
+
+report_cache = TTLCache(maxsize=256, ttl=3600)
+
+
+async def _frame(cursor, columns: List[str]) -> pd.DataFrame:
+    """Drain ``cursor`` batch by batch into one frame with exactly ``columns``."""
+    chunks = []
+    while True:
+        batch = await cursor.to_list(ANALYTICS_BATCH_SIZE)
+        if not batch:
+            break
+        chunks.append(pd.DataFrame.from_records(batch, columns=columns))
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in columns})
+    return pd.concat(chunks, ignore_index=True)
+
+
+async def load_frames(db, society_id: str, session=None) -> dict:
+    members = await _frame(
+        db.users.find({"society_id": society_id, "role": "user"}, {"_id": 0, "id": 1, "user_type": 1}, session=session),
+        ["id", "user_type"]
+    )
+    payments = await _frame(
+        db.payments.find(
+            {"society_id": society_id, "status": "completed"},
+            {"_id": 0, "user_id": 1, "month": 1, "amount_paise": 1, "amount": 1},
+            session=session
+        ).batch_size(ANALYTICS_BATCH_SIZE),
+        ["user_id", "month", "amount_paise", "amount"]
+    )
+    dues = await _frame(
+        db[DUES_COLLECTION].find(
+            {"society_id": society_id},
+            {"_id": 0, "user_id": 1, "month": 1, "amount_paise": 1, "amount": 1, "status": 1},
+            session=session
+        ).batch_size(ANALYTICS_BATCH_SIZE),
+        ["user_id", "month", "amount_paise", "amount", "status"]
+    )
+
+    user_types = members.set_index("id")["user_type"]
+    for frame in (payments, dues):
+        # Sums run over exact integer paise; reports are in rupees. Unmigrated rows carry rupees in ``amount``
+        legacy = (pd.to_numeric(frame["amount"], errors="coerce") * 100).round()
+        paise = pd.to_numeric(frame.pop("amount_paise"), errors="coerce").fillna(legacy).fillna(0).astype("int64")
+        frame["amount"] = paise
+        frame["user_type"] = frame["user_id"].map(user_types).fillna("unknown")
+    return {"payments": payments, "dues": dues}
+
+
+def _collection_rate(payments: pd.DataFrame, dues: pd.DataFrame, by: str) -> pd.DataFrame:
+    collected = payments.groupby(by).agg(paid_count=("amount", "size"), collected=("amount", "sum"))
+    billed = dues.groupby(by).agg(billed_count=("amount", "size"), billed=("amount", "sum"))
+    report = collected.join(billed, how="outer").fillna(0).sort_index()
+    # The outer join turns counts missing on one side into NaN, and with them the whole column into floats
+    report[["paid_count", "billed_count"]] = report[["paid_count", "billed_count"]].astype("int64")
+    # Months before billing existed have nothing billed; their rate is unknown, not zero
+    report["collection_rate"] = report["collected"] / report["billed"].where(report["billed"] > 0)
+    return report
+
+
+def overdue_ageing(dues: pd.DataFrame, today: Optional[datetime] = None) -> pd.DataFrame:
+    """Unpaid dues bucketed by days since the end of the billed month."""
+    today = pd.Timestamp(today or utcnow()).tz_localize(None).normalize()
+    unpaid = dues[dues["status"] == "due"]
+    due_date = pd.to_datetime(unpaid["month"] + "-01", format="%Y-%m-%d", errors="coerce") + pd.offsets.MonthBegin(1)
+    days = (today - due_date).dt.days
+    edges = [AGEING_BUCKETS[0][0]] + [upper for _, upper, _ in AGEING_BUCKETS]
+    labels = [label for _, _, label in AGEING_BUCKETS]
+    bucket = pd.cut(days, bins=edges, labels=labels)
+    report = unpaid.groupby(bucket, observed=False).agg(count=("amount", "size"), amount=("amount", "sum"))
+    report.index.name = "bucket"
+    return report
+
+
+def compute_reports(frames: dict, today: Optional[date] = None) -> dict:
+    payments, dues = frames["payments"], frames["dues"]
+    return {
+        "by_month": _collection_rate(payments, dues, "month"),
+        "by_user_type": _collection_rate(payments, dues, "user_type"),
+        "overdue_ageing": overdue_ageing(dues, today),
+    }
+
+
+def _records(frame: pd.DataFrame) -> List[dict]:
+    frame = frame.reset_index()
+    for column in ("collected", "billed", "amount"):
+        if column in frame:
+            frame[column] = frame[column] / 100
+    frame = frame.round(4)
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+async def collection_report(db, society_id: str, version: int, today: Optional[date] = None, session=None) -> dict:
+    """Reports for ``society_id`` at ``version``, ageing dues as of ``today`` (UTC, default now)."""
+    today = today or utcnow().date()
+    key = (society_id, version, today)
+    reports = report_cache.get(key)
+    cached = reports is not None
+    started = time.perf_counter()
+    if not cached:
+        frames = await load_frames(db, society_id, session)
+        # Group-bys over years of history are CPU-bound; keep them off the event loop
+        reports = await asyncio.to_thread(compute_reports, frames, today)
+        report_cache.set(key, reports)
+    return {
+        "society_id": society_id,
+        "version": version,
+        "cached": cached,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        **{name: _records(frame) for name, frame in reports.items()},
+    }
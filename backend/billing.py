@@ -0,0 +1,205 @@
+"""Month-end billing run.
+
+Writes one ``dues`` record per resident per month so chairmen can see who
+owes what before anyone opens the payment screen. Members are streamed per
+society in batches and written with unordered ``bulk_write`` upserts keyed
+on ``(user_id, month)``, so re-running a month never duplicates or
+overwrites a due. Finished societies are recorded in ``billing_progress``
+and skipped when an interrupted run is resumed.
+
+    python billing.py 2026-10 [--society ID] [--concurrency 16] [--batch-size 1000]
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Callable, Iterable, Optional
+
+from pymongo import UpdateOne
+
+from codec import CLIENT_OPTIONS, store_datetime, stored_paise, utcnow
+from partitions import SocietyRouter, for_society
+
+logger = logging.getLogger(__name__)
+
+DUES_COLLECTION = "dues"
+PROGRESS_COLLECTION = "billing_progress"
+
+
+def due_amount(society: dict, user_type: Optional[str]) -> Optional[int]:
+    """The monthly rate for ``user_type`` in paise, or None if the chairman has not set it."""
+    if user_type == "owner":
+        return stored_paise(society, 'owner_maintenance_rate')
+    return stored_paise(society, 'tenant_maintenance_rate')
+
+
+async def bill_society(db, society: dict, month: str, batch_size: int = 1000) -> dict:
+    """Create missing dues for every member of one society. Idempotent."""
+    created = 0
+    skipped = 0
+    batch = []
+    now = store_datetime(utcnow())
+
+    async def flush():
+        nonlocal created, batch
+        if batch:
+            result = await db[DUES_COLLECTION].bulk_write(batch, ordered=False)
+            created += result.upserted_count
+            batch = []
+
+    members = db.users.find(
+        {"society_id": society['id'], "role": "user"},
+        {"_id": 0, "id": 1, "user_type": 1, "name": 1, "phone_number": 1}
+    ).batch_size(batch_size)
+    async for member in members:
+        amount = due_amount(society, member.get('user_type'))
+        if amount is None:
+            skipped += 1
+            continue
+        batch.append(UpdateOne(
+            {"user_id": member['id'], "month": month},
+            {"$setOnInsert": {
+                "id": str(uuid.uuid4()),
+                "society_id": society['id'],
+                "amount_paise": amount,
+                "user_type": member.get('user_type'),
+                "user_name": member.get('name'),
+                "user_phone": member.get('phone_number'),
+                "status": "due",
+                "created_at": now
+            }},
+            upsert=True
+        ))
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+
+    await db[PROGRESS_COLLECTION].update_one(
+        {"month": month, "society_id": society['id']},
+        {"$set": {"created": created, "skipped": skipped, "finished_at": now}},
+        upsert=True
+    )
+    return {"society_id": society['id'], "created": created, "skipped": skipped}
+
+
+async def run_billing_cycle(
+    db,
+    month: str,
+    society_ids: Optional[Iterable[str]] = None,
+    batch_size: int = 1000,
+    concurrency: int = 8,
+    progress: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """Bill every (or the given) society for ``month``, resuming past finished ones."""
+    done = set(await db[PROGRESS_COLLECTION].distinct("society_id", {"month": month}))
+    query = {"id": {"$in": list(society_ids)}} if society_ids is not None else {}
+    projection = {
+        "_id": 0, "id": 1,
+        "owner_maintenance_rate_paise": 1, "tenant_maintenance_rate_paise": 1,
+        "owner_maintenance_rate": 1, "tenant_maintenance_rate": 1,
+    }
+
+    totals = {"month": month, "societies": 0, "resumed_past": len(done), "created": 0, "skipped": 0}
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def bill(society):
+        async with semaphore:
+            result = await bill_society(for_society(db, society['id']), society, month, batch_size)
+        totals["societies"] += 1
+        totals["created"] += result["created"]
+        totals["skipped"] += result["skipped"]
+        if progress:
+            progress({**totals, "elapsed_s": round(time.monotonic() - started, 1)})
+
+    async for society in db.societies.find(query, projection).sort("id", 1):
+        if society['id'] in done:
+            continue
+        # Keep at most a few batches of societies in flight
+        while len(tasks) >= concurrency * 2:
+            finished, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                task.result()
+        tasks.add(asyncio.create_task(bill(society)))
+    if tasks:
+        for task in (await asyncio.wait(tasks))[0]:
+            task.result()
+
+    totals["elapsed_s"] = round(time.monotonic() - started, 1)
+    logger.info(f"Billing run for {month} finished: {totals}")
+    return totals
+
+
+async def mark_due_paid(db, payment: dict) -> bool:
+    """Record a completed payment against its due, creating it if billing has not run yet.
+
+    A payment smaller than the billed due leaves it unpaid; returns whether it was settled.
+    """
+    paid = stored_paise(payment, 'amount')
+    due = await db[DUES_COLLECTION].find_one(
+        {"user_id": payment['user_id'], "month": payment['month']},
+        {"_id": 0, "amount_paise": 1, "amount": 1}
+    )
+    owed = stored_paise(due, 'amount') if due else None
+    if owed is not None and (paid is None or paid < owed):
+        logger.warning(f"Payment {payment['id']} of {paid} paise does not cover the {owed} paise due for {payment['month']}")
+        return False
+    await db[DUES_COLLECTION].update_one(
+        {"user_id": payment['user_id'], "month": payment['month']},
+        {
+            "$set": {"status": "paid", "payment_id": payment['id']},
+            "$setOnInsert": {
+                "id": str(uuid.uuid4()),
+                "society_id": payment['society_id'],
+                "amount_paise": stored_paise(payment, 'amount'),
+                "created_at": store_datetime(utcnow())
+            }
+        },
+        upsert=True
+    )
+    return True
+
+
+async def _main(month: str, society_id: Optional[str], concurrency: int, batch_size: int) -> None:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], **CLIENT_OPTIONS)
+
+    last_report = 0.0
+
+    def report(state: dict) -> None:
+        nonlocal last_report
+        if time.monotonic() - last_report >= 2:
+            last_report = time.monotonic()
+            print(f"{state['societies']} societies, {state['created']} dues created, {state['elapsed_s']}s")
+
+    try:
+        totals = await run_billing_cycle(
+            SocietyRouter.from_env(client),
+            month,
+            society_ids=[society_id] if society_id else None,
+            batch_size=batch_size,
+            concurrency=concurrency,
+            progress=report
+        )
+        print(totals)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Generate maintenance dues for a month")
+    parser.add_argument("month", help="YYYY-MM")
+    parser.add_argument("--society")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(_main(args.month, args.society, args.concurrency, args.batch_size))
@@ -0,0 +1,102 @@
+"""Small in-process LRU cache with per-entry expiry.
+
+Each worker process has its own caches. ``InvalidationFeed`` carries
+invalidations between them through MongoDB: a write on one worker drops
+the key there at once and on every other worker within ``sync_seconds``.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Hashable, Optional
+
+from codec import utcnow
+
+logger = logging.getLogger(__name__)
+
+INVALIDATIONS_COLLECTION = "cache_invalidations"
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class InvalidationFeed:
+    def __init__(self, db, caches: Dict[str, TTLCache], sync_seconds: float = 1.0, retain_seconds: float = 3600):
+        self.db = db
+        self.caches = caches
+        self.sync_seconds = sync_seconds
+        self.retain_seconds = retain_seconds
+        self.pulled = 0
+
+    def _drop(self, cache: str, key: Optional[Hashable]) -> None:
+        if key is None:
+            self.caches[cache].clear()
+        else:
+            self.caches[cache].invalidate(key)
+
+    async def publish(self, cache: str, key: Optional[Hashable] = None) -> None:
+        """Drop ``key`` (or everything, when None) from ``cache`` here and in every other worker."""
+        self._drop(cache, key)
+        now = utcnow()
+        await self.db[INVALIDATIONS_COLLECTION].insert_one({
+            "cache": cache,
+            "key": key,
+            "at": now,
+            "expires_at": now + timedelta(seconds=self.retain_seconds)
+        })
+
+    async def _pull(self, since) -> Any:
+        now = utcnow()
+        async for doc in self.db[INVALIDATIONS_COLLECTION].find({"at": {"$gt": since}}, {"_id": 0, "cache": 1, "key": 1}):
+            if doc['cache'] in self.caches:
+                self._drop(doc['cache'], doc.get('key'))
+                self.pulled += 1
+        return now
+
+    async def run_sync(self) -> None:
+        """Apply other workers' invalidations; run as a background task."""
+        synced_to = utcnow()
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            try:
+                # Overlap one interval so clock skew, or a read racing the write, can't keep a stale entry
+                synced_to = await self._pull(synced_to - timedelta(seconds=self.sync_seconds))
+            except Exception as e:
+                logger.error(f"Cache invalidation sync failed: {e}")
@@ -0,0 +1,122 @@
+"""How values cross the wire and into MongoDB.
+
+Responses are encoded with orjson. It serialises datetimes, UUIDs and
+nested dicts/lists in C, so a handler can return documents as read from
+Motor without building Pydantic models or walking them with
+``jsonable_encoder``. Anything orjson does not know is written with
+``str``, as ``json.dumps(default=str)`` did before.
+
+Storage uses native BSON types:
+
+* datetimes are BSON dates in UTC. Every client is opened with
+  ``CLIENT_OPTIONS`` so they read back as aware datetimes.
+* money is an integer number of paise in ``<field>_paise`` (``amount`` is
+  stored as ``amount_paise``). The API keeps speaking rupees, so
+  ``public_money`` converts documents on their way out and ``to_document``
+  on their way in.
+
+Documents written before ``migrate_types.py`` ran still hold ISO strings
+and rupee floats. ``load_datetime`` and ``stored_paise`` read both forms.
+"""
+from datetime import datetime, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Optional, Union
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+CLIENT_OPTIONS = {"tz_aware": True, "tzinfo": timezone.utc}
+
+# Fields the API expresses in rupees and storage in integer paise
+MONEY_FIELDS = ("amount", "owner_maintenance_rate", "tenant_maintenance_rate", "paid_amount", "pending_amount")
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def store_datetime(value: datetime) -> datetime:
+    """The stored form of a datetime: a BSON date, always UTC."""
+    return value.astimezone(timezone.utc)
+
+
+def load_datetime(value: Union[str, datetime]) -> datetime:
+    """An aware UTC datetime from its stored form, including pre-migration ISO strings."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def to_paise(rupees: Union[int, float, str, Decimal]) -> int:
+    # Through Decimal, so 19.99 is 1999 paise and not int(1998.9999999999998)
+    return int((Decimal(str(rupees)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_rupees(paise: int) -> float:
+    return paise / 100
+
+
+def stored_paise(doc: dict, field: str) -> Optional[int]:
+    """``field`` of a stored document in paise, or None when it is unset.
+
+    Ledger rows can hold both forms mid-migration (handlers ``$inc`` the
+    paise field before the row's rupee total is folded in), so both count.
+    """
+    paise, rupees = doc.get(f"{field}_paise"), doc.get(field)
+    if paise is None and rupees is None:
+        return None
+    return (paise or 0) + (to_paise(rupees) if rupees is not None else 0)
+
+
+def public_money(doc: dict) -> dict:
+    """Rewrite ``<field>_paise`` as rupees in ``field``, in place, for a response."""
+    for field in MONEY_FIELDS:
+        key = f"{field}_paise"
+        if key in doc:
+            paise = stored_paise(doc, field)
+            del doc[key]
+            doc[field] = None if paise is None else to_rupees(paise)
+    return doc
+
+
+def to_document(model: BaseModel) -> dict:
+    """``model`` as a document ready to insert."""
+    doc = model.model_dump()
+    for key, value in doc.items():
+        if isinstance(value, datetime):
+            doc[key] = store_datetime(value)
+    for field in MONEY_FIELDS:
+        if field in doc:
+            rupees = doc.pop(field)
+            doc[f"{field}_paise"] = None if rupees is None else to_paise(rupees)
+    return doc
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=DUMPS_OPTIONS)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return orjson.loads(data)
+
+
+class ORJSONResponse(JSONResponse):
+    """The app's default response class.
+
+    Returning one directly skips FastAPI's response-model validation and
+    ``jsonable_encoder`` pass; ``response_model`` on the route then only
+    documents the shape.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,239 @@
+"""Streaming CSV/PDF receipt exports with a content-addressed disk cache.
+
+Exports are rendered row by row straight off a Motor cursor, so memory stays
+flat however long the ledger is. Statements for closed months do not change.
+While one streams to the client it is also written to ``EXPORT_CACHE_DIR``
+under the SHA-256 of its content. ``export_cache`` maps the statement's key to
+that hash, so the next download is served from disk without touching
+``payments``.
+
+CSV cells that a spreadsheet would read as a formula are prefixed with
+``'``. Resident names and phone numbers are user-supplied, and a chairman
+opens these files in Excel or Sheets.
+"""
+import asyncio
+import csv
+import hashlib
+import io
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from fastapi.responses import FileResponse, StreamingResponse
+
+from codec import public_money, stored_paise, to_rupees, utcnow
+from payments import COMPLETED, active_key
+
+EXPORT_CACHE_DIR = Path(os.environ.get('EXPORT_CACHE_DIR', Path(tempfile.gettempdir()) / 'receipt-exports'))
+EXPORT_BATCH_SIZE = 500
+CACHE_WRITE_BYTES = 256 * 1024  # cache file writes are batched and done off the event loop
+PDF_ROWS_PER_PAGE = 40
+
+CSV_COLUMNS = [
+    "payment_date", "month", "user_name", "user_phone", "amount",
+    "status", "razorpay_order_id", "razorpay_payment_id", "id",
+]
+MEDIA_TYPES = {"csv": "text/csv", "pdf": "application/pdf"}
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+# Part of every cache key; bump it when the rendered output changes so old files are not served
+EXPORT_FORMAT_VERSION = 2
+
+
+def _csv_cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+async def csv_chunks(cursor) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for doc in cursor:
+        public_money(doc)
+        writer.writerow([_csv_cell(doc.get(column, "")) for column in CSV_COLUMNS])
+        # Flush every row so nothing accumulates
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _pdf_text(value) -> str:
+    text = str(value).encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class _PdfWriter:
+    """Minimal PDF 1.4 writer that emits objects as it goes and the xref table last."""
+
+    PAGES_OBJ = 2
+    FONT_OBJ = 3
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 4
+
+    def _emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def header(self) -> bytes:
+        return self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def obj(self, obj_id: int, body: bytes) -> bytes:
+        self.offsets[obj_id] = self.offset
+        return self._emit(f"{obj_id} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def page(self, title: str, lines: list, page_no: int) -> bytes:
+        content = ["BT", "/F1 9 Tf", "40 800 Td", "12 TL", f"({_pdf_text(title)} - page {page_no}) Tj", "T*"]
+        content += [f"({_pdf_text(line)}) '" for line in lines]
+        content.append("ET")
+        stream = "\n".join(content).encode("latin-1")
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self.page_ids.append(page_id)
+        return (
+            self.obj(content_id, f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+            + self.obj(page_id, (
+                f"<< /Type /Page /Parent {self.PAGES_OBJ} 0 R /MediaBox [0 0 595 842] "
+                f"/Resources << /Font << /F1 {self.FONT_OBJ} 0 R >> >> /Contents {content_id} 0 R >>"
+            ).encode())
+        )
+
+    def trailer(self) -> bytes:
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        out = self.obj(self.PAGES_OBJ, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode())
+        xref_at = self.offset
+        size = self.next_id
+        xref = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        xref += [f"{self.offsets[i]:010d} 00000 n \n" for i in range(1, size)]
+        xref.append(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n")
+        return out + self._emit("".join(xref).encode())
+
+
+async def pdf_chunks(cursor, title: str) -> AsyncIterator[bytes]:
+    pdf = _PdfWriter()
+    yield pdf.header()
+    yield pdf.obj(1, f"<< /Type /Catalog /Pages {pdf.PAGES_OBJ} 0 R >>".encode())
+    yield pdf.obj(pdf.FONT_OBJ, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    lines = []
+    total = 0
+    async for doc in cursor:
+        amount = stored_paise(doc, "amount") or 0
+        total += amount
+        lines.append(
+            f"{str(doc.get('payment_date', ''))[:10]}  {doc.get('month', ''):<8} "
+            f"{str(doc.get('user_name', ''))[:28]:<28} {doc.get('user_phone', ''):<14} "
+            f"Rs {to_rupees(amount):>10,.2f}  {doc.get('razorpay_payment_id') or ''}"
+        )
+        if len(lines) == PDF_ROWS_PER_PAGE:
+            yield pdf.page(title, lines, len(pdf.page_ids) + 1)
+            lines = []
+    lines += ["", f"Total collected: Rs {to_rupees(total):,.2f}"]
+    yield pdf.page(title, lines, len(pdf.page_ids) + 1)
+    yield pdf.trailer()
+
+
+def is_closed_month(month: Optional[str]) -> bool:
+    return bool(month) and month < utcnow().strftime("%Y-%m")
+
+
+async def society_statement_key(db, society_id: str, month: str, fmt: str) -> Optional[str]:
+    """Cache key for a closed month's society statement, or None while the month is open.
+
+    Late payments for a closed month still move the ledger row, which changes the key.
+    """
+    if not is_closed_month(month):
+        return None
+    row = await db.society_ledger.find_one({"society_id": society_id, "month": month}, {"_id": 0}) or {}
+    return f"v{EXPORT_FORMAT_VERSION}:society:{society_id}:{month}:{row.get('paid_count', 0)}:{stored_paise(row, 'paid_amount') or 0}:{fmt}"
+
+
+async def user_statement_key(db, user_id: str, month: str, fmt: str) -> Optional[str]:
+    if not is_closed_month(month):
+        return None
+    # At most one completed payment per user and month carries the active key
+    paid = await db.payments.find_one(
+        {"active_key": active_key(user_id, month), "status": COMPLETED}, {"_id": 0, "id": 1}
+    )
+    return f"v{EXPORT_FORMAT_VERSION}:user:{user_id}:{month}:{paid['id'] if paid else '-'}:{fmt}"
+
+
+def _cache_path(digest: str, fmt: str) -> Path:
+    return EXPORT_CACHE_DIR / digest[:2] / f"{digest}.{fmt}"
+
+
+def _publish(tmp_name: str, path: Path) -> None:
+    path.parent.mkdir(exist_ok=True)
+    os.replace(tmp_name, path)
+
+
+async def _tee_to_cache(db, chunks: AsyncIterator[bytes], cache_key: str, fmt: str) -> AsyncIterator[bytes]:
+    """Pass chunks through while writing them to disk; publish to the cache only if fully written."""
+    await asyncio.to_thread(EXPORT_CACHE_DIR.mkdir, parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_name = await asyncio.to_thread(tempfile.mkstemp, dir=EXPORT_CACHE_DIR, suffix=".part")
+    complete = False
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            pending, pending_bytes = [], 0
+            async for chunk in chunks:
+                digest.update(chunk)
+                pending.append(chunk)
+                pending_bytes += len(chunk)
+                yield chunk
+                if pending_bytes >= CACHE_WRITE_BYTES:
+                    await asyncio.to_thread(tmp.write, b"".join(pending))
+                    pending, pending_bytes = [], 0
+            await asyncio.to_thread(tmp.write, b"".join(pending))
+        path = _cache_path(digest.hexdigest(), fmt)
+        await asyncio.to_thread(_publish, tmp_name, path)
+        complete = True
+        await db.export_cache.update_one(
+            {"key": cache_key},
+            {"$set": {"sha256": digest.hexdigest(), "format": fmt, "created_at": utcnow()}},
+            upsert=True
+        )
+    finally:
+        if not complete and os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+
+
+async def export_response(
+    db,
+    query: dict,
+    fmt: str,
+    title: str,
+    filename: str,
+    cache_key: Optional[str] = None,
+    source=None
+):
+    """Stream ``payments`` matching ``query`` as CSV or PDF, served from the cache when ``cache_key`` hits.
+
+    ``source`` is the collection rows are read from (default ``db.payments``). Cached statements
+    are always read from ``db``, so a lagging secondary can never be cached under a fresh key.
+    """
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    if cache_key:
+        cached = await db.export_cache.find_one({"key": cache_key}, {"_id": 0, "sha256": 1})
+        if cached:
+            path = _cache_path(cached['sha256'], fmt)
+            if path.exists():
+                return FileResponse(path, media_type=MEDIA_TYPES[fmt], headers={**headers, "ETag": f'"{cached["sha256"]}"'})
+
+    if source is None or cache_key:
+        source = db.payments
+    cursor = source.find(query, {"_id": 0}).sort([("payment_date", 1), ("id", 1)]).batch_size(EXPORT_BATCH_SIZE)
+    chunks = csv_chunks(cursor) if fmt == "csv" else pdf_chunks(cursor, title)
+    if cache_key:
+        chunks = _tee_to_cache(db, chunks, cache_key, fmt)
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[fmt], headers=headers)
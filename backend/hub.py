@@ -0,0 +1,123 @@
+"""In-process per-society pub/sub for pushing notifications over SSE.
+
+Each connected member holds one ``Subscription`` with a small bounded queue;
+an idle connection costs a parked coroutine and an empty queue. When a slow
+client's queue is full the oldest notice is dropped so one stalled reader can
+never hold up publishing for the rest of the society.
+
+With several workers, enable the change-stream bridge
+(``NOTIFICATION_CHANGE_STREAM=true``, needs a replica set): every worker then
+learns about inserts into ``notifications`` from MongoDB instead of from the
+handler that happened to serve the request.
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Optional, Set
+
+from codec import dumps
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 32
+HEARTBEAT_SECONDS = 25
+
+
+class Subscription:
+    __slots__ = ("society_id", "queue", "dropped")
+
+    def __init__(self, society_id: str, maxsize: int):
+        self.society_id = society_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, message: Optional[dict]) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class NotificationHub:
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.dropped = 0
+        self.closing = False
+
+    def subscribe(self, society_id: str) -> Subscription:
+        subscription = Subscription(society_id, self.queue_size)
+        self._subscribers.setdefault(society_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        members = self._subscribers.get(subscription.society_id)
+        if members is None:
+            return
+        members.discard(subscription)
+        if not members:
+            del self._subscribers[subscription.society_id]
+        self.dropped += subscription.dropped
+
+    def publish(self, society_id: str, message: dict) -> None:
+        for subscription in self._subscribers.get(society_id, ()):
+            subscription.offer(message)
+        self.published += 1
+
+    def close(self) -> None:
+        """End every open stream so a draining server isn't held up by idle SSE clients.
+
+        Clients reconnect (to another worker) after the ``retry`` interval.
+        """
+        self.closing = True
+        for members in self._subscribers.values():
+            for subscription in members:
+                subscription.offer(None)
+
+    def stats(self) -> dict:
+        return {
+            "connections": sum(len(s) for s in self._subscribers.values()),
+            "societies": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped + sum(sub.dropped for s in self._subscribers.values() for sub in s),
+        }
+
+    async def sse_events(self, subscription: Subscription) -> AsyncIterator[str]:
+        """Yield SSE frames for one connection until the client goes away."""
+        try:
+            yield "retry: 5000\n\n"
+            while not self.closing:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment frame keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield f"event: notification\ndata: {dumps(message).decode()}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+async def run_change_stream_bridge(db, hub: NotificationHub) -> None:
+    """Publish every notification inserted into ``db`` by any worker into this worker's hub.
+
+    ``db`` is one partition database; the server runs a bridge per partition.
+    """
+    resume_token = None
+    pipeline = [{"$match": {"operationType": "insert"}}]
+    while True:
+        try:
+            async with db.notifications.watch(pipeline, resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    notification = change["fullDocument"]
+                    notification.pop("_id", None)
+                    notification.pop("read_by", None)
+                    hub.publish(notification["society_id"], notification)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Notification change stream failed, retrying: {e}")
+            await asyncio.sleep(5)
@@ -0,0 +1,226 @@
+"""MongoDB index declarations for every query path in server.py.
+
+Run ``python indexes.py`` to create the indexes by hand, or
+``python indexes.py --check`` to report missing and unused indexes
+against the query shapes the handlers issue.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from partitions import SocietyRouter, databases_holding
+
+logger = logging.getLogger(__name__)
+
+# collection -> indexes the handlers rely on
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("phone_number", ASCENDING)], name="phone_number_unique", unique=True),
+        IndexModel([("society_id", ASCENDING), ("role", ASCENDING)], name="society_role"),
+    ],
+    "societies": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("chairman_id", ASCENDING)], name="chairman_id"),
+        IndexModel([("name_tokens", ASCENDING)], name="name_tokens"),
+        IndexModel([("name_norm", ASCENDING)], name="name_norm"),
+    ],
+    "payments": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Pending payments have no order id until the gateway answers
+        IndexModel([("razorpay_order_id", ASCENDING)], name="razorpay_order_id_partial_unique", unique=True,
+                   partialFilterExpression={"razorpay_order_id": {"$type": "string"}}),
+        # One live (pending/completed) payment per user and month, see payments.py
+        IndexModel([("active_key", ASCENDING)], name="active_key_partial_unique", unique=True,
+                   partialFilterExpression={"active_key": {"$exists": True}}),
+        IndexModel([("status", ASCENDING), ("payment_date", ASCENDING)], name="status_payment_date"),
+        IndexModel([("society_id", ASCENDING), ("payment_date", DESCENDING), ("id", DESCENDING)], name="society_payment_date_id"),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("payment_date", DESCENDING), ("id", DESCENDING)], name="user_status_payment_date_id"),
+        # Monthly statements, see exports.py
+        IndexModel([("society_id", ASCENDING), ("month", ASCENDING), ("status", ASCENDING), ("payment_date", DESCENDING), ("id", DESCENDING)],
+                   name="society_month_status_payment_date_id"),
+    ],
+    "notifications": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("society_id", ASCENDING), ("created_at", DESCENDING)], name="society_created_at"),
+    ],
+    "notification_reads": [
+        IndexModel([("user_id", ASCENDING), ("society_id", ASCENDING)], name="user_society_unique", unique=True),
+    ],
+    "dues": [
+        IndexModel([("user_id", ASCENDING), ("month", ASCENDING)], name="user_month_unique", unique=True),
+        IndexModel([("society_id", ASCENDING), ("month", ASCENDING), ("status", ASCENDING)], name="society_month_status"),
+        # Paged dues listing, see pagination.py
+        IndexModel([("society_id", ASCENDING), ("month", ASCENDING), ("id", ASCENDING)], name="society_month_id"),
+    ],
+    "billing_progress": [
+        IndexModel([("month", ASCENDING), ("society_id", ASCENDING)], name="month_society_unique", unique=True),
+    ],
+    "society_ledger": [
+        IndexModel([("society_id", ASCENDING), ("month", ASCENDING)], name="society_month_unique", unique=True),
+    ],
+    "idempotency_keys": [
+        IndexModel([("user_id", ASCENDING), ("endpoint", ASCENDING), ("key", ASCENDING)], name="user_endpoint_key_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "export_cache": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+    ],
+    "order_routes": [
+        IndexModel([("razorpay_order_id", ASCENDING)], name="razorpay_order_id_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "cache_invalidations": [
+        IndexModel([("at", ASCENDING)], name="at"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "revoked_sessions": [
+        IndexModel([("sid", ASCENDING)], name="sid_unique", unique=True),
+        IndexModel([("revoked_at", ASCENDING)], name="revoked_at"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "refresh_sessions": [
+        IndexModel([("sid", ASCENDING)], name="sid_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "otp_store": [
+        IndexModel([("phone_number", ASCENDING)], name="phone_number_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Superseded indexes dropped by ensure_indexes
+OBSOLETE_INDEXES: Dict[str, List[str]] = {
+    "payments": ["razorpay_order_id_unique", "user_month_status", "society_payment_date", "user_status_payment_date"],
+}
+
+# (collection, equality fields, sort fields) for every find issued by the handlers
+QUERY_SHAPES: List[Tuple[str, Tuple[str, ...], Tuple[str, ...]]] = [
+    ("users", ("id",), ()),
+    ("users", ("phone_number",), ()),
+    ("users", ("society_id", "role"), ()),
+    ("societies", ("id",), ()),
+    ("societies", ("chairman_id",), ()),
+    ("societies", ("name_tokens",), ()),
+    ("societies", (), ("name_norm",)),
+    ("payments", ("active_key",), ()),
+    ("payments", ("razorpay_order_id",), ()),
+    ("payments", ("razorpay_order_id", "user_id", "status"), ()),
+    ("payments", ("status",), ("payment_date",)),
+    ("payments", ("society_id",), ("payment_date", "id")),
+    ("payments", ("user_id", "status"), ("payment_date", "id")),
+    ("payments", ("society_id", "month", "status"), ("payment_date", "id")),
+    ("notifications", ("id",), ()),
+    ("notifications", ("society_id",), ("created_at",)),
+    ("notification_reads", ("user_id", "society_id"), ()),
+    ("dues", ("user_id", "month"), ()),
+    ("dues", ("society_id", "month"), ("id",)),
+    ("dues", ("society_id",), ()),
+    ("billing_progress", ("month",), ()),
+    ("society_ledger", ("society_id",), ("month",)),
+    ("idempotency_keys", ("user_id", "endpoint", "key"), ()),
+    ("jobs", ("status",), ("run_at",)),
+    ("jobs", ("id", "worker"), ()),
+    ("export_cache", ("key",), ()),
+    ("order_routes", ("razorpay_order_id", "user_id"), ()),
+    ("cache_invalidations", ("at",), ()),
+    ("revoked_sessions", ("sid",), ()),
+    ("revoked_sessions", ("revoked_at",), ()),
+    ("refresh_sessions", ("sid", "current_jti"), ()),
+    ("otp_store", ("phone_number",), ()),
+]
+
+
+async def ensure_indexes(db) -> None:
+    """Create the declared indexes, in every partition for partitioned collections. Safe to call on every startup."""
+    for collection, names in OBSOLETE_INDEXES.items():
+        for database in databases_holding(db, collection):
+            existing = await database[collection].index_information()
+            for name in names:
+                if name in existing:
+                    await database[collection].drop_index(name)
+                    logger.info(f"Dropped superseded index {database.name}.{collection}.{name}")
+    for collection, models in INDEXES.items():
+        for database in databases_holding(db, collection):
+            for model in models:
+                try:
+                    await database[collection].create_indexes([model])
+                except OperationFailure as e:
+                    # e.g. duplicate data blocking a unique index; keep serving
+                    logger.error(f"Could not create index {database.name}.{collection}.{model.document['name']}: {e}")
+    logger.info("MongoDB indexes ensured")
+
+
+def _covers(index_keys: List[str], equality: Tuple[str, ...], sort: Tuple[str, ...]) -> bool:
+    """An index serves a shape if it leads with equality fields and, when sorting, all of them then the sort."""
+    prefix = 0
+    while prefix < len(index_keys) and index_keys[prefix] in equality:
+        prefix += 1
+    if not sort:
+        return prefix > 0
+    return prefix == len(equality) and tuple(index_keys[prefix:prefix + len(sort)]) == sort
+
+
+async def check_indexes(db) -> dict:
+    """Report query shapes without a serving index and indexes never used since the last restart."""
+    missing = []
+    unused = []
+    for collection in INDEXES:
+        for database in databases_holding(db, collection):
+            info = await database[collection].index_information()
+            index_keys = [[field for field, _ in spec["key"]] for spec in info.values()]
+            for shape_collection, equality, sort in QUERY_SHAPES:
+                if shape_collection != collection:
+                    continue
+                if not any(_covers(keys, equality, sort) for keys in index_keys):
+                    missing.append({"collection": f"{database.name}.{collection}", "filter": list(equality), "sort": list(sort)})
+
+            async for stat in database[collection].aggregate([{"$indexStats": {}}]):
+                if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0:
+                    unused.append({"collection": f"{database.name}.{collection}", "index": stat["name"], "since": stat["accesses"]["since"]})
+
+    return {"missing": missing, "unused": unused}
+
+
+async def _main(check: bool) -> None:
+    from codec import CLIENT_OPTIONS
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], **CLIENT_OPTIONS)
+    db = SocietyRouter.from_env(client)
+    try:
+        if check:
+            report = await check_indexes(db)
+            for item in report["missing"]:
+                print(f"MISSING {item['collection']}: filter={item['filter']} sort={item['sort']}")
+            for item in report["unused"]:
+                print(f"UNUSED  {item['collection']}.{item['index']} (no ops since {item['since']})")
+            if not report["missing"] and not report["unused"]:
+                print("All query shapes are indexed and every index is in use")
+        else:
+            await ensure_indexes(db)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main("--check" in sys.argv))
@@ -0,0 +1,189 @@
+"""Mongo-backed asyncio job queue.
+
+Handlers enqueue slow side-effects (SMS delivery and the like) and return
+immediately. Jobs are persisted in the ``jobs`` collection and claimed by a
+bounded pool of asyncio workers with a lease. A crashed worker's jobs are
+picked up again once the lease lapses. Failures are retried with
+exponential backoff and jitter; after ``max_attempts`` a job is
+dead-lettered (``status: "dead"``) with its last error kept for inspection.
+Lapsed leases count as attempts too, so a job that keeps killing its worker
+is dead-lettered rather than reclaimed forever.
+Finished jobs drop their payload and expire after a week, dead ones after
+a month. Payloads are still readable while a job is queued or dead, so
+enqueue references (a phone number, a record id), never secrets.
+
+The pool runs inside the web process by default (``JOB_WORKERS_INLINE``), or
+out-of-process with ``python -m backend.worker``. Only MongoDB is needed.
+"""
+import asyncio
+import logging
+import random
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from codec import utcnow
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "jobs"
+FINISHED_RETENTION = timedelta(days=7)
+DEAD_RETENTION = timedelta(days=30)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class JobQueue:
+    def __init__(
+        self,
+        db,
+        workers: int = 4,
+        max_attempts: int = 5,
+        lease_seconds: float = 60,
+        poll_interval: float = 2.0
+    ):
+        self.db = db
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{uuid.uuid4().hex[:6]}"
+        self._handlers: Dict[str, Handler] = {}
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.stats = {"enqueued": 0, "succeeded": 0, "retried": 0, "dead": 0}
+
+    def handler(self, name: str):
+        """Decorator registering the coroutine that runs jobs called ``name``."""
+        def register(fn: Handler) -> Handler:
+            self._handlers[name] = fn
+            return fn
+        return register
+
+    async def enqueue(self, name: str, payload: dict, delay: float = 0) -> str:
+        now = utcnow()
+        job_id = str(uuid.uuid4())
+        await self.db[JOBS_COLLECTION].insert_one({
+            "id": job_id,
+            "name": name,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "run_at": now + timedelta(seconds=delay),
+            "created_at": now
+        })
+        self.stats["enqueued"] += 1
+        self._wakeup.set()
+        return job_id
+
+    async def _claim(self) -> Optional[dict]:
+        now = utcnow()
+        return await self.db[JOBS_COLLECTION].find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                # Lease lapsed: the worker that held it died mid-job
+                {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$lt": self.max_attempts}},
+            ], "name": {"$in": list(self._handlers)}},
+            {"$set": {"status": "running", "lease_until": now + self.lease, "worker": self.worker_id},
+             "$inc": {"attempts": 1}},
+            sort=[("run_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _bury_lapsed(self) -> None:
+        """Dead-letter jobs whose lease lapsed on their last allowed attempt."""
+        now = utcnow()
+        result = await self.db[JOBS_COLLECTION].update_many(
+            {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$gte": self.max_attempts},
+             "name": {"$in": list(self._handlers)}},
+            {"$set": {
+                "status": "dead",
+                "last_error": "Lease lapsed: the worker died or hung on the last attempt",
+                "finished_at": now,
+                "expires_at": now + DEAD_RETENTION
+            }}
+        )
+        if result.modified_count:
+            logger.error(f"Dead-lettered {result.modified_count} jobs whose lease lapsed after {self.max_attempts} attempts")
+            self.stats["dead"] += result.modified_count
+
+    async def _finish(self, job: dict, update: dict) -> None:
+        await self.db[JOBS_COLLECTION].update_one({"id": job['id'], "worker": self.worker_id}, update)
+
+    async def _run(self, job: dict) -> None:
+        try:
+            await asyncio.wait_for(self._handlers[job['name']](job['payload']), self.lease.total_seconds())
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            now = utcnow()
+            if job['attempts'] >= self.max_attempts:
+                logger.error(f"Job {job['name']} {job['id']} dead-lettered after {job['attempts']} attempts: {error}")
+                self.stats["dead"] += 1
+                await self._finish(job, {"$set": {
+                    "status": "dead",
+                    "last_error": error,
+                    "traceback": traceback.format_exc(limit=10),
+                    "finished_at": now,
+                    "expires_at": now + DEAD_RETENTION
+                }})
+            else:
+                backoff = random.uniform(0, min(300, 2 ** job['attempts']))
+                logger.warning(f"Job {job['name']} {job['id']} failed, retrying in {backoff:.1f}s: {error}")
+                self.stats["retried"] += 1
+                await self._finish(job, {"$set": {
+                    "status": "queued",
+                    "last_error": error,
+                    "run_at": now + timedelta(seconds=backoff)
+                }})
+            return
+
+        self.stats["succeeded"] += 1
+        await self._finish(job, {
+            "$set": {
+                "status": "done",
+                "finished_at": utcnow(),
+                "expires_at": utcnow() + FINISHED_RETENTION
+            },
+            "$unset": {"payload": ""}
+        })
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            try:
+                job = await self._claim()
+                if job is None:
+                    await self._bury_lapsed()
+            except Exception as e:
+                logger.error(f"Job claim failed: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    def start(self) -> None:
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Job queue started with {self.workers} workers ({self.worker_id})")
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Let in-flight jobs finish, then cancel idle workers."""
+        self._stopping = True
+        self._wakeup.set()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        self._tasks = []
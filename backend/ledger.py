@@ -0,0 +1,171 @@
+"""Materialized per-society monthly collection ledger.
+
+One ``society_ledger`` document per ``(society_id, month)`` holds paid and
+pending counts and amounts (in paise, see codec.py). Payment handlers keep
+it current with atomic ``$inc`` updates; ``rebuild_ledger`` recomputes it
+from ``payments``. Anything that rewrites rows outside the server's
+handlers must bump the society ``version`` too (``bump_society_versions``),
+or version-keyed ETags and report caches keep serving the old totals.
+
+Run ``python ledger.py rebuild [society_id]`` to rebuild by hand.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from typing import Iterable, List, Optional
+
+from codec import CLIENT_OPTIONS, public_money, stored_paise
+from partitions import SocietyRouter, for_society, partitions
+
+logger = logging.getLogger(__name__)
+
+LEDGER_COLLECTION = "society_ledger"
+# A payment's amount in paise, also for payments not yet migrated off rupee floats
+AMOUNT_PAISE = {"$ifNull": ["$amount_paise", {"$toLong": {"$round": [{"$multiply": ["$amount", 100]}, 0]}}]}
+
+
+def _empty_month(society_id: str, month: str) -> dict:
+    return {
+        "society_id": society_id,
+        "month": month,
+        "paid_count": 0,
+        "paid_amount_paise": 0,
+        "pending_count": 0,
+        "pending_amount_paise": 0,
+    }
+
+
+async def record_order_created(db, society_id: str, month: str, amount_paise: int) -> None:
+    await db[LEDGER_COLLECTION].update_one(
+        {"society_id": society_id, "month": month},
+        {"$inc": {"pending_count": 1, "pending_amount_paise": amount_paise}},
+        upsert=True
+    )
+
+
+async def record_payment_completed(db, society_id: str, month: str, amount_paise: int) -> None:
+    await db[LEDGER_COLLECTION].update_one(
+        {"society_id": society_id, "month": month},
+        {"$inc": {
+            "pending_count": -1,
+            "pending_amount_paise": -amount_paise,
+            "paid_count": 1,
+            "paid_amount_paise": amount_paise
+        }},
+        upsert=True
+    )
+
+
+async def record_pending_cancelled(db, society_id: str, month: str, amount_paise: int) -> None:
+    """A pending order failed or expired without being paid."""
+    await db[LEDGER_COLLECTION].update_one(
+        {"society_id": society_id, "month": month},
+        {"$inc": {"pending_count": -1, "pending_amount_paise": -amount_paise}},
+        upsert=True
+    )
+
+
+async def get_year(db, society_id: str, year: int) -> dict:
+    """All twelve months of ``year`` from a single range read on the ledger index, amounts in rupees."""
+    rows = await db[LEDGER_COLLECTION].find(
+        {"society_id": society_id, "month": {"$gte": f"{year}-01", "$lte": f"{year}-12"}},
+        {"_id": 0, "rebuild_id": 0}
+    ).to_list(12)
+    by_month = {row["month"]: row for row in rows}
+
+    months: List[dict] = []
+    for m in range(1, 13):
+        month = f"{year}-{m:02d}"
+        # Rows upserted by a single $inc lack the counters nobody has touched yet
+        months.append({**_empty_month(society_id, month), **by_month.get(month, {})})
+
+    totals = {
+        "paid_count": sum(row["paid_count"] for row in months),
+        "paid_amount_paise": sum(stored_paise(row, "paid_amount") or 0 for row in months),
+        "pending_count": sum(row["pending_count"] for row in months),
+        "pending_amount_paise": sum(stored_paise(row, "pending_amount") or 0 for row in months),
+    }
+    return {
+        "society_id": society_id,
+        "year": year,
+        "months": [public_money(row) for row in months],
+        "totals": public_money(totals),
+    }
+
+
+async def bump_society_versions(db, society_ids: Iterable[str]) -> None:
+    """Invalidate ETags and cached reports of societies whose payments or ledger changed behind the server."""
+    society_ids = list(set(society_ids))
+    if society_ids:
+        await db.societies.update_many({"id": {"$in": society_ids}}, {"$inc": {"version": 1}})
+
+
+async def rebuild_ledger(db, society_id: Optional[str] = None) -> None:
+    """Recompute ledger rows from ``payments`` for one society, or all of them (partition by partition)."""
+    scope = {"society_id": society_id} if society_id else {}
+    for target in [for_society(db, society_id)] if society_id else partitions(db):
+        # Societies losing rows are found before the rebuild, those gaining them after
+        before = await target[LEDGER_COLLECTION].distinct("society_id", scope)
+        await _rebuild(target, scope)
+        after = await target[LEDGER_COLLECTION].distinct("society_id", scope)
+        await bump_society_versions(target, before + after)
+    logger.info(f"Ledger rebuilt for {society_id or 'all societies'}")
+
+
+async def _rebuild(db, scope: dict) -> None:
+    rebuild_id = str(uuid.uuid4())
+
+    pipeline = [
+        {"$match": {**scope, "status": {"$in": ["pending", "completed"]}}},
+        {"$group": {
+            "_id": {"society_id": "$society_id", "month": "$month"},
+            "paid_count": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}},
+            "paid_amount_paise": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, AMOUNT_PAISE, 0]}},
+            "pending_count": {"$sum": {"$cond": [{"$eq": ["$status", "pending"]}, 1, 0]}},
+            "pending_amount_paise": {"$sum": {"$cond": [{"$eq": ["$status", "pending"]}, AMOUNT_PAISE, 0]}},
+        }},
+        {"$project": {
+            "_id": 0,
+            "society_id": "$_id.society_id",
+            "month": "$_id.month",
+            "paid_count": 1,
+            "paid_amount_paise": 1,
+            "pending_count": 1,
+            "pending_amount_paise": 1,
+            "rebuild_id": {"$literal": rebuild_id},
+        }},
+        {"$merge": {
+            "into": LEDGER_COLLECTION,
+            "on": ["society_id", "month"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+    await db.payments.aggregate(pipeline).to_list(None)
+
+    # Months that no longer have any payments were not touched by this run
+    result = await db[LEDGER_COLLECTION].delete_many({**scope, "rebuild_id": {"$ne": rebuild_id}})
+    logger.info(f"Ledger rebuilt in {db.name}; removed {result.deleted_count} stale rows")
+
+
+async def _main(society_id: Optional[str]) -> None:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], **CLIENT_OPTIONS)
+    try:
+        await rebuild_ledger(SocietyRouter.from_env(client), society_id)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        sys.exit("usage: python ledger.py rebuild [society_id]")
+    asyncio.run(_main(sys.argv[2] if len(sys.argv) > 2 else None))
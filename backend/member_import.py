@@ -0,0 +1,220 @@
+"""Bulk member import for chairmen.
+
+Reads a CSV (``phone_number,name,user_type`` header) or NDJSON upload as it
+arrives, validates rows in batches and upserts them with unordered
+``bulk_write`` keyed on ``phone_number``. Phone numbers are stored in the
+bare 10-digit form OTP login uses, so an imported resident who later logs
+in matches their imported record. New residents are created already
+attached to the society. Existing unattached residents are attached.
+Anyone who belongs to another society, or is not a resident, is reported as
+a conflict and left untouched: the upsert filter does not match them, so
+the insert trips the unique phone index.
+
+One result line per row is spooled to a temporary file rather than kept in
+a list, so a 100k-row import needs memory only for a batch and the set of
+phone numbers already seen. Rejected rows are reported as soon as they are
+read and written rows once their batch lands, so every line carries its
+``row`` number.
+"""
+import codecs
+import csv
+import json
+import re
+import uuid
+from collections import deque
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from codec import store_datetime, utcnow
+
+IMPORT_BATCH_SIZE = 1000
+USER_TYPES = ("owner", "tenant")
+FIELD_ALIASES = {"phone": "phone_number", "mobile": "phone_number", "type": "user_type"}
+# Indian numbers, optionally with the +91/0091/91 country code or the 0 trunk prefix
+PHONE_RE = re.compile(r"^(?:\+91|0091|91|0)?(\d{10})$")
+DUPLICATE_KEY = 11000
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], keepends: bool = False) -> AsyncIterator[str]:
+    """Decode a byte stream into lines without buffering more than one partial line."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n" if keepends else line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending if keepends else pending.rstrip("\r")
+
+
+def _ends_in_quotes(line: str, in_quotes: bool) -> bool:
+    """Whether a CSV record is still inside a quoted field after ``line``, for the default dialect."""
+    field_start = not in_quotes
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if in_quotes:
+            if char == '"':
+                if line[i + 1:i + 2] == '"':
+                    i += 1
+                else:
+                    in_quotes = False
+        elif char == '"' and field_start:
+            in_quotes = True
+        field_start = not in_quotes and char == ","
+        i += 1
+    return in_quotes
+
+
+def _queued(lines: deque) -> Iterator[str]:
+    while lines:
+        yield lines.popleft()
+
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Optional[List[str]], Optional[str]]]:
+    """Yield ``(values, parse_error)`` per CSV record from one ``csv.reader`` over the whole stream.
+
+    Lines are handed to the reader a full record at a time, so a quoted field
+    may span lines while memory stays bounded by the longest record.
+    """
+    lines = deque()
+    reader = csv.reader(_queued(lines))
+    in_quotes = False
+    async for line in iter_lines(chunks, keepends=True):
+        lines.append(line)
+        in_quotes = _ends_in_quotes(line, in_quotes)
+        if in_quotes:
+            continue
+        try:
+            yield next(reader), None
+        except csv.Error as e:
+            lines.clear()
+            yield None, f"Invalid CSV: {e}"
+    if in_quotes:
+        yield None, "Invalid CSV: unterminated quoted field"
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield ``(row_number, record, parse_error)`` for every non-blank data row."""
+    row_number = 0
+    if fmt == "csv":
+        header = None
+        async for values, error in iter_csv_rows(chunks):
+            if values is not None and not any(v.strip() for v in values):
+                continue
+            if header is None and not error:
+                header = [FIELD_ALIASES.get(h.strip().lower(), h.strip().lower()) for h in values]
+                continue
+            row_number += 1
+            yield row_number, None if error else dict(zip(header, values)), error
+        return
+
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield row_number, None, "Expected a JSON object"
+            continue
+        yield row_number, {FIELD_ALIASES.get(k, k): v for k, v in record.items()}, None
+
+
+def normalize_phone(value) -> Optional[str]:
+    """The bare 10-digit number OTP login stores, or None if ``value`` is not one."""
+    match = PHONE_RE.match(re.sub(r"[\s\-().]", "", str(value or "")))
+    return match.group(1) if match else None
+
+
+def validate(record: dict) -> Tuple[Optional[dict], Optional[str]]:
+    phone = normalize_phone(record.get("phone_number"))
+    name = str(record.get("name") or "").strip()
+    user_type = str(record.get("user_type") or "").strip().lower()
+    if not phone:
+        return None, "Invalid phone_number: expected a 10-digit mobile number, optionally with +91"
+    if not name or len(name) > 100:
+        return None, "Name is required (max 100 characters)"
+    if user_type not in USER_TYPES:
+        return None, "user_type must be owner or tenant"
+    return {"phone_number": phone, "name": name, "user_type": user_type}, None
+
+
+async def _write_batch(db, society_id: str, batch: list) -> list:
+    """Upsert one batch; returns ``(status, error)`` per row, in order."""
+    now = store_datetime(utcnow())
+    ops = [
+        UpdateOne(
+            {"phone_number": row["phone_number"], "role": "user", "society_id": {"$in": [None, society_id]}},
+            {
+                "$set": {"society_id": society_id, "user_type": row["user_type"]},
+                "$setOnInsert": {
+                    "id": str(uuid.uuid4()),
+                    "name": row["name"],
+                    "created_at": now
+                }
+            },
+            upsert=True
+        )
+        for _, row in batch
+    ]
+    try:
+        result = (await db.users.bulk_write(ops, ordered=False)).bulk_api_result
+    except BulkWriteError as e:
+        result = e.details
+
+    statuses = [("updated", None)] * len(batch)
+    for upserted in result.get("upserted", []):
+        statuses[upserted["index"]] = ("created", None)
+    for error in result.get("writeErrors", []):
+        if error["code"] == DUPLICATE_KEY:
+            statuses[error["index"]] = ("conflict", "Phone number belongs to another society or a chairman")
+        else:
+            statuses[error["index"]] = ("error", error.get("errmsg", "Write failed"))
+    return statuses
+
+
+async def import_members(db, society_id: str, chunks: AsyncIterator[bytes], fmt: str, out) -> dict:
+    """Import every row from ``chunks``, writing one NDJSON result per row to the binary file ``out``."""
+    summary = {"rows": 0, "created": 0, "updated": 0, "invalid": 0, "duplicate": 0, "conflict": 0, "error": 0}
+    seen = set()
+    batch = []
+
+    def report(row_number: int, phone: Optional[str], status: str, error: Optional[str] = None):
+        summary[status] += 1
+        line = {"row": row_number, "phone_number": phone, "status": status}
+        if error:
+            line["error"] = error
+        out.write(json.dumps(line).encode() + b"\n")
+
+    async def flush():
+        nonlocal batch
+        if batch:
+            for (row_number, row), (status, error) in zip(batch, await _write_batch(db, society_id, batch)):
+                report(row_number, row["phone_number"], status, error)
+            batch = []
+
+    async for row_number, record, error in iter_records(chunks, fmt):
+        summary["rows"] += 1
+        row, error = (None, error) if error else validate(record)
+        if error:
+            report(row_number, (record or {}).get("phone_number"), "invalid", error)
+            continue
+        if row["phone_number"] in seen:
+            report(row_number, row["phone_number"], "duplicate", "Phone number repeated earlier in the file")
+            continue
+        seen.add(row["phone_number"])
+        batch.append((row_number, row))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush()
+    await flush()
+
+    out.write(json.dumps({"summary": summary}).encode() + b"\n")
+    return summary
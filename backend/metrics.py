@@ -0,0 +1,193 @@
+"""Per-request timing and Mongo command instrumentation.
+
+``MetricsMiddleware`` times every HTTP request and, through a context
+variable, collects the Mongo commands it issued as reported by
+``MongoCommandListener`` (register it with the Motor client's
+``event_listeners``). Each response carries a ``Server-Timing`` header,
+totals are rendered in Prometheus text format by ``render_prometheus``, and
+requests over ``SLOW_REQUEST_MS`` or ``SLOW_REQUEST_DB_OPS`` are logged.
+
+Streaming responses (SSE, NDJSON, exports) stay open as long as the client
+reads them, so they are measured to their first body chunk: that latency,
+and the queries issued until then, feed the histogram and the slow log.
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '500'))
+SLOW_REQUEST_DB_OPS = int(os.environ.get('SLOW_REQUEST_DB_OPS', '20'))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestStats:
+    __slots__ = ("db_ops", "db_ms", "by_collection", "_pending", "_lock")
+
+    def __init__(self):
+        self.db_ops = 0
+        self.db_ms = 0.0
+        self.by_collection: Dict[str, List[float]] = defaultdict(list)
+        self._pending: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[tuple, int] = defaultdict(int)
+        self.request_seconds: Dict[tuple, float] = defaultdict(float)
+        self.request_buckets: Dict[tuple, List[int]] = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self.commands: Dict[tuple, int] = defaultdict(int)
+        self.command_seconds: Dict[tuple, float] = defaultdict(float)
+        self.slow_requests = 0
+        self._gauges: List[Callable[[], Dict[str, float]]] = []
+
+    def add_gauges(self, source: Callable[[], Dict[str, float]]) -> None:
+        """Register a callable returning ``{metric_name: value}`` read at scrape time."""
+        self._gauges.append(source)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] += 1
+            self.request_seconds[key] += seconds
+            buckets = self.request_buckets[key]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+
+    def observe_command(self, command: str, collection: str, seconds: float) -> None:
+        with self._lock:
+            self.commands[(command, collection)] += 1
+            self.command_seconds[(command, collection)] += seconds
+
+
+registry = MetricsRegistry()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        stats = _current_request.get()
+        if stats is not None:
+            collection = event.command.get(event.command_name)
+            with stats._lock:
+                stats._pending[event.request_id] = collection if isinstance(collection, str) else "-"
+
+    def _finished(self, event):
+        seconds = event.duration_micros / 1e6
+        stats = _current_request.get()
+        collection = "-"
+        if stats is not None:
+            with stats._lock:
+                collection = stats._pending.pop(event.request_id, "-")
+                stats.db_ops += 1
+                stats.db_ms += seconds * 1000
+                stats.by_collection[collection].append(seconds * 1000)
+        registry.observe_command(event.command_name, collection, seconds)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+
+def _server_timing(app_ms: float, stats: RequestStats) -> bytes:
+    parts = [f"app;dur={app_ms:.1f}", f'db;dur={stats.db_ms:.1f};desc="{stats.db_ops} queries"']
+    return ", ".join(parts).encode()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware so streaming responses pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+        first_chunk = None  # (seconds, db_ops, db_ms) when a streamed body began
+
+        async def send_with_timing(message):
+            nonlocal status_code, first_chunk
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                app_ms = (time.perf_counter() - started) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(app_ms, stats)))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and first_chunk is None and message.get("more_body"):
+                first_chunk = (time.perf_counter() - started, stats.db_ops, stats.db_ms)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_request.reset(token)
+            if first_chunk is not None:
+                seconds, db_ops, db_ms = first_chunk
+            else:
+                seconds, db_ops, db_ms = time.perf_counter() - started, stats.db_ops, stats.db_ms
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            registry.observe_request(scope["method"], route_path, status_code, seconds)
+
+            if seconds * 1000 > SLOW_REQUEST_MS or db_ops > SLOW_REQUEST_DB_OPS:
+                registry.slow_requests += 1
+                breakdown = ", ".join(
+                    f"{name}={len(times)}x/{sum(times):.1f}ms" for name, times in sorted(stats.by_collection.items())
+                )
+                logger.warning(
+                    f"Slow request {scope['method']} {scope['path']}: {seconds * 1000:.1f}ms"
+                    f"{' to first byte' if first_chunk else ''}, {db_ops} db ops in {db_ms:.1f}ms ({breakdown})"
+                )
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def render_prometheus() -> str:
+    r = registry
+    lines = [
+        "# TYPE http_requests_total counter",
+        *(f"http_requests_total{_labels(method=m, route=p, status=s)} {n}" for (m, p, s), n in sorted(r.requests.items())),
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), buckets in sorted(r.request_buckets.items()):
+        count = sum(n for (m, p, _), n in r.requests.items() if (m, p) == (method, route))
+        for bound, n in zip(LATENCY_BUCKETS, buckets):
+            lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {n}")
+        lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le='+Inf')} {count}")
+        lines.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route)} {r.request_seconds[(method, route)]:.6f}")
+        lines.append(f"http_request_duration_seconds_count{_labels(method=method, route=route)} {count}")
+    lines.append("# TYPE mongo_commands_total counter")
+    lines += [f"mongo_commands_total{_labels(command=c, collection=col)} {n}" for (c, col), n in sorted(r.commands.items())]
+    lines.append("# TYPE mongo_command_duration_seconds_sum counter")
+    lines += [
+        f"mongo_command_duration_seconds_sum{_labels(command=c, collection=col)} {s:.6f}"
+        for (c, col), s in sorted(r.command_seconds.items())
+    ]
+    lines.append("# TYPE http_slow_requests_total counter")
+    lines.append(f"http_slow_requests_total {r.slow_requests}")
+    for source in r._gauges:
+        for name, value in source().items():
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
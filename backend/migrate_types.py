@@ -0,0 +1,170 @@
+"""Online migration of stored datetimes and money to native BSON types.
+
+Older documents hold datetimes as ISO strings and money as rupee floats.
+This converts them in place to BSON dates and integer paise (see codec.py)
+while the app keeps serving:
+
+* Each collection is walked in ``_id`` order, ``--batch-size`` documents at
+  a time, with an optional ``--pause-ms`` between batches to bound the load
+  on the primary.
+* Every field is converted by its own compare-and-set ``UpdateOne``. It
+  matches the document only while the field still holds the value that was
+  read. A concurrent handler write therefore always wins: the handler
+  writes the new type itself. Rupees move into ``<field>_paise`` with
+  ``$inc``, so ledger rows that handlers already incremented in paise add
+  up correctly.
+* The last ``_id`` done is saved in ``migration_progress`` after every
+  batch. An interrupted run resumes there; ``--restart`` starts over.
+* After the walk, a sweep by type picks up documents that instances still
+  running the old code wrote behind the walk. Run again after a rolling
+  deploy has finished to catch any stragglers. Re-running is always safe.
+
+Partitioned collections (partitions.py) are migrated in each partition
+database in turn, with their progress kept alongside them.
+
+    python migrate_types.py [--collection payments] [--batch-size 1000] [--pause-ms 0] [--restart]
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+from codec import CLIENT_OPTIONS, load_datetime, store_datetime, to_paise, utcnow
+from partitions import SocietyRouter, databases_holding
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_COLLECTION = "migration_progress"
+MIGRATION_ID = "bson-types"
+
+# collection -> datetime fields and rupee fields to convert
+MIGRATIONS: Dict[str, dict] = {
+    "payments": {"dates": ["payment_date"], "money": ["amount"]},
+    "dues": {"dates": ["created_at"], "money": ["amount"]},
+    "society_ledger": {"dates": [], "money": ["paid_amount", "pending_amount"]},
+    "societies": {"dates": ["created_at"], "money": ["owner_maintenance_rate", "tenant_maintenance_rate"]},
+    "users": {"dates": ["created_at"], "money": []},
+    "notifications": {"dates": ["created_at"], "money": []},
+    "billing_progress": {"dates": ["finished_at"], "money": []},
+}
+
+
+def legacy_filter(spec: dict) -> dict:
+    """Documents that still hold any unconverted field."""
+    clauses = [{field: {"$type": "string"}} for field in spec["dates"]]
+    clauses += [{field: {"$exists": True}} for field in spec["money"]]
+    return {"$or": clauses}
+
+
+def conversions(doc: dict, spec: dict) -> List[UpdateOne]:
+    """One compare-and-set update per unconverted field of ``doc``."""
+    ops = []
+    for field in spec["dates"]:
+        value = doc.get(field)
+        if isinstance(value, str):
+            ops.append(UpdateOne(
+                {"_id": doc["_id"], field: value},
+                {"$set": {field: store_datetime(load_datetime(value))}}
+            ))
+    for field in spec["money"]:
+        if field not in doc:
+            continue
+        value = doc[field]
+        update = {"$unset": {field: ""}}
+        if value is not None:
+            update["$inc"] = {f"{field}_paise": to_paise(value)}
+        ops.append(UpdateOne({"_id": doc["_id"], field: value}, update))
+    return ops
+
+
+async def _apply(db, collection: str, docs: List[dict], spec: dict) -> int:
+    ops = [op for doc in docs for op in conversions(doc, spec)]
+    if not ops:
+        return 0
+    result = await db[collection].bulk_write(ops, ordered=False)
+    return result.modified_count
+
+
+async def migrate_collection(
+    db,
+    collection: str,
+    batch_size: int = 1000,
+    pause_ms: int = 0,
+    restart: bool = False
+) -> dict:
+    spec = MIGRATIONS[collection]
+    key = f"{MIGRATION_ID}:{collection}"
+    projection = {field: 1 for field in spec["dates"] + spec["money"]}
+    progress = None if restart else await db[PROGRESS_COLLECTION].find_one({"_id": key})
+    last_id = progress["last_id"] if progress else None
+    totals = {"collection": collection, "scanned": 0, "converted": 0, "swept": 0, "resumed": last_id is not None}
+    started = time.monotonic()
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = await db[collection].find(query, projection).sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        converted = await _apply(db, collection, docs, spec)
+        totals["converted"] += converted
+        totals["scanned"] += len(docs)
+        last_id = docs[-1]["_id"]
+        await db[PROGRESS_COLLECTION].update_one(
+            {"_id": key},
+            {"$set": {"last_id": last_id, "updated_at": utcnow()}, "$inc": {"converted": converted}},
+            upsert=True
+        )
+        if pause_ms:
+            await asyncio.sleep(pause_ms / 1000)
+
+    # Old-code writers may have inserted or rewritten documents behind the walk
+    while True:
+        docs = await db[collection].find(legacy_filter(spec), projection).limit(batch_size).to_list(batch_size)
+        swept = await _apply(db, collection, docs, spec)
+        totals["swept"] += swept
+        if len(docs) < batch_size or not swept:
+            break
+
+    await db[PROGRESS_COLLECTION].update_one({"_id": key}, {"$set": {"finished": True}}, upsert=True)
+    totals["remaining"] = await db[collection].count_documents(legacy_filter(spec))
+    totals["elapsed_s"] = round(time.monotonic() - started, 1)
+    logger.info(f"Migrated {db.name}.{collection}: {totals}")
+    return totals
+
+
+async def migrate(db, collections: Optional[List[str]] = None, **options) -> List[dict]:
+    return [
+        await migrate_collection(target, name, **options)
+        for name in collections or MIGRATIONS
+        for target in databases_holding(db, name)
+    ]
+
+
+async def _main(collections: Optional[List[str]], batch_size: int, pause_ms: int, restart: bool) -> None:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], **CLIENT_OPTIONS)
+    try:
+        await migrate(SocietyRouter.from_env(client), collections, batch_size=batch_size, pause_ms=pause_ms, restart=restart)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert ISO-string dates and rupee floats to BSON dates and paise")
+    parser.add_argument("--collection", action="append", choices=list(MIGRATIONS))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause-ms", type=int, default=0)
+    parser.add_argument("--restart", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args.collection, args.batch_size, args.pause_ms, args.restart))
@@ -0,0 +1,147 @@
+"""Per-user notification read state.
+
+Every notification gets a per-society sequence number from the society's
+``notification_seq`` counter. A member's read state is one small
+``notification_reads`` document: a watermark ``read_seq`` (everything at or
+below it is read) plus ``read_above``, the few sequence numbers read out of
+order. Marking contiguous notifications read folds them into the watermark,
+so the document stays tiny no matter how many notices a society sends, and
+the unread count is two point reads.
+
+Run ``python notifications.py migrate`` once to number existing notifications
+and move their ``read_by`` arrays into this representation.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, Iterable, List
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from partitions import SocietyRouter, for_society, partitions
+
+logger = logging.getLogger(__name__)
+
+READS_COLLECTION = "notification_reads"
+# Out-of-order reads kept beyond the watermark; older ones are folded in
+MAX_READ_ABOVE = 500
+
+
+async def next_notification_seq(db, society_id: str) -> int:
+    society = await db.societies.find_one_and_update(
+        {"id": society_id},
+        # Same write bumps the society version so notification ETags change
+        {"$inc": {"notification_seq": 1, "version": 1}},
+        projection={"_id": 0, "notification_seq": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return society["notification_seq"]
+
+
+async def get_read_state(db, user_id: str, society_id: str) -> dict:
+    state = await db[READS_COLLECTION].find_one(
+        {"user_id": user_id, "society_id": society_id},
+        {"_id": 0, "read_seq": 1, "read_above": 1, "v": 1}
+    )
+    return state or {"read_seq": 0, "read_above": [], "v": 0}
+
+
+def is_read(state: dict, seq: int) -> bool:
+    return bool(seq) and (seq <= state["read_seq"] or seq in state["read_above"])
+
+
+def _compact(read_seq: int, read_above: Iterable[int]) -> tuple:
+    pending = sorted(s for s in set(read_above) if s > read_seq)
+    while pending and pending[0] == read_seq + 1:
+        read_seq = pending.pop(0)
+    if len(pending) > MAX_READ_ABOVE:
+        # Treat the oldest stragglers as read rather than let the document grow
+        read_seq = pending[-MAX_READ_ABOVE - 1]
+        pending = pending[-MAX_READ_ABOVE:]
+    return read_seq, pending
+
+
+async def mark_read(db, user_id: str, society_id: str, seqs: List[int]) -> None:
+    seqs = [s for s in seqs if s]
+    if not seqs:
+        return
+    # Optimistic concurrency on the version field; retries only on a racing write
+    while True:
+        state = await get_read_state(db, user_id, society_id)
+        read_seq, read_above = _compact(state["read_seq"], [*state["read_above"], *seqs])
+        if read_seq == state["read_seq"] and read_above == sorted(state["read_above"]):
+            return
+        try:
+            result = await db[READS_COLLECTION].update_one(
+                {"user_id": user_id, "society_id": society_id, "v": state["v"]},
+                {"$set": {"read_seq": read_seq, "read_above": read_above}, "$inc": {"v": 1}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            continue
+        if result.matched_count or result.upserted_id is not None:
+            return
+
+
+async def unread_count(db, user_id: str, society_id: str) -> int:
+    society, state = await asyncio.gather(
+        db.societies.find_one({"id": society_id}, {"_id": 0, "notification_seq": 1}),
+        get_read_state(db, user_id, society_id)
+    )
+    latest = (society or {}).get("notification_seq", 0)
+    return max(latest - state["read_seq"] - len(state["read_above"]), 0)
+
+
+async def migrate_read_by(db) -> None:
+    """Number legacy notifications and convert their read_by arrays to read state."""
+    async for society in db.societies.find({}, {"_id": 0, "id": 1, "notification_seq": 1}):
+        society_id = society["id"]
+        society_db = for_society(db, society_id)
+        seq = society.get("notification_seq", 0)
+        numbering = []
+        reads: Dict[str, List[int]] = {}
+        async for n in society_db.notifications.find(
+            {"society_id": society_id},
+            {"_id": 0, "id": 1, "seq": 1, "read_by": 1}
+        ).sort("created_at", 1):
+            n_seq = n.get("seq")
+            if not n_seq:
+                seq += 1
+                n_seq = seq
+                numbering.append(UpdateOne({"id": n["id"]}, {"$set": {"seq": n_seq}}))
+            for user_id in n.get("read_by", []):
+                reads.setdefault(user_id, []).append(n_seq)
+
+        if numbering:
+            await society_db.notifications.bulk_write(numbering, ordered=False)
+            await db.societies.update_one({"id": society_id}, {"$max": {"notification_seq": seq}})
+        for user_id, seqs in reads.items():
+            await mark_read(society_db, user_id, society_id, seqs)
+
+    for partition in partitions(db):
+        await partition.notifications.update_many({"read_by": {"$exists": True}}, {"$unset": {"read_by": ""}})
+    logger.info("Notification read state migrated")
+
+
+async def _main() -> None:
+    from codec import CLIENT_OPTIONS
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], **CLIENT_OPTIONS)
+    try:
+        await migrate_read_by(SocietyRouter.from_env(client))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        sys.exit("usage: python notifications.py migrate")
+    asyncio.run(_main())
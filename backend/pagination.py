@@ -0,0 +1,95 @@
+"""Keyset pagination and NDJSON streaming for payment history and dues.
+
+Payment pages are ordered by ``(payment_date, id)`` descending, dues pages
+by ``id`` within a society's month. The cursor is the sort key of the last
+document on the previous page, so every page is a bounded index range scan
+regardless of how deep the client has paged.
+Documents leave in API shape, amounts in rupees (see codec.py), without
+internal fields: responses built from them skip ``response_model``
+filtering, so ``PAYMENT_PROJECTION`` does it in the query.
+
+BSON orders dates after strings, so until ``migrate_types.py`` has run a
+cursor past the newest pre-migration payment does not reach older ones.
+"""
+import base64
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from codec import dumps, load_datetime, loads, public_money
+
+PAYMENT_SORT = [("payment_date", -1), ("id", -1)]
+DUE_SORT = [("id", 1)]
+# Sort fields stored as BSON dates; cursors carry them as ISO strings
+DATE_FIELDS = {"payment_date"}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+# Everything a Payment response carries; active_key is the state machine's, see payments.py
+PAYMENT_PROJECTION = {"_id": 0, "active_key": 0}
+
+
+def encode_cursor(doc: dict, sort: List[Tuple[str, int]] = PAYMENT_SORT) -> str:
+    raw = dumps([doc[field] for field, _ in sort])
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, sort: List[Tuple[str, int]] = PAYMENT_SORT) -> List[Any]:
+    try:
+        values = loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(sort):
+            raise ValueError(cursor)
+        values = [load_datetime(v) if field in DATE_FIELDS else v for (field, _), v in zip(sort, values)]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def after_cursor(query: dict, cursor: Optional[str], sort: List[Tuple[str, int]] = PAYMENT_SORT) -> dict:
+    """Restrict ``query`` to documents sorting strictly after ``cursor``."""
+    if not cursor:
+        return query
+    values = decode_cursor(cursor, sort)
+    # Tied on every earlier sort field, past the cursor on this one
+    clauses = [
+        {
+            **{field: value for (field, _), value in zip(sort[:n], values)},
+            sort[n][0]: {"$lt" if sort[n][1] < 0 else "$gt": values[n]},
+        }
+        for n in range(len(sort))
+    ]
+    return {**query, "$or": clauses} if len(clauses) > 1 else {**query, **clauses[0]}
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    cursor: Optional[str],
+    limit: int,
+    session=None,
+    sort: List[Tuple[str, int]] = PAYMENT_SORT,
+    projection: dict = PAYMENT_PROJECTION
+) -> Tuple[List[dict], Optional[str]]:
+    """Return one page and the cursor for the next one (None on the last page)."""
+    docs = await collection.find(
+        after_cursor(query, cursor, sort), projection, session=session
+    ).sort(sort).to_list(limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort)
+    return [public_money(doc) for doc in docs], next_cursor
+
+
+async def _ndjson_lines(mongo_cursor) -> AsyncIterator[bytes]:
+    async for doc in mongo_cursor:
+        yield dumps(public_money(doc)) + b"\n"
+
+
+def stream_ndjson(collection, query: dict, cursor: Optional[str], limit: Optional[int] = None) -> StreamingResponse:
+    """Stream matching documents as NDJSON straight off the Motor cursor."""
+    mongo_cursor = collection.find(after_cursor(query, cursor), PAYMENT_PROJECTION).sort(PAYMENT_SORT).batch_size(STREAM_BATCH_SIZE)
+    if limit:
+        mongo_cursor = mongo_cursor.limit(limit)
+    return StreamingResponse(_ndjson_lines(mongo_cursor), media_type="application/x-ndjson")
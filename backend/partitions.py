@@ -0,0 +1,258 @@
+"""Society-partitioned data layout.
+
+Everything a society generates lives in one *partition* database chosen
+from its id: payments, dues, ledger rows, notices and read-state
+(``SOCIETY_COLLECTIONS``). The directory database (``DB_NAME``) keeps what
+is looked up without a society in hand: users, societies, sessions, OTPs,
+jobs, rate limits, idempotency keys and the export cache.
+
+    SOCIETY_PARTITIONS=society_p0,society_p1,society_p2,society_p3
+
+Placement is rendezvous hashing of ``society_id`` over the partition
+names, so it is computed, never looked up, and adding a partition moves
+only the ~1/N of societies that hash to it. Left unset, the one
+partition is the directory database itself and the layout is the same as
+an unpartitioned deployment.
+
+Changing the partition list (including setting it for the first time)
+takes effect for reads immediately, so documents must be moved with it:
+
+    python partitions.py plan NAMES    # societies that would move to NAMES
+    python partitions.py move [RETIRED]  # with the new SOCIETY_PARTITIONS, API stopped
+
+``move`` copies every partitioned document that is not in its society's
+partition there, then deletes the original; re-running it is safe. Name
+partitions being dropped from the list as ``RETIRED`` so they are emptied
+too. The API
+refuses to start while the directory still holds partitioned collections.
+
+On a sharded cluster, give each partition database its own primary shard
+(``movePrimary``). Partitions then spread across shards without sharding
+any collection, and each query a handler issues reaches exactly one shard.
+
+Handlers get a ``SocietyRouter`` as ``db``. Directory collections are
+reached as before (``db.users``). Partitioned ones only through
+``db.for_society(society_id)``. Touching ``db.payments`` directly raises
+``UnroutedAccess``, so a scatter-gather query cannot slip in unnoticed.
+Maintenance sweeps that do span societies iterate ``db.partitions()``.
+"""
+import hashlib
+import os
+from collections import Counter
+from typing import Dict, List, Sequence
+
+from pymongo import ASCENDING, ReplaceOne
+
+SOCIETY_COLLECTIONS = frozenset({"payments", "dues", "society_ledger", "notifications", "notification_reads"})
+
+
+class UnroutedAccess(LookupError):
+    pass
+
+
+def placement(society_id: str, partition_names: Sequence[str]) -> str:
+    """The partition ``society_id`` lives in: the name with the highest hash of ``(name, society_id)``."""
+    return max(
+        partition_names,
+        key=lambda name: hashlib.blake2b(f"{name}:{society_id}".encode(), digest_size=8).digest()
+    )
+
+
+class SocietyDatabase:
+    """One partition seen through the directory: partitioned collections come from ``partition``, the rest from ``directory``.
+
+    Accepted anywhere a Motor database is, by helpers that take ``db``.
+    """
+
+    def __init__(self, directory, partition):
+        self.directory = directory
+        self.partition = partition
+
+    @property
+    def name(self) -> str:
+        return self.partition.name
+
+    def __getitem__(self, name: str):
+        if name in SOCIETY_COLLECTIONS:
+            return self.partition[name]
+        return self.directory[name]
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+class SocietyRouter:
+    """The directory database, plus a partition per society for ``SOCIETY_COLLECTIONS``."""
+
+    def __init__(self, directory, partition_names: Sequence[str] = ()):
+        self.directory = directory
+        names = list(dict.fromkeys(partition_names)) or [directory.name]
+        # Partitions inherit the client's codec options and the directory's read preference
+        self.partition_dbs: Dict[str, object] = {
+            name: directory if name == directory.name else directory.client.get_database(
+                name, read_preference=directory.read_preference
+            )
+            for name in names
+        }
+        self._views = {name: SocietyDatabase(directory, db) for name, db in self.partition_dbs.items()}
+
+    @classmethod
+    def from_env(cls, client) -> "SocietyRouter":
+        names = [n.strip() for n in os.environ.get('SOCIETY_PARTITIONS', '').split(',') if n.strip()]
+        return cls(client[os.environ['DB_NAME']], names)
+
+    @property
+    def client(self):
+        return self.directory.client
+
+    @property
+    def name(self) -> str:
+        return self.directory.name
+
+    def partition_name(self, society_id: str) -> str:
+        if len(self.partition_dbs) == 1:
+            return next(iter(self.partition_dbs))
+        return placement(society_id, list(self.partition_dbs))
+
+    def for_society(self, society_id: str) -> SocietyDatabase:
+        if not society_id:
+            raise UnroutedAccess("A society id is required to reach partitioned collections")
+        return self._views[self.partition_name(society_id)]
+
+    def partitions(self) -> List[SocietyDatabase]:
+        """Every partition, for maintenance that spans societies. Handlers never call this."""
+        return list(self._views.values())
+
+    def databases_holding(self, collection: str) -> list:
+        """The Motor databases that hold ``collection``."""
+        if collection in SOCIETY_COLLECTIONS:
+            return list(self.partition_dbs.values())
+        return [self.directory]
+
+    def with_read_preference(self, read_preference) -> "SocietyRouter":
+        """The same layout, read with ``read_preference``."""
+        directory = self.client.get_database(self.directory.name, read_preference=read_preference)
+        return SocietyRouter(directory, list(self.partition_dbs))
+
+    def __getitem__(self, name: str):
+        if name in SOCIETY_COLLECTIONS:
+            raise UnroutedAccess(f"{name} is partitioned by society; use db.for_society(society_id).{name}")
+        return self.directory[name]
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in SOCIETY_COLLECTIONS:
+            return self[name]
+        # Collections, command(), codec_options ... of the directory database
+        return getattr(self.directory, name)
+
+
+def for_society(db, society_id: str):
+    """``db`` narrowed to one society, for helpers that accept a router or a plain database."""
+    return db.for_society(society_id) if isinstance(db, SocietyRouter) else db
+
+
+def partitions(db) -> list:
+    """Each partition of ``db`` (just ``db`` itself when it is a plain database)."""
+    return db.partitions() if isinstance(db, SocietyRouter) else [db]
+
+
+def databases_holding(db, collection: str) -> list:
+    return db.databases_holding(collection) if isinstance(db, SocietyRouter) else [db]
+
+
+async def stranded_collections(router: SocietyRouter) -> List[str]:
+    """Partitioned collections with documents left in the directory database, which handlers no longer read."""
+    if router.directory.name in router.partition_dbs:
+        return []
+    return [
+        collection for collection in sorted(SOCIETY_COLLECTIONS)
+        if await router.directory[collection].find_one({}, {"_id": 1}) is not None
+    ]
+
+
+async def move_documents(router: SocietyRouter, retired: Sequence[str] = (), batch_size: int = 1000) -> Dict[str, int]:
+    """Move every partitioned document that is not in its society's partition there. Run with the API stopped.
+
+    Each batch is written to its target before it is deleted from the source, so an
+    interrupted run loses nothing and the next run picks up where it stopped.
+    """
+    sources = {router.directory.name: router.directory, **router.partition_dbs}
+    sources.update({name: router.client.get_database(name) for name in retired if name not in sources})
+    moved: Dict[str, int] = Counter()
+    for collection in sorted(SOCIETY_COLLECTIONS):
+        for source in sources.values():
+            last_id = None
+            while True:
+                query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+                docs = await source[collection].find(query).sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+                if not docs:
+                    break
+                last_id = docs[-1]["_id"]
+                by_target: Dict[str, list] = {}
+                for doc in docs:
+                    if not doc.get("society_id"):
+                        continue
+                    target = router.partition_name(doc["society_id"])
+                    if target != source.name:
+                        by_target.setdefault(target, []).append(doc)
+                for target, batch in by_target.items():
+                    await router.partition_dbs[target][collection].bulk_write(
+                        [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in batch], ordered=False
+                    )
+                    await source[collection].delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+                    moved[f"{source.name}.{collection} -> {target}"] += len(batch)
+    return dict(moved)
+
+
+def _plan(current: Sequence[str], proposed: Sequence[str], society_ids: Sequence[str]) -> Dict[str, List[str]]:
+    """Societies whose partition changes from ``current`` to ``proposed``, keyed ``"old -> new"``."""
+    moves: Dict[str, List[str]] = {}
+    for society_id in society_ids:
+        old, new = placement(society_id, current), placement(society_id, proposed)
+        if old != new:
+            moves.setdefault(f"{old} -> {new}", []).append(society_id)
+    return moves
+
+
+async def _main(command: str, names: List[str]) -> None:
+    from codec import CLIENT_OPTIONS
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], **CLIENT_OPTIONS)
+    try:
+        router = SocietyRouter.from_env(client)
+        if command == "move":
+            moved = await move_documents(router, names)
+            for route, count in sorted(moved.items()):
+                print(f"{route}: {count}")
+            print(f"{sum(moved.values())} documents moved")
+            return
+        society_ids = await router.societies.distinct("id")
+        moves = _plan(list(router.partition_dbs), names, society_ids)
+        for route, ids in sorted(moves.items()):
+            print(f"{route}: {len(ids)} societies")
+            for society_id in ids:
+                print(f"  {society_id}")
+        print(f"{sum(map(len, moves.values()))} of {len(society_ids)} societies would move")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    if sys.argv[1:2] in (["plan"], ["move"]) and len(sys.argv) <= 3:
+        names = [n.strip() for n in (sys.argv[2] if len(sys.argv) == 3 else "").split(",") if n.strip()]
+        if sys.argv[1] == "plan" and not names:
+            sys.exit("usage: python partitions.py plan NAME[,NAME...]")
+        asyncio.run(_main(sys.argv[1], names))
+    else:
+        sys.exit("usage: python partitions.py plan NAME[,NAME...] | python partitions.py move [RETIRED,...]")
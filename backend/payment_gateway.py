@@ -0,0 +1,169 @@
+"""Async payment-gateway clients.
+
+``RazorpayGateway`` talks to the Razorpay Orders API over a pooled
+``httpx.AsyncClient`` with per-call timeouts, retries with full jitter and a
+circuit breaker, so a slow gateway never blocks the event loop or piles up
+requests. Creating an order is not idempotent, so only failures where the
+gateway cannot have processed the request are retried: connection errors
+before anything was sent, 429 and 503. A read timeout or any other 5xx may
+have created the order and fails the call instead. ``MockGateway`` has the same interface for ``RAZORPAY_MOCK_MODE``.
+Point ``RAZORPAY_BASE_URL`` at a local stand-in to load-test the real client.
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import random
+import time
+import uuid
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    """The gateway could not complete the call."""
+
+
+class GatewayUnavailable(GatewayError):
+    """The circuit breaker is open; the gateway is not being called."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def check(self) -> bool:
+        """Raise if the call may not go ahead; True when it is the half-open trial call."""
+        state = self.state
+        if state == "open" or (state == "half-open" and self.probing):
+            raise GatewayUnavailable("Payment gateway circuit is open")
+        if state == "half-open":
+            # Admit one trial call; the rest fail fast until it resolves
+            self.probing = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """End a trial call that neither succeeded nor failed, e.g. one that was cancelled."""
+        self.probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.probing = False
+        self.failures += 1
+        # A failed trial call while half-open re-opens the circuit immediately
+        if self.failures >= self.failure_threshold or self.state == "half-open":
+            self.opened_at = time.monotonic()
+
+
+class MockGateway:
+    mock = True
+
+    def __init__(self, latency_ms: float = 0):
+        self.key_id = "mock_key"
+        self.latency_ms = latency_ms
+
+    async def create_order(self, amount_paise: int, receipt: str, currency: str = "INR") -> dict:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return {"id": f"order_mock_{str(uuid.uuid4())[:8]}", "amount": amount_paise, "currency": currency}
+
+    def verify_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        return True
+
+    async def close(self) -> None:
+        pass
+
+
+class RazorpayGateway:
+    mock = False
+
+    def __init__(
+        self,
+        key_id: str,
+        key_secret: str,
+        base_url: str = "https://api.razorpay.com/v1",
+        timeout: float = 5.0,
+        max_retries: int = 2,
+        max_connections: int = 50,
+        breaker: CircuitBreaker = None
+    ):
+        self.key_id = key_id
+        self._secret = key_secret.encode()
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            auth=(key_id, key_secret),
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 2.0)),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        trial = self.breaker.check()
+        try:
+            return await self._attempts(path, payload)
+        finally:
+            if trial:
+                self.breaker.release()
+
+    async def _attempts(self, path: str, payload: dict) -> dict:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._client.post(path, json=payload)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                # Nothing reached the gateway
+                error, retryable = f"{type(e).__name__}: {e}", True
+            except httpx.TransportError as e:
+                # The request may have been received and acted on
+                error, retryable = f"{type(e).__name__}: {e}", False
+            else:
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    return response.json()
+                if response.status_code < 500 and response.status_code != 429:
+                    # The request itself is wrong; retrying won't help and the gateway is healthy
+                    self.breaker.record_success()
+                    raise GatewayError(f"Gateway rejected request: {response.status_code} {response.text[:200]}")
+                error, retryable = f"HTTP {response.status_code}", response.status_code in (429, 503)
+
+            self.breaker.record_failure()
+            logger.warning(f"Gateway call {path} failed (attempt {attempt + 1}): {error}")
+            if not retryable or attempt == self.max_retries or self.breaker.state == "open":
+                break
+            await asyncio.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+        raise GatewayError(f"Gateway call {path} failed: {error}")
+
+    async def create_order(self, amount_paise: int, receipt: str, currency: str = "INR") -> dict:
+        return await self._post("/orders", {
+            "amount": amount_paise,
+            "currency": currency,
+            "receipt": receipt,
+            "payment_capture": 1
+        })
+
+    def verify_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        # Same check as razorpay.Utility.verify_payment_signature, done locally
+        expected = hmac.new(self._secret, f"{order_id}|{payment_id}".encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    async def close(self) -> None:
+        await self._client.aclose()
@@ -0,0 +1,237 @@
+"""Payment state machine.
+
+    pending --> completed
+       |
+       +-----> failed    (gateway error, bad signature)
+       +-----> expired   (left unpaid past PAYMENT_ORDER_TTL_MINUTES)
+
+A payment in ``pending`` or ``completed`` carries ``active_key`` =
+``"<user_id>:<month>"``, which has a unique partial index. At most one
+live payment can exist per resident per month, whatever the number of
+double-clicks or retries. Leaving the live states unsets the key, so the
+month can be paid again. Every transition is a single conditional
+``find_one_and_update``.
+
+Run ``python payments.py backfill`` once to give existing payments their
+``active_key`` (older duplicate pending orders are expired), and
+``python payments.py expire`` to sweep stale pending orders. Both bump
+the version of every society they change, as the server's handlers do.
+"""
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from codec import CLIENT_OPTIONS, store_datetime, stored_paise, utcnow
+from partitions import SocietyRouter
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+EXPIRED = "expired"
+LIVE_STATES = (PENDING, COMPLETED)
+
+PAYMENT_ORDER_TTL = timedelta(minutes=int(os.environ.get('PAYMENT_ORDER_TTL_MINUTES', '30')))
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+# Directory collection: gateway order id -> the society partition holding its payment
+ORDER_ROUTES_COLLECTION = "order_routes"
+ORDER_ROUTE_TTL = timedelta(days=7)
+
+
+def active_key(user_id: str, month: str) -> str:
+    return f"{user_id}:{month}"
+
+
+async def claim_month(db, payment_doc: dict) -> Tuple[dict, bool]:
+    """Insert ``payment_doc`` as the live payment for its month, or return the one already there.
+
+    Returns ``(live_payment, created)``.
+    """
+    key = active_key(payment_doc['user_id'], payment_doc['month'])
+    for _ in range(3):
+        try:
+            doc = await db.payments.find_one_and_update(
+                {"active_key": key},
+                {"$setOnInsert": {**payment_doc, "active_key": key}},
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return doc, doc['id'] == payment_doc['id']
+        except DuplicateKeyError:
+            # Lost an upsert race to a concurrent request; its document is visible now
+            continue
+    raise RuntimeError(f"Could not claim payment slot {key}")
+
+
+async def attach_order(db, payment_id: str, order_id: str) -> bool:
+    result = await db.payments.update_one(
+        {"id": payment_id, "status": PENDING, "razorpay_order_id": None},
+        {"$set": {"razorpay_order_id": order_id}}
+    )
+    return result.modified_count == 1
+
+
+async def route_order(db, order_id: str, payment: dict) -> None:
+    """Remember the society an order was placed in; the payer may have moved on by the time it is verified."""
+    await db[ORDER_ROUTES_COLLECTION].update_one(
+        {"razorpay_order_id": order_id},
+        {"$setOnInsert": {
+            "society_id": payment['society_id'],
+            "user_id": payment['user_id'],
+            "expires_at": store_datetime(utcnow() + ORDER_ROUTE_TTL)
+        }},
+        upsert=True
+    )
+
+
+async def order_society(db, order_id: str, user_id: str) -> Optional[str]:
+    route = await db[ORDER_ROUTES_COLLECTION].find_one(
+        {"razorpay_order_id": order_id, "user_id": user_id}, {"_id": 0, "society_id": 1}
+    )
+    return route['society_id'] if route else None
+
+
+def placed_before(cutoff) -> dict:
+    """Filter for payments whose ``payment_date`` is older than ``cutoff``."""
+    return {"$or": [
+        {"payment_date": {"$lt": store_datetime(cutoff)}},
+        # ISO strings written before migrate_types.py ran
+        {"payment_date": {"$type": "string", "$lt": cutoff.isoformat()}},
+    ]}
+
+
+async def _leave_live_state(db, query: dict, status: str) -> Optional[dict]:
+    return await db.payments.find_one_and_update(
+        {**query, "status": PENDING},
+        {"$set": {"status": status}, "$unset": {"active_key": ""}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+
+
+async def fail_payment(db, query: dict) -> Optional[dict]:
+    return await _leave_live_state(db, query, FAILED)
+
+
+async def expire_if_stale(db, payment: dict) -> Optional[dict]:
+    return await _leave_live_state(db, {"id": payment['id'], **placed_before(utcnow() - PAYMENT_ORDER_TTL)}, EXPIRED)
+
+
+async def complete(db, order_id: str, user_id: str, fields: dict) -> Optional[dict]:
+    """pending -> completed. Returns the payment as it was before, or None if it was not pending."""
+    return await db.payments.find_one_and_update(
+        {"razorpay_order_id": order_id, "user_id": user_id, "status": PENDING},
+        {"$set": {**fields, "status": COMPLETED}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+
+
+async def expire_stale_orders(db, on_expired=None) -> int:
+    """Expire every pending order older than the TTL; ``on_expired`` is awaited with each one."""
+    expired = 0
+    async for payment in db.payments.find({"status": PENDING, **placed_before(utcnow() - PAYMENT_ORDER_TTL)}, {"_id": 0}):
+        if await expire_if_stale(db, payment):
+            expired += 1
+            if on_expired:
+                await on_expired(payment)
+    return expired
+
+
+# ===================== IDEMPOTENCY KEYS =====================
+
+async def idempotent_replay(db, user_id: str, endpoint: str, key: Optional[str]) -> Optional[dict]:
+    if not key:
+        return None
+    stored = await db.idempotency_keys.find_one(
+        {"user_id": user_id, "endpoint": endpoint, "key": key},
+        {"_id": 0, "response": 1}
+    )
+    return stored['response'] if stored else None
+
+
+async def remember_response(db, user_id: str, endpoint: str, key: Optional[str], response: dict) -> None:
+    if not key:
+        return
+    try:
+        await db.idempotency_keys.insert_one({
+            "user_id": user_id,
+            "endpoint": endpoint,
+            "key": key,
+            "response": response,
+            "expires_at": utcnow() + IDEMPOTENCY_TTL
+        })
+    except DuplicateKeyError:
+        pass
+
+
+# ===================== MAINTENANCE =====================
+
+async def backfill_active_keys(db, on_expired=None) -> None:
+    """Give live payments their active_key, keeping one per user and month; ``on_expired`` gets each society id."""
+    pipeline = [
+        {"$match": {"status": {"$in": list(LIVE_STATES)}, "active_key": {"$exists": False}}},
+        {"$sort": {"payment_date": -1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "month": "$month"},
+            "society_id": {"$first": "$society_id"},
+            "payments": {"$push": {"id": "$id", "status": "$status"}}
+        }},
+    ]
+    async for group in db.payments.aggregate(pipeline, allowDiskUse=True):
+        payments = group['payments']
+        completed = [p for p in payments if p['status'] == COMPLETED]
+        keep = completed[0] if completed else payments[0]
+        key = active_key(group['_id']['user_id'], group['_id']['month'])
+        try:
+            await db.payments.update_one({"id": keep['id']}, {"$set": {"active_key": key}})
+        except DuplicateKeyError:
+            keep = None  # a newer live payment already holds the month
+        stale = [p['id'] for p in payments if p['status'] == PENDING and p is not keep]
+        if stale:
+            await db.payments.update_many({"id": {"$in": stale}}, {"$set": {"status": EXPIRED}})
+            if on_expired:
+                await on_expired(group['society_id'])
+    logger.info("Payment active keys backfilled")
+
+
+async def _main(command: str) -> None:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+    from ledger import bump_society_versions, record_pending_cancelled
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], **CLIENT_OPTIONS)
+    try:
+        # Payments live in the society partitions; each is swept on its own
+        for db in SocietyRouter.from_env(client).partitions():
+            if command == "backfill":
+                async def expired(society_id, db=db):
+                    await bump_society_versions(db, [society_id])
+                await backfill_active_keys(db, expired)
+            else:
+                async def cancel(payment, db=db):
+                    if payment.get('razorpay_order_id'):
+                        await record_pending_cancelled(db, payment['society_id'], payment['month'], stored_paise(payment, 'amount'))
+                    await bump_society_versions(db, [payment['society_id']])
+                logger.info(f"Expired {await expire_stale_orders(db, cancel)} stale pending orders in {db.name}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] not in ("backfill", "expire"):
+        sys.exit("usage: python payments.py backfill|expire")
+    asyncio.run(_main(sys.argv[1]))
@@ -0,0 +1,107 @@
+"""Token-bucket rate limiting.
+
+A ``Policy`` is a bucket of ``capacity`` tokens refilled evenly over
+``period`` seconds. Buckets live in a backend. ``MemoryBackend`` is
+per-process. ``MongoBackend`` keeps them in the ``rate_limits`` collection
+and refills and spends with one atomic pipeline update, so every worker
+shares the same buckets.
+
+Policies can be overridden with ``RATE_LIMITS``, e.g.
+``RATE_LIMITS="otp_phone=3/600,search_user=20/10"`` (capacity/period seconds).
+"""
+import math
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, Tuple
+
+from pymongo import ReturnDocument
+
+from codec import utcnow
+
+
+@dataclass(frozen=True)
+class Policy:
+    capacity: int
+    period: float  # seconds to refill a full bucket
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+def parse_policies(spec: str) -> Dict[str, Policy]:
+    policies = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, limit = item.split("=")
+        capacity, period = limit.split("/")
+        policies[name.strip()] = Policy(int(capacity), float(period))
+    return policies
+
+
+class MemoryBackend:
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, policy: Policy, cost: float = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, ts = self._buckets.get(key, (policy.capacity, now))
+        tokens = min(policy.capacity, tokens + (now - ts) * policy.rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, tokens
+
+
+class MongoBackend:
+    def __init__(self, db, collection: str = "rate_limits"):
+        self.collection = db[collection]
+
+    async def take(self, key: str, policy: Policy, cost: float = 1) -> Tuple[bool, float]:
+        now = time.time()
+        refilled = {"$min": [
+            policy.capacity,
+            {"$add": [
+                {"$ifNull": ["$tokens", policy.capacity]},
+                {"$multiply": [{"$subtract": [now, {"$ifNull": ["$ts", now]}]}, policy.rate]},
+            ]},
+        ]}
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "ts": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                    # A bucket idle for a full period is back at capacity and can be dropped
+                    "expires_at": utcnow() + timedelta(seconds=policy.period),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["allowed"], doc["tokens"]
+
+
+class RateLimiter:
+    def __init__(self, backend, policies: Dict[str, Policy]):
+        self.backend = backend
+        self.policies = policies
+        self.allowed: Dict[str, int] = defaultdict(int)
+        self.rejected: Dict[str, int] = defaultdict(int)
+
+    async def check(self, policy_name: str, key: str, cost: float = 1) -> Tuple[bool, int]:
+        """Spend ``cost`` tokens from ``key``'s bucket. Returns ``(allowed, retry_after_seconds)``."""
+        policy = self.policies[policy_name]
+        allowed, tokens = await self.backend.take(f"{policy_name}:{key}", policy, cost)
+        if allowed:
+            self.allowed[policy_name] += 1
+            return True, 0
+        self.rejected[policy_name] += 1
+        return False, max(1, math.ceil((cost - tokens) / policy.rate))
@@ -0,0 +1,84 @@
+"""Read routing: which queries may be served by a secondary.
+
+Every read is one of two kinds:
+
+* strong - goes through the primary ``db`` handle. Covers anything that
+  decides a write or must see the caller's own last write: OTP checks,
+  payment dedupe and verification, read-state, society versions.
+* stale-tolerant - goes through ``stale_database(db)``, which reads from
+  secondaries (``READ_PREFERENCE``, default ``secondaryPreferred``) no more
+  than ``READ_MAX_STALENESS_SECONDS`` behind. Covers society search,
+  notice lists, payment history and reports.
+
+A stale-tolerant read behind a version-based ETag must not be older than
+the version it is tagged with, or clients would cache old data under a new
+tag. Such reads run through a ``CausalFence``: the version is read on the
+primary in a causally consistent session, and every later read under the
+fence waits until its secondary has caught up to that point.
+
+On a single-node replica set ``secondaryPreferred`` falls back to the
+primary, so the same code runs in development.
+"""
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from pymongo.read_preferences import Nearest, Primary, Secondary, SecondaryPreferred
+
+from partitions import SocietyRouter
+
+MIN_MAX_STALENESS_SECONDS = 90  # the smallest bound MongoDB accepts
+READ_PREFERENCES = {
+    "primary": Primary,
+    "secondaryPreferred": SecondaryPreferred,
+    "secondary": Secondary,
+    "nearest": Nearest,
+}
+
+
+def stale_read_preference(mode: str = "secondaryPreferred", max_staleness: int = MIN_MAX_STALENESS_SECONDS):
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference {mode!r}, expected one of {', '.join(READ_PREFERENCES)}")
+    if mode == "primary":
+        return Primary()
+    return READ_PREFERENCES[mode](max_staleness=max(max_staleness, MIN_MAX_STALENESS_SECONDS))
+
+
+def stale_database(db, mode: str = "secondaryPreferred", max_staleness: int = MIN_MAX_STALENESS_SECONDS):
+    """The same database (or partitioned layout, see partitions.py) as ``db``, read from secondaries within the staleness bound."""
+    preference = stale_read_preference(mode, max_staleness)
+    if isinstance(db, SocietyRouter):
+        return db.with_read_preference(preference)
+    return db.client.get_database(db.name, read_preference=preference)
+
+
+class CausalFence:
+    """Orders reads across sessions: each one sees at least what earlier ones under the fence saw.
+
+    ``run`` gives every call its own session, so fenced reads may run
+    concurrently (a single session must not be shared by parallel operations).
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.cluster_time: Optional[dict] = None
+        self.operation_time = None
+
+    @asynccontextmanager
+    async def session(self):
+        async with await self.client.start_session(causal_consistency=True) as session:
+            if self.cluster_time:
+                session.advance_cluster_time(self.cluster_time)
+            if self.operation_time:
+                session.advance_operation_time(self.operation_time)
+            yield session
+            if session.cluster_time and (
+                self.cluster_time is None or session.cluster_time["clusterTime"] > self.cluster_time["clusterTime"]
+            ):
+                self.cluster_time = session.cluster_time
+            if session.operation_time and (self.operation_time is None or session.operation_time > self.operation_time):
+                self.operation_time = session.operation_time
+
+    async def run(self, fn, *args, **kwargs):
+        """Await ``fn(*args, session=..., **kwargs)`` inside a fenced session."""
+        async with self.session() as session:
+            return await fn(*args, session=session, **kwargs)
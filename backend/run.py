@@ -0,0 +1,108 @@
+"""Production entry point.
+
+    python backend/run.py [--workers N] [--host 0.0.0.0] [--port 8001]
+
+Runs ``WEB_CONCURRENCY`` (default: one per core) uvicorn worker processes
+sharing one listening socket, on uvloop with the httptools parser. Each
+worker warms its Mongo pool, indexes and revocation filter before
+``/readyz`` turns 200 (see ``lifespan`` in server.py).
+
+On SIGTERM a worker first fails ``/readyz`` and closes its SSE streams, so
+a load balancer stops routing to it. It then stops accepting connections
+and lets in-flight requests finish for up to ``GRACEFUL_TIMEOUT_SECONDS``
+before the lifespan shutdown closes the job queue and the Mongo client.
+
+Mongo pool limits apply per worker; size ``MONGO_MAX_POOL_SIZE`` so that
+``workers x MONGO_MAX_POOL_SIZE`` stays within the server's connection limit.
+
+Several workers only behave as one server when their shared state lives
+in Mongo. With more than one worker, rate limits default to the Mongo
+backend, and startup is refused unless ``NOTIFICATION_CHANGE_STREAM=true``
+(needs a replica set) so notices reach streams on every worker. Cached
+users are invalidated across workers by server.py either way.
+``--allow-per-worker-state`` skips the check, e.g. for benchmarks.
+"""
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingServer(uvicorn.Server):
+    def handle_exit(self, sig, frame):
+        # Already imported by config.load() in this worker
+        from server import begin_drain
+        if not self.should_exit:
+            begin_drain()
+        super().handle_exit(sig, frame)
+
+
+def build_config(host: str, port: int, workers: int) -> uvicorn.Config:
+    return uvicorn.Config(
+        "server:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        lifespan="on",
+        proxy_headers=True,
+        forwarded_allow_ips=os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1'),
+        backlog=int(os.environ.get('BACKLOG', '2048')),
+        timeout_keep_alive=int(os.environ.get('KEEP_ALIVE_SECONDS', '5')),
+        timeout_graceful_shutdown=int(os.environ.get('GRACEFUL_TIMEOUT_SECONDS', '20')),
+        access_log=os.environ.get('ACCESS_LOG', 'false').lower() == 'true',
+    )
+
+
+def shared_state_problems() -> list:
+    """Settings that would leave state per worker when running several."""
+    problems = []
+    if os.environ.get('RATE_LIMIT_BACKEND') != 'mongo':
+        problems.append("RATE_LIMIT_BACKEND=mongo, or each worker enforces its own rate limits")
+    if os.environ.get('NOTIFICATION_CHANGE_STREAM', 'false').lower() != 'true':
+        problems.append("NOTIFICATION_CHANGE_STREAM=true, or notices only reach streams on the worker that created them")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the API with multiple uvicorn workers")
+    parser.add_argument("--host", default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', '8001')))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)))
+    parser.add_argument("--allow-per-worker-state", action="store_true",
+                        help="run several workers even if rate limits or notification push stay per worker")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Read by server.py when each worker imports it
+        os.environ.setdefault('RATE_LIMIT_BACKEND', 'mongo')
+        problems = shared_state_problems()
+        if problems and not args.allow_per_worker_state:
+            sys.exit(f"Refusing to start {args.workers} workers; set " + "; ".join(problems)
+                     + ". Or run with --workers 1.")
+        for problem in problems:
+            logger.warning(f"Running {args.workers} workers without {problem}")
+
+    config = build_config(args.host, args.port, args.workers)
+    server = DrainingServer(config)
+    logger.info(f"Starting {args.workers} worker(s) on {args.host}:{args.port}")
+    if args.workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
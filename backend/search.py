@@ -0,0 +1,170 @@
+"""Indexed society name search.
+
+Each society stores ``name_norm`` (case- and accent-folded name) and
+``name_tokens`` (its words). Folding only strips Latin-style accents, so
+names in Devanagari or any other script keep their letters. A query
+matches societies containing every complete query word plus a word
+starting with the last, still-being-typed word. The prefix becomes a range
+scan on the multikey ``name_tokens`` index, so no query ever scans the
+collection.
+
+Candidates are capped, so the better matches are fetched by their own
+bounded queries before the open-ended prefix scan fills the rest: names
+starting with the whole query (a ``name_norm`` range in index order, exact
+match first), then names with the last word complete.
+
+Run ``python search.py backfill`` to (re)compute the search fields on
+societies created before this existed or before ``normalize`` changed.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+import unicodedata
+from typing import List
+
+from pymongo import UpdateOne
+from pymongo.errors import ExecutionTimeout
+
+logger = logging.getLogger(__name__)
+
+SEARCH_RESULT_LIMIT = 20
+SEARCH_CANDIDATE_LIMIT = 200
+SEARCH_BUDGET_MS = int(os.environ.get('SEARCH_BUDGET_MS', '150'))
+MAX_QUERY_TOKENS = 8
+
+_ACCENTS = re.compile(r"[\u0300-\u036f]+")  # combining diacritical marks
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Casefold, strip accents and turn everything but letters, digits and other-script marks into spaces."""
+    folded = unicodedata.normalize("NFC", _ACCENTS.sub("", unicodedata.normalize("NFKD", text.casefold())))
+    # Vowel signs and viramas are marks (M*), part of the word in Indic scripts
+    words = "".join(c if unicodedata.category(c)[0] in "LNM" else " " for c in folded)
+    return _SPACES.sub(" ", words).strip()
+
+
+def prefix_range(prefix: str) -> dict:
+    """Range matching every string that starts with ``prefix``, in code point (and so UTF-8 byte) order."""
+    last = ord(prefix[-1]) + 1
+    if 0xD800 <= last < 0xE000:
+        last = 0xE000  # surrogates cannot be encoded
+    return {"$gte": prefix, "$lt": prefix[:-1] + chr(last)}
+
+
+def search_fields(name: str) -> dict:
+    """Fields stored on a society so it can be found by ``find_societies``."""
+    name_norm = normalize(name)
+    return {"name_norm": name_norm, "name_tokens": sorted(set(name_norm.split()))}
+
+
+def _rank(society: dict, query_norm: str, last_token: str) -> tuple:
+    name_norm = society.get("name_norm", "")
+    if name_norm == query_norm:
+        tier = 0
+    elif name_norm.startswith(query_norm):
+        tier = 1
+    elif any(t == last_token for t in society.get("name_tokens", [])):
+        tier = 2
+    else:
+        tier = 3
+    return (tier, len(name_norm), name_norm)
+
+
+async def _candidates(cursor, query_norm: str) -> List[dict]:
+    found = []
+    try:
+        async for society in cursor.max_time_ms(SEARCH_BUDGET_MS):
+            found.append(society)
+    except ExecutionTimeout:
+        # Serve what arrived within budget rather than stall the keystroke
+        logger.warning(f"Society search for {query_norm!r} hit the {SEARCH_BUDGET_MS}ms budget")
+    return found
+
+
+async def find_societies(db, query: str, limit: int = SEARCH_RESULT_LIMIT) -> List[dict]:
+    query_norm = normalize(query)
+    tokens = query_norm.split()[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return []
+
+    *complete, prefix = tokens
+    clauses = [{"name_tokens": t} for t in complete]
+
+    started = time.monotonic()
+    batches = await asyncio.gather(
+        # Exact and whole-name prefix matches, exact first in name_norm order
+        _candidates(
+            db.societies.find({"name_norm": prefix_range(query_norm)}, {"_id": 0}).sort("name_norm", 1).limit(limit),
+            query_norm
+        ),
+        # The last word complete
+        _candidates(
+            db.societies.find({"$and": clauses + [{"name_tokens": prefix}]}, {"_id": 0}).limit(SEARCH_CANDIDATE_LIMIT),
+            query_norm
+        ),
+        # The last word as a prefix, in no particular order
+        _candidates(
+            db.societies.find({"$and": clauses + [{"name_tokens": prefix_range(prefix)}]}, {"_id": 0}).limit(SEARCH_CANDIDATE_LIMIT),
+            query_norm
+        ),
+    )
+    candidates = {}
+    for batch in batches:
+        for society in batch:
+            candidates.setdefault(society["id"], society)
+
+    results = sorted(candidates.values(), key=lambda s: _rank(s, query_norm, prefix))[:limit]
+    for society in results:
+        society.pop("name_norm", None)
+        society.pop("name_tokens", None)
+
+    elapsed_ms = (time.monotonic() - started) * 1000
+    if elapsed_ms > SEARCH_BUDGET_MS:
+        logger.warning(f"Society search for {query_norm!r} took {elapsed_ms:.0f}ms")
+    return results
+
+
+async def backfill_search_fields(db, batch_size: int = 1000) -> int:
+    """Set the search fields on every society whose stored ones are missing or out of date."""
+    updated = 0
+    batch = []
+    async for society in db.societies.find({}, {"_id": 0, "id": 1, "name": 1, "name_norm": 1, "name_tokens": 1}):
+        fields = search_fields(society["name"])
+        if all(society.get(field) == value for field, value in fields.items()):
+            continue
+        batch.append(UpdateOne({"id": society["id"]}, {"$set": fields}))
+        if len(batch) >= batch_size:
+            await db.societies.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await db.societies.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+
+async def _main() -> None:
+    from codec import CLIENT_OPTIONS
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], **CLIENT_OPTIONS)
+    try:
+        updated = await backfill_search_fields(client[os.environ['DB_NAME']])
+        logger.info(f"Backfilled search fields on {updated} societies")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        sys.exit("usage: python search.py backfill")
+    asyncio.run(_main())
@@ -1,18 +1,48 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
+from contextlib import asynccontextmanager
+import hashlib
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
-import jwt
+from datetime import datetime, timedelta
 import random
-import razorpay
+import tempfile
+
+from analytics import collection_report, report_cache as analytics_cache
+from billing import DUES_COLLECTION, bill_society, due_amount, mark_due_paid
+from cache import InvalidationFeed, TTLCache
+from codec import (
+    CLIENT_OPTIONS, ORJSONResponse, load_datetime, public_money, store_datetime, stored_paise, to_document, to_paise,
+    to_rupees, utcnow
+)
+from exports import export_response, society_statement_key, user_statement_key
+from indexes import ensure_indexes
+from jobs import JobQueue
+from ledger import get_year, record_order_created, record_payment_completed, record_pending_cancelled
+from member_import import import_members
+from metrics import MetricsMiddleware, MongoCommandListener, registry as metrics_registry, render_prometheus
+from hub import NotificationHub, run_change_stream_bridge
+from notifications import get_read_state, is_read, mark_read, next_notification_seq, unread_count
+from ratelimit import MemoryBackend, MongoBackend, Policy, RateLimiter, parse_policies
+from readpref import CausalFence, stale_database
+from search import find_societies, search_fields
+from tokens import KeyRing, RevocationList, TokenError, TokenService
+from payments import (
+    attach_order, claim_month, complete as complete_payment, expire_if_stale, fail_payment,
+    idempotent_replay, order_society, remember_response, route_order
+)
+from partitions import SocietyRouter, stranded_collections
+from payment_gateway import GatewayError, MockGateway, RazorpayGateway
+from pagination import DEFAULT_PAGE_SIZE, DUE_SORT, MAX_PAGE_SIZE, fetch_page, stream_ndjson
 
 
 ROOT_DIR = Path(__file__).parent
@@ -20,13 +50,48 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Pool limits are per worker process: the server sees up to workers x MONGO_MAX_POOL_SIZE connections
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000')),
+    waitQueueTimeoutMS=int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000')),
+    serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    connectTimeoutMS=int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+    socketTimeoutMS=int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000')),
+    event_listeners=[MongoCommandListener()],
+    **CLIENT_OPTIONS
+)
+# Directory collections plus per-society partitions (SOCIETY_PARTITIONS); see partitions.py
+db = SocietyRouter.from_env(client)
+# Stale-tolerant reads (search, notices, history, reports) go to secondaries; see readpref.py
+stale_db = stale_database(
+    db,
+    os.environ.get('READ_PREFERENCE', 'secondaryPreferred'),
+    int(os.environ.get('READ_MAX_STALENESS_SECONDS', '90'))
+)
 
-# JWT Configuration
+# JWT Configuration: short-lived access tokens plus rotating refresh tokens, see tokens.py
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
-JWT_ALGORITHM = 'HS256'
-JWT_EXPIRATION_HOURS = 720  # 30 days
+token_service = TokenService(
+    db,
+    KeyRing.from_spec(os.environ.get('JWT_KEYS', ''), os.environ.get('JWT_ACTIVE_KID'), JWT_SECRET),
+    RevocationList(db, sync_seconds=float(os.environ.get('REVOCATION_SYNC_SECONDS', '10'))),
+    access_ttl=timedelta(minutes=float(os.environ.get('JWT_ACCESS_TTL_MINUTES', '15'))),
+    refresh_ttl=timedelta(days=float(os.environ.get('JWT_REFRESH_TTL_DAYS', '30')))
+)
+
+# Auth cache: decoded tokens and User objects, so parallel dashboard calls share one user read
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '10000'))
+token_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+# User writes on one worker reach the other workers' caches within USER_CACHE_SYNC_SECONDS
+auth_invalidations = InvalidationFeed(
+    db, {"users": user_cache}, sync_seconds=float(os.environ.get('USER_CACHE_SYNC_SECONDS', '1'))
+)
 
 # Configure logging first
 logging.basicConfig(
@@ -41,18 +106,105 @@ RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', '')
 RAZORPAY_MOCK_MODE = not RAZORPAY_KEY_ID or not RAZORPAY_KEY_SECRET
 
 if not RAZORPAY_MOCK_MODE:
-    razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+    payment_gateway = RazorpayGateway(
+        RAZORPAY_KEY_ID,
+        RAZORPAY_KEY_SECRET,
+        base_url=os.environ.get('RAZORPAY_BASE_URL', 'https://api.razorpay.com/v1'),
+        timeout=float(os.environ.get('RAZORPAY_TIMEOUT_SECONDS', '5')),
+        max_retries=int(os.environ.get('RAZORPAY_MAX_RETRIES', '2'))
+    )
 else:
-    razorpay_client = None
+    payment_gateway = MockGateway(latency_ms=float(os.environ.get('RAZORPAY_MOCK_LATENCY_MS', '0')))
     logger.info("Running in MOCK payment mode - Razorpay credentials not configured")
 
+# Notification push: publish locally, or via a Mongo change stream when running several workers
+NOTIFICATION_CHANGE_STREAM = os.environ.get('NOTIFICATION_CHANGE_STREAM', 'false').lower() == 'true'
+notification_hub = NotificationHub()
+
+# Background jobs; the pool runs in this process unless a separate worker is deployed
+JOB_WORKERS_INLINE = os.environ.get('JOB_WORKERS_INLINE', 'true').lower() == 'true'
+job_queue = JobQueue(db, workers=int(os.environ.get('JOB_WORKERS', '4')))
+
+# Rate limiting; use the mongo backend when several workers must share buckets
+RATE_LIMIT_POLICIES = {
+    "otp_phone": Policy(capacity=3, period=600),
+    "otp_ip": Policy(capacity=20, period=600),
+    # Guesses at a 6-digit code; a handful per phone per window keeps brute force hopeless within its 10 minutes
+    "otp_verify_phone": Policy(capacity=5, period=600),
+    "otp_verify_ip": Policy(capacity=50, period=600),
+    "search_user": Policy(capacity=20, period=10),
+    "search_ip": Policy(capacity=100, period=10),
+    **parse_policies(os.environ.get('RATE_LIMITS', ''))
+}
+if os.environ.get('RATE_LIMIT_BACKEND', 'memory') == 'mongo':
+    rate_limiter = RateLimiter(MongoBackend(db), RATE_LIMIT_POLICIES)
+else:
+    rate_limiter = RateLimiter(MemoryBackend(), RATE_LIMIT_POLICIES)
+
+# ===================== LIFECYCLE =====================
+
+async def retry_until_done(step: str, fn, *args):
+    """Await ``fn(*args)`` until it succeeds; Mongo may still be coming up when a worker starts."""
+    while True:
+        try:
+            return await fn(*args)
+        except Exception as e:
+            logger.error(f"{step} failed, retrying: {e}")
+            await asyncio.sleep(2)
+
+async def _warm_up_once():
+    await asyncio.gather(*(db.command("ping") for _ in range(max(1, MONGO_MIN_POOL_SIZE))))
+    await ensure_indexes(db)
+    await token_service.revocations.load()
+
+async def warm_up():
+    """Open pool connections, build indexes and load revocations; /readyz stays 503 until done."""
+    await retry_until_done("Warm-up", _warm_up_once)
+    app.state.ready = True
+    logger.info("Warm-up complete, ready for traffic")
+
+def begin_drain():
+    """Called on SIGTERM before in-flight requests drain (see run.py)."""
+    app.state.ready = False
+    notification_hub.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    # Handlers would no longer see society data left behind in the directory. Only a
+    # partitioned router reads anything here, and it waits out Mongo like warm-up does
+    stranded = await retry_until_done("Stranded data check", stranded_collections, db)
+    if stranded:
+        raise RuntimeError(
+            f"SOCIETY_PARTITIONS is set but {db.name} still holds {', '.join(stranded)}; "
+            "run `python partitions.py move` first"
+        )
+    tasks = [
+        asyncio.create_task(warm_up()),
+        asyncio.create_task(token_service.revocations.run_sync()),
+        asyncio.create_task(auth_invalidations.run_sync()),
+    ]
+    if NOTIFICATION_CHANGE_STREAM:
+        # One stream per partition: each sees only its own societies' notices
+        tasks += [asyncio.create_task(run_change_stream_bridge(partition, notification_hub)) for partition in db.partitions()]
+    if JOB_WORKERS_INLINE:
+        job_queue.start()
+    yield
+    begin_drain()
+    for task in tasks:
+        task.cancel()
+    await job_queue.stop()
+    await payment_gateway.close()
+    client.close()
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # ===================== MODELS =====================
 
@@ -65,7 +217,7 @@ class User(BaseModel):
     role: str  # chairman or user
     society_id: Optional[str] = None
     user_type: Optional[str] = None  # owner or tenant
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utcnow)
 
 class Society(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -79,7 +231,7 @@ class Society(BaseModel):
     bank_name: Optional[str] = None
     owner_maintenance_rate: Optional[float] = None
     tenant_maintenance_rate: Optional[float] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utcnow)
 
 class Payment(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -88,11 +240,11 @@ class Payment(BaseModel):
     user_id: str
     society_id: str
     amount: float
-    razorpay_order_id: str
+    razorpay_order_id: Optional[str] = None  # set once the gateway order exists
     razorpay_payment_id: Optional[str] = None
     razorpay_signature: Optional[str] = None
-    status: str  # pending, completed, failed
-    payment_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    status: str  # pending, completed, failed, expired; see payments.py
+    payment_date: datetime = Field(default_factory=utcnow)
     month: str  # format: YYYY-MM
     user_name: str
     user_phone: str
@@ -104,8 +256,11 @@ class Notification(BaseModel):
     society_id: str
     message: str
     created_by: str
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    read_by: List[str] = Field(default_factory=list)
+    created_at: datetime = Field(default_factory=utcnow)
+    seq: int = 0  # per-society sequence, see notifications.py
+
+class NotificationOut(Notification):
+    is_read: bool = False
 
 # ===================== REQUEST/RESPONSE MODELS =====================
 
@@ -131,6 +286,9 @@ class UpdateMaintenanceRatesRequest(BaseModel):
     owner_rate: float
     tenant_rate: float
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 class JoinSocietyRequest(BaseModel):
     user_type: str  # owner or tenant
 
@@ -143,6 +301,9 @@ class VerifyPaymentRequest(BaseModel):
     razorpay_payment_id: str
     razorpay_signature: str
 
+class RunBillingRequest(BaseModel):
+    month: str  # format: YYYY-MM
+
 class CreateNotificationRequest(BaseModel):
     message: str
 
@@ -152,56 +313,167 @@ class MarkNotificationReadRequest(BaseModel):
 # ===================== AUTH UTILITIES =====================
 
 def create_jwt_token(user_id: str, phone_number: str, role: str) -> str:
-    payload = {
-        'user_id': user_id,
-        'phone_number': phone_number,
-        'role': role,
-        'exp': datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
-    }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    """A standalone access token outside any refresh session (tests, scripts)."""
+    return token_service.access_token(user_id, phone_number, role)
 
 def verify_jwt_token(token: str) -> dict:
+    """Signature, expiry and type only; revocation is checked per request in authenticate_token."""
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
+        payload = token_service.keyring.decode(token)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    if payload['typ'] != "access":
         raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
-    payload = verify_jwt_token(token)
-    user = await db.users.find_one({"id": payload['user_id']}, {"_id": 0})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return User(**user)
+    return await authenticate_token(credentials.credentials)
+
+async def get_stream_user(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    # EventSource cannot send headers, so streams may pass the token as a query parameter
+    if credentials:
+        token = credentials.credentials
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await authenticate_token(token)
+
+async def authenticate_token(token: str) -> User:
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = verify_jwt_token(token)
+        # Never serve a cached token past its own expiry
+        token_cache.set(token, payload, ttl=payload['exp'] - utcnow().timestamp())
+    # Cached claims skip the signature check but never the revocation check
+    if await token_service.revocations.is_revoked(payload['sid']):
+        raise HTTPException(status_code=401, detail="Token revoked")
+
+    user = user_cache.get(payload['user_id'])
+    if user is None:
+        user_doc = await db.users.find_one({"id": payload['user_id']}, {"_id": 0})
+        if not user_doc:
+            raise HTTPException(status_code=404, detail="User not found")
+        user = User(**user_doc)
+        user_cache.set(user.id, user)
+    # Handlers must not mutate the shared cached instance
+    return user.model_copy()
+
+async def invalidate_user(user_id: Optional[str] = None):
+    """Drop a cached user (every cached user when None), in all workers, after any write to user documents."""
+    await auth_invalidations.publish("users", user_id)
+
+def auth_cache_stats() -> dict:
+    return {"tokens": token_cache.stats(), "users": user_cache.stats(), "revocations": dict(token_service.revocations.stats)}
+
+# ===================== CONDITIONAL GET =====================
+
+async def bump_society_version(society_id: str):
+    """Invalidate every ETag derived from this society. Call after any write that changes what its readers see."""
+    await db.societies.update_one({"id": society_id}, {"$inc": {"version": 1}})
+
+async def society_version(society_id: str, session=None) -> int:
+    society = await db.societies.find_one({"id": society_id}, {"_id": 0, "version": 1}, session=session)
+    return (society or {}).get("version", 0)
+
+def society_etag(society_id: str, version: int, *scope) -> str:
+    """Strong ETag for a view of a society at a version; ``scope`` separates per-caller or per-page views."""
+    tag = ":".join([society_id, str(version), *map(str, scope)])
+    return f'"{hashlib.sha256(tag.encode()).hexdigest()[:32]}"'
+
+# Stored on societies for search, ETags and notice ordering, never sent to clients
+SOCIETY_INTERNAL_FIELDS = ("name_norm", "name_tokens", "version", "notification_seq")
+
+def public_society(society: dict) -> dict:
+    """A society document in Society response shape: internal fields dropped, amounts in rupees."""
+    for field in SOCIETY_INTERNAL_FIELDS:
+        society.pop(field, None)
+    return public_money(society)
+
+def tagged_response(content, etag: Optional[str] = None, next_cursor: Optional[str] = None) -> Response:
+    """Encode ``content`` as is, skipping response-model validation and filtering.
+
+    Read paths return documents straight from Mongo, so they must already be in
+    response shape: payments via PAYMENT_PROJECTION, societies via public_society.
+    """
+    headers = {}
+    if etag:
+        headers["ETag"] = etag
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return ORJSONResponse(content, headers=headers)
+
+def _opaque_tag(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 when If-None-Match lists ``etag`` or is ``*``; tags compare weakly, as RFC 9110 has it for GET."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {_opaque_tag(t.strip()) for t in header.split(",")}
+    if "*" in tags or _opaque_tag(etag) in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+def client_ip(http_request: Request) -> str:
+    # uvicorn's proxy_headers already replaced the peer with the caller, trusting
+    # X-Forwarded-For only from FORWARDED_ALLOW_IPS (run.py). The header itself is
+    # client-supplied, so keying on it would let callers pick their own bucket.
+    return http_request.client.host if http_request.client else "unknown"
+
+async def enforce_rate_limit(policy: str, key: str):
+    allowed, retry_after = await rate_limiter.check(policy, key)
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+# ===================== JOB HANDLERS =====================
+
+@job_queue.handler("otp.deliver")
+async def deliver_otp(payload: dict):
+    # The code is read from otp_store, never carried in the job, so the jobs collection holds no live OTPs
+    otp_data = await db.otp_store.find_one({"phone_number": payload['phone_number']}, {"_id": 0, "otp": 1})
+    if not otp_data:
+        logger.info(f"OTP for {payload['phone_number']} already used or expired, not sending")
+        return
+    # In production, integrate SMS gateway here
+    logger.info(f"OTP for {payload['phone_number']}: {otp_data['otp']}")
 
 # ===================== AUTH ROUTES =====================
 
 @api_router.post("/auth/send-otp")
-async def send_otp(request: SendOTPRequest):
+async def send_otp(request: SendOTPRequest, http_request: Request):
+    await enforce_rate_limit("otp_ip", client_ip(http_request))
+    await enforce_rate_limit("otp_phone", request.phone_number)
+    
     # Generate 6-digit OTP
     otp = str(random.randint(100000, 999999))
-    otp_expiry = datetime.now(timezone.utc) + timedelta(minutes=10)
+    otp_expiry = utcnow() + timedelta(minutes=10)
     
     # Store OTP in database
     await db.otp_store.update_one(
         {"phone_number": request.phone_number},
         {"$set": {
             "otp": otp,
-            "expiry": otp_expiry.isoformat()
+            "expires_at": store_datetime(otp_expiry)  # also drives the TTL index
         }},
         upsert=True
     )
     
-    # In production, integrate SMS gateway here
-    logger.info(f"OTP for {request.phone_number}: {otp}")
+    await job_queue.enqueue("otp.deliver", {"phone_number": request.phone_number})
     
     return {"message": "OTP sent successfully", "otp": otp}  # Remove OTP from response in production
 
 @api_router.post("/auth/verify-otp")
-async def verify_otp(request: VerifyOTPRequest):
+async def verify_otp(request: VerifyOTPRequest, http_request: Request):
+    await enforce_rate_limit("otp_verify_ip", client_ip(http_request))
+    await enforce_rate_limit("otp_verify_phone", request.phone_number)
+    
     # Get stored OTP
     otp_data = await db.otp_store.find_one({"phone_number": request.phone_number}, {"_id": 0})
     
@@ -209,7 +481,7 @@ async def verify_otp(request: VerifyOTPRequest):
         raise HTTPException(status_code=400, detail="OTP not found. Please request a new OTP")
     
     # Check if OTP expired
-    if datetime.fromisoformat(otp_data['expiry']) < datetime.now(timezone.utc):
+    if load_datetime(otp_data['expires_at']) < utcnow():
         raise HTTPException(status_code=400, detail="OTP expired. Please request a new OTP")
     
     # Verify OTP
@@ -228,22 +500,34 @@ async def verify_otp(request: VerifyOTPRequest):
             name=request.name,
             role=request.role
         )
-        user_dict = user.model_dump()
-        user_dict['created_at'] = user_dict['created_at'].isoformat()
-        await db.users.insert_one(user_dict)
+        await db.users.insert_one(to_document(user))
     
-    # Generate JWT token
-    token = create_jwt_token(user.id, user.phone_number, user.role)
+    # Open a session: access token plus refresh token
+    tokens = await token_service.issue(user.id, user.phone_number, user.role)
     
     # Delete used OTP
     await db.otp_store.delete_one({"phone_number": request.phone_number})
     
     return {
-        "token": token,
+        **tokens,
         "user": user.model_dump()
     }
 
-@api_router.get("/auth/me")
+@api_router.post("/auth/refresh")
+async def refresh_tokens(request: RefreshTokenRequest):
+    try:
+        return await token_service.refresh(request.refresh_token)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+@api_router.post("/auth/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    payload = verify_jwt_token(credentials.credentials)
+    await token_service.logout(payload['sid'])
+    token_cache.invalidate(credentials.credentials)
+    return {"message": "Logged out"}
+
+@api_router.get("/auth/me", response_model=User)
 async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
@@ -265,15 +549,14 @@ async def create_society(request: CreateSocietyRequest, current_user: User = Dep
         chairman_id=current_user.id
     )
     
-    society_dict = society.model_dump()
-    society_dict['created_at'] = society_dict['created_at'].isoformat()
-    await db.societies.insert_one(society_dict)
+    await db.societies.insert_one({**to_document(society), **search_fields(request.name)})
     
     # Update user's society_id
     await db.users.update_one(
         {"id": current_user.id},
         {"$set": {"society_id": society.id}}
     )
+    await invalidate_user(current_user.id)
     
     return society
 
@@ -292,7 +575,7 @@ async def update_bank_details(society_id: str, request: UpdateBankDetailsRequest
             "bank_account_number": request.bank_account_number,
             "bank_ifsc": request.bank_ifsc,
             "bank_name": request.bank_name
-        }}
+        }, "$inc": {"version": 1}}
     )
     
     return {"message": "Bank details updated successfully"}
@@ -308,21 +591,23 @@ async def update_maintenance_rates(society_id: str, request: UpdateMaintenanceRa
     
     await db.societies.update_one(
         {"id": society_id},
-        {"$set": {
-            "owner_maintenance_rate": request.owner_rate,
-            "tenant_maintenance_rate": request.tenant_rate
-        }}
+        {
+            "$set": {
+                "owner_maintenance_rate_paise": to_paise(request.owner_rate),
+                "tenant_maintenance_rate_paise": to_paise(request.tenant_rate)
+            },
+            "$unset": {"owner_maintenance_rate": "", "tenant_maintenance_rate": ""},
+            "$inc": {"version": 1}
+        }
     )
     
     return {"message": "Maintenance rates updated successfully"}
 
-@api_router.get("/society/search")
-async def search_societies(query: str, current_user: User = Depends(get_current_user)):
-    societies = await db.societies.find(
-        {"name": {"$regex": query, "$options": "i"}},
-        {"_id": 0}
-    ).to_list(20)
-    return societies
+@api_router.get("/society/search", response_model=List[Society])
+async def search_societies(query: str, http_request: Request, current_user: User = Depends(get_current_user)):
+    await enforce_rate_limit("search_ip", client_ip(http_request))
+    await enforce_rate_limit("search_user", current_user.id)
+    return tagged_response([public_society(society) for society in await find_societies(stale_db, query)])
 
 @api_router.post("/society/{society_id}/join")
 async def join_society(society_id: str, request: JoinSocietyRequest, current_user: User = Depends(get_current_user)):
@@ -333,18 +618,23 @@ async def join_society(society_id: str, request: JoinSocietyRequest, current_use
     if not society:
         raise HTTPException(status_code=404, detail="Society not found")
     
-    await db.users.update_one(
+    previous = await db.users.find_one_and_update(
         {"id": current_user.id},
         {"$set": {
             "society_id": society_id,
             "user_type": request.user_type
-        }}
+        }},
+        projection={"_id": 0, "society_id": 1}
     )
+    await invalidate_user(current_user.id)
+    # The society left behind lists the member too, so its views change as well
+    left = (previous or {}).get('society_id')
+    await asyncio.gather(*(bump_society_version(sid) for sid in {society_id, left} if sid))
     
     return {"message": "Successfully joined society"}
 
-@api_router.get("/society/{society_id}/members")
-async def get_society_members(society_id: str, current_user: User = Depends(get_current_user)):
+@api_router.get("/society/{society_id}/members", response_model=List[User])
+async def get_society_members(society_id: str, request: Request, current_user: User = Depends(get_current_user)):
     society = await db.societies.find_one({"id": society_id}, {"_id": 0})
     if not society:
         raise HTTPException(status_code=404, detail="Society not found")
@@ -352,28 +642,191 @@ async def get_society_members(society_id: str, current_user: User = Depends(get_
     if society['chairman_id'] != current_user.id:
         raise HTTPException(status_code=403, detail="Only the chairman can view members")
     
+    etag = society_etag(society_id, society.get('version', 0), "members")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
     members = await db.users.find({"society_id": society_id, "role": "user"}, {"_id": 0}).to_list(1000)
-    return members
+    return tagged_response(members, etag)
 
-@api_router.get("/society/{society_id}/details")
-async def get_society_details(society_id: str, current_user: User = Depends(get_current_user)):
+@api_router.post("/society/{society_id}/members/import")
+async def import_society_members(
+    society_id: str,
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    current_user: User = Depends(get_current_user)
+):
     society = await db.societies.find_one({"id": society_id}, {"_id": 0})
     if not society:
         raise HTTPException(status_code=404, detail="Society not found")
     
-    return society
+    if society['chairman_id'] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the chairman can import members")
+    
+    # The report is spooled, not held in memory, and only sent once the whole upload is read
+    report = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    summary = await import_members(db, society_id, request.stream(), format, report)
+    if summary["created"] or summary["updated"]:
+        # Imported rows rewrite user documents by phone number, so cached ids are unknown
+        await invalidate_user()
+        await bump_society_version(society_id)
+    logger.info(f"Member import for society {society_id}: {summary}")
+    
+    report.seek(0)
+    
+    def read_report():
+        with report:
+            yield from iter(lambda: report.read(64 * 1024), b"")
+    
+    return StreamingResponse(read_report(), media_type="application/x-ndjson")
 
-@api_router.get("/society/{society_id}/payments")
-async def get_society_payments(society_id: str, current_user: User = Depends(get_current_user)):
+@api_router.get("/society/{society_id}/details", response_model=Society)
+async def get_society_details(society_id: str, request: Request, current_user: User = Depends(get_current_user)):
     society = await db.societies.find_one({"id": society_id}, {"_id": 0})
     if not society:
         raise HTTPException(status_code=404, detail="Society not found")
     
+    etag = society_etag(society_id, society.get('version', 0), "details")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    return tagged_response(public_society(society), etag)
+
+@api_router.get("/society/{society_id}/payments", response_model=List[Payment])
+async def get_society_payments(
+    society_id: str,
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user: User = Depends(get_current_user)
+):
+    # The page is read from a secondary, fenced so it is never older than the version in its ETag
+    fence = CausalFence(client)
+    society = await fence.run(db.societies.find_one, {"id": society_id}, {"_id": 0})
+    if not society:
+        raise HTTPException(status_code=404, detail="Society not found")
+    
     if society['chairman_id'] != current_user.id:
         raise HTTPException(status_code=403, detail="Only the chairman can view payments")
     
-    payments = await db.payments.find({"society_id": society_id}, {"_id": 0}).sort("payment_date", -1).to_list(1000)
-    return payments
+    query = {"society_id": society_id}
+    payments_source = stale_db.for_society(society_id).payments
+    if format == "ndjson":
+        return stream_ndjson(payments_source, query, cursor)
+    
+    etag = society_etag(society_id, society.get('version', 0), "payments", cursor, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    payments, next_cursor = await fence.run(fetch_page, payments_source, query, cursor, limit)
+    return tagged_response(payments, etag, next_cursor)
+
+@api_router.get("/society/{society_id}/payments/export")
+async def export_society_payments(
+    society_id: str,
+    format: str = Query("csv", pattern="^(csv|pdf)$"),
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    current_user: User = Depends(get_current_user)
+):
+    society = await db.societies.find_one({"id": society_id}, {"_id": 0})
+    if not society:
+        raise HTTPException(status_code=404, detail="Society not found")
+    
+    if society['chairman_id'] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the chairman can export payments")
+    
+    query = {"society_id": society_id, "status": "completed"}
+    cache_key = None
+    if month:
+        query["month"] = month
+        cache_key = await society_statement_key(db.for_society(society_id), society_id, month, format)
+    return await export_response(
+        db.for_society(society_id), query, format,
+        title=f"{society['name']} - payments {month or 'all months'}",
+        filename=f"payments-{month or 'all'}",
+        cache_key=cache_key,
+        source=stale_db.for_society(society_id).payments
+    )
+
+@api_router.get("/society/{society_id}/ledger")
+async def get_society_ledger(society_id: str, year: Optional[int] = None, current_user: User = Depends(get_current_user)):
+    society = await db.societies.find_one({"id": society_id}, {"_id": 0})
+    if not society:
+        raise HTTPException(status_code=404, detail="Society not found")
+    
+    if society['chairman_id'] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the chairman can view the ledger")
+    
+    return await get_year(db.for_society(society_id), society_id, year or utcnow().year)
+
+@api_router.get("/society/{society_id}/analytics")
+async def get_society_analytics(society_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    fence = CausalFence(client)
+    society = await fence.run(db.societies.find_one, {"id": society_id}, {"_id": 0})
+    if not society:
+        raise HTTPException(status_code=404, detail="Society not found")
+    
+    if society['chairman_id'] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the chairman can view analytics")
+    
+    version = society.get('version', 0)
+    # Overdue ageing moves with the date even when nothing is written, so the day is in scope
+    today = utcnow().date()
+    etag = society_etag(society_id, version, "analytics", today.isoformat())
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    # Reports are cached per version, so the scan must not predate it
+    return tagged_response(
+        await fence.run(collection_report, stale_db.for_society(society_id), society_id, version, today), etag
+    )
+
+@api_router.post("/society/{society_id}/billing/run")
+async def run_society_billing(society_id: str, request: RunBillingRequest, current_user: User = Depends(get_current_user)):
+    society = await db.societies.find_one({"id": society_id}, {"_id": 0})
+    if not society:
+        raise HTTPException(status_code=404, detail="Society not found")
+    
+    if society['chairman_id'] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the chairman can run billing")
+    
+    result = await bill_society(db.for_society(society_id), society, request.month)
+    await bump_society_version(society_id)
+    return result
+
+@api_router.get("/society/{society_id}/dues")
+async def get_society_dues(
+    society_id: str,
+    month: str,
+    request: Request,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    society = await db.societies.find_one({"id": society_id}, {"_id": 0})
+    if not society:
+        raise HTTPException(status_code=404, detail="Society not found")
+    
+    if society['chairman_id'] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the chairman can view dues")
+    
+    # Dues change only through billing runs and payments, both of which bump the society version
+    etag = society_etag(society_id, society.get('version', 0), "dues", month, status, cursor, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    query = {"society_id": society_id, "month": month}
+    if status:
+        query["status"] = status
+    dues, next_cursor = await fetch_page(
+        db.for_society(society_id)[DUES_COLLECTION], query, cursor, limit, sort=DUE_SORT, projection={"_id": 0}
+    )
+    return tagged_response(dues, etag, next_cursor)
 
 # ===================== PAYMENT ROUTES =====================
 
@@ -386,144 +839,233 @@ async def get_user_maintenance(current_user: User = Depends(get_current_user)):
     if not society:
         raise HTTPException(status_code=404, detail="Society not found")
     
-    if current_user.user_type == "owner":
-        amount = society.get('owner_maintenance_rate', 0)
-    else:
-        amount = society.get('tenant_maintenance_rate', 0)
+    due = await find_due(db.for_society(current_user.society_id), current_user.id, utcnow().strftime("%Y-%m"))
+    return maintenance_due(current_user, society, due)
+
+async def find_due(society_db, user_id: str, month: str) -> Optional[dict]:
+    return await society_db[DUES_COLLECTION].find_one({"user_id": user_id, "month": month}, {"_id": 0})
+
+def amount_owed(user: User, society: dict, due: Optional[dict] = None) -> Optional[int]:
+    """What ``user`` owes for a month in paise: the billed due, else the society's current rate."""
+    if due:
+        return stored_paise(due, 'amount')
+    return due_amount(society, user.user_type)
+
+def maintenance_due(user: User, society: dict, due: Optional[dict] = None) -> dict:
+    # A billed due fixes the amount for the month; otherwise fall back to the current rate
+    amount = amount_owed(user, society, due)
     
     return {
-        "amount": amount,
-        "user_type": current_user.user_type,
-        "society_name": society['name']
+        "amount": to_rupees(amount) if amount is not None else 0,
+        "user_type": user.user_type,
+        "society_name": society['name'],
+        "status": due['status'] if due else None
+    }
+
+def order_response(order_id: str, amount_in_paise: int) -> dict:
+    response = {
+        "order_id": order_id,
+        "amount": amount_in_paise,
+        "currency": "INR",
+        "razorpay_key": payment_gateway.key_id
     }
+    if payment_gateway.mock:
+        response["mock_mode"] = True
+    return response
+
+async def cancel_pending(payment: dict):
+    """Undo the ledger's pending entry for an order that failed or expired."""
+    if payment.get('razorpay_order_id'):
+        await record_pending_cancelled(
+            db.for_society(payment['society_id']), payment['society_id'], payment['month'], stored_paise(payment, 'amount')
+        )
+        await bump_society_version(payment['society_id'])
 
 @api_router.post("/payment/create-order")
-async def create_payment_order(request: CreatePaymentOrderRequest, current_user: User = Depends(get_current_user)):
+async def create_payment_order(
+    request: CreatePaymentOrderRequest,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
     if not current_user.society_id:
         raise HTTPException(status_code=400, detail="You are not part of any society")
     
-    # Check if payment already exists for this month
-    existing_payment = await db.payments.find_one({
-        "user_id": current_user.id,
-        "month": request.month,
-        "status": "completed"
-    }, {"_id": 0})
+    replay = await idempotent_replay(db, current_user.id, "create-order", idempotency_key)
+    if replay:
+        return replay
     
-    if existing_payment:
-        raise HTTPException(status_code=400, detail="Payment already made for this month")
+    society_db = db.for_society(current_user.society_id)
+    society = await db.societies.find_one({"id": current_user.society_id}, {"_id": 0})
+    if not society:
+        raise HTTPException(status_code=404, detail="Society not found")
     
-    amount_in_paise = int(request.amount * 100)
-    
-    # Mock payment mode
-    if RAZORPAY_MOCK_MODE:
-        mock_order_id = f"order_mock_{str(uuid.uuid4())[:8]}"
-        
-        # Create payment record
-        payment = Payment(
-            user_id=current_user.id,
-            society_id=current_user.society_id,
-            amount=request.amount,
-            razorpay_order_id=mock_order_id,
-            status="pending",
-            month=request.month,
-            user_name=current_user.name,
-            user_phone=current_user.phone_number
+    # The server prices the order; the client's amount is only checked against it
+    due = await find_due(society_db, current_user.id, request.month)
+    if due and due.get('status') == "paid":
+        raise HTTPException(status_code=400, detail="Payment already made for this month")
+    amount_in_paise = amount_owed(current_user, society, due)
+    if not amount_in_paise:
+        raise HTTPException(status_code=400, detail="Maintenance rate not set for this society")
+    if to_paise(request.amount) != amount_in_paise:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Amount does not match the maintenance due of {to_rupees(amount_in_paise)}"
         )
-        
-        payment_dict = payment.model_dump()
-        payment_dict['payment_date'] = payment_dict['payment_date'].isoformat()
-        await db.payments.insert_one(payment_dict)
-        
-        logger.info(f"Mock payment order created: {mock_order_id}")
-        
-        return {
-            "order_id": mock_order_id,
-            "amount": amount_in_paise,
-            "currency": "INR",
-            "razorpay_key": "mock_key",
-            "mock_mode": True
-        }
-    
-    # Real Razorpay integration
-    razorpay_order = razorpay_client.order.create({
-        "amount": amount_in_paise,
-        "currency": "INR",
-        "payment_capture": 1
-    })
     
-    # Create payment record
     payment = Payment(
         user_id=current_user.id,
         society_id=current_user.society_id,
-        amount=request.amount,
-        razorpay_order_id=razorpay_order['id'],
+        amount=to_rupees(amount_in_paise),
         status="pending",
         month=request.month,
         user_name=current_user.name,
         user_phone=current_user.phone_number
     )
+    payment_dict = to_document(payment)
     
-    payment_dict = payment.model_dump()
-    payment_dict['payment_date'] = payment_dict['payment_date'].isoformat()
-    await db.payments.insert_one(payment_dict)
+    # One live payment per user and month: a double-click gets the same order back
+    for _ in range(2):
+        live, created = await claim_month(society_db, payment_dict)
+        if created:
+            break
+        if live['status'] == "completed":
+            raise HTTPException(status_code=400, detail="Payment already made for this month")
+        expired = await expire_if_stale(society_db, live)
+        if expired:
+            await cancel_pending(expired)
+            continue
+        if not live.get('razorpay_order_id'):
+            raise HTTPException(status_code=409, detail="A payment for this month is already being created")
+        return order_response(live['razorpay_order_id'], stored_paise(live, 'amount'))
+    else:
+        raise HTTPException(status_code=409, detail="A payment for this month is already being created")
     
-    return {
-        "order_id": razorpay_order['id'],
-        "amount": amount_in_paise,
-        "currency": "INR",
-        "razorpay_key": RAZORPAY_KEY_ID
-    }
+    try:
+        order = await payment_gateway.create_order(amount_in_paise, receipt=payment.id)
+    except GatewayError as e:
+        logger.error(f"Payment order creation failed: {str(e)}")
+        await fail_payment(society_db, {"id": payment.id})
+        raise HTTPException(status_code=503, detail="Payment gateway unavailable, please try again")
+    
+    await attach_order(society_db, payment.id, order['id'])
+    await route_order(db, order['id'], payment_dict)
+    await record_order_created(society_db, payment.society_id, payment.month, amount_in_paise)
+    await bump_society_version(payment.society_id)
+    
+    if payment_gateway.mock:
+        logger.info(f"Mock payment order created: {order['id']}")
+    response = order_response(order['id'], amount_in_paise)
+    await remember_response(db, current_user.id, "create-order", idempotency_key, response)
+    return response
 
 @api_router.post("/payment/verify")
-async def verify_payment(request: VerifyPaymentRequest, current_user: User = Depends(get_current_user)):
-    # Mock payment mode - auto-verify
-    if RAZORPAY_MOCK_MODE:
-        logger.info(f"Mock payment verification for order: {request.razorpay_order_id}")
-        
-        # Update payment record
-        await db.payments.update_one(
-            {"razorpay_order_id": request.razorpay_order_id},
-            {"$set": {
-                "razorpay_payment_id": request.razorpay_payment_id,
-                "razorpay_signature": request.razorpay_signature,
-                "status": "completed",
-                "payment_date": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
-        return {"message": "Payment verified successfully (MOCK MODE)"}
+async def verify_payment(
+    request: VerifyPaymentRequest,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    replay = await idempotent_replay(db, current_user.id, "verify", idempotency_key)
+    if replay:
+        return replay
     
-    # Verify signature with real Razorpay
-    try:
-        razorpay_client.utility.verify_payment_signature({
-            'razorpay_order_id': request.razorpay_order_id,
-            'razorpay_payment_id': request.razorpay_payment_id,
-            'razorpay_signature': request.razorpay_signature
-        })
-    except Exception as e:
-        logger.error(f"Payment verification failed: {str(e)}")
+    # The order lives in the society it was placed in, which the payer may have left since.
+    # Orders placed before routes were recorded can only be in the current society.
+    society_id = await order_society(db, request.razorpay_order_id, current_user.id) or current_user.society_id
+    if not society_id:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    society_db = db.for_society(society_id)
+    
+    # Signature check is a local HMAC; the mock gateway accepts everything
+    if not payment_gateway.verify_signature(
+        request.razorpay_order_id,
+        request.razorpay_payment_id,
+        request.razorpay_signature
+    ):
+        logger.error(f"Payment verification failed for order: {request.razorpay_order_id}")
+        failed = await fail_payment(society_db, {"razorpay_order_id": request.razorpay_order_id, "user_id": current_user.id})
+        if failed:
+            await cancel_pending(failed)
         raise HTTPException(status_code=400, detail="Payment verification failed")
     
-    # Update payment record
-    await db.payments.update_one(
-        {"razorpay_order_id": request.razorpay_order_id},
-        {"$set": {
-            "razorpay_payment_id": request.razorpay_payment_id,
-            "razorpay_signature": request.razorpay_signature,
-            "status": "completed",
-            "payment_date": datetime.now(timezone.utc).isoformat()
-        }}
-    )
+    previous = await complete_payment(society_db, request.razorpay_order_id, current_user.id, {
+        "razorpay_payment_id": request.razorpay_payment_id,
+        "razorpay_signature": request.razorpay_signature,
+        "payment_date": store_datetime(utcnow())
+    })
+    if previous:
+        await asyncio.gather(
+            record_payment_completed(society_db, previous['society_id'], previous['month'], stored_paise(previous, 'amount')),
+            mark_due_paid(society_db, previous)
+        )
+        await bump_society_version(previous['society_id'])
+    else:
+        # Not pending any more: succeed only if this exact payment already completed it
+        payment = await society_db.payments.find_one(
+            {"razorpay_order_id": request.razorpay_order_id, "user_id": current_user.id},
+            {"_id": 0, "status": 1, "razorpay_payment_id": 1}
+        )
+        if not payment:
+            raise HTTPException(status_code=404, detail="Payment not found")
+        if payment['status'] != "completed" or payment.get('razorpay_payment_id') != request.razorpay_payment_id:
+            raise HTTPException(status_code=400, detail=f"Payment is {payment['status']}")
     
-    return {"message": "Payment verified successfully"}
+    if payment_gateway.mock:
+        response = {"message": "Payment verified successfully (MOCK MODE)"}
+    else:
+        response = {"message": "Payment verified successfully"}
+    await remember_response(db, current_user.id, "verify", idempotency_key, response)
+    return response
 
-@api_router.get("/payment/receipts")
-async def get_user_receipts(current_user: User = Depends(get_current_user)):
-    receipts = await db.payments.find(
-        {"user_id": current_user.id, "status": "completed"},
-        {"_id": 0}
-    ).sort("payment_date", -1).to_list(1000)
-    return receipts
+@api_router.get("/payment/receipts", response_model=List[Payment])
+async def get_user_receipts(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user: User = Depends(get_current_user)
+):
+    # Payments are only ever made inside a society, so without one there are none
+    if not current_user.society_id:
+        return tagged_response([])
+    
+    query = {"user_id": current_user.id, "status": "completed"}
+    payments_source = stale_db.for_society(current_user.society_id).payments
+    if format == "ndjson":
+        return stream_ndjson(payments_source, query, cursor)
+    
+    # Receipts only change through verify_payment, which bumps the society version
+    fence = CausalFence(client)
+    version = await fence.run(society_version, current_user.society_id)
+    etag = society_etag(current_user.society_id, version, "receipts", current_user.id, cursor, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    receipts, next_cursor = await fence.run(fetch_page, payments_source, query, cursor, limit)
+    return tagged_response(receipts, etag, next_cursor)
+
+@api_router.get("/payment/receipts/export")
+async def export_user_receipts(
+    format: str = Query("csv", pattern="^(csv|pdf)$"),
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    current_user: User = Depends(get_current_user)
+):
+    if not current_user.society_id:
+        raise HTTPException(status_code=400, detail="You are not part of any society")
+    
+    society_db = db.for_society(current_user.society_id)
+    query = {"user_id": current_user.id, "status": "completed"}
+    cache_key = None
+    if month:
+        query["month"] = month
+        cache_key = await user_statement_key(society_db, current_user.id, month, format)
+    return await export_response(
+        society_db, query, format,
+        title=f"{current_user.name} - receipts {month or 'all months'}",
+        filename=f"receipts-{month or 'all'}",
+        cache_key=cache_key,
+        source=stale_db.for_society(current_user.society_id).payments
+    )
 
 # ===================== NOTIFICATION ROUTES =====================
 
@@ -538,36 +1080,173 @@ async def create_notification(request: CreateNotificationRequest, current_user:
     notification = Notification(
         society_id=current_user.society_id,
         message=request.message,
-        created_by=current_user.id
+        created_by=current_user.id,
+        seq=await next_notification_seq(db, current_user.society_id)
     )
     
-    notification_dict = notification.model_dump()
-    notification_dict['created_at'] = notification_dict['created_at'].isoformat()
-    await db.notifications.insert_one(notification_dict)
+    notification_dict = to_document(notification)
+    await db.for_society(notification.society_id).notifications.insert_one(notification_dict)
+    
+    if not NOTIFICATION_CHANGE_STREAM:
+        notification_dict.pop('_id', None)
+        notification_hub.publish(notification.society_id, notification_dict)
     
     return {"message": "Notification sent successfully"}
 
-@api_router.get("/notifications")
-async def get_notifications(current_user: User = Depends(get_current_user)):
+@api_router.get("/notifications", response_model=List[NotificationOut])
+async def get_notifications(request: Request, current_user: User = Depends(get_current_user)):
     if not current_user.society_id:
         return []
     
-    notifications = await db.notifications.find(
-        {"society_id": current_user.society_id},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
+    # Notices are covered by the society version, read flags by the caller's read-state version
+    fence = CausalFence(client)
+    version, read_state = await asyncio.gather(
+        fence.run(society_version, current_user.society_id),
+        get_read_state(db.for_society(current_user.society_id), current_user.id, current_user.society_id)
+    )
+    etag = society_etag(current_user.society_id, version, "notifications", current_user.id, read_state['v'])
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     
+    return tagged_response(await fence.run(load_notifications, current_user, read_state), etag)
+
+async def load_notifications(user: User, read_state: Optional[dict] = None, session=None) -> List[dict]:
+    """Latest notices from a secondary; read state always comes from the primary."""
+    notices = stale_db.for_society(user.society_id).notifications
+    if read_state is None:
+        notifications, read_state = await asyncio.gather(
+            notices.find(
+                {"society_id": user.society_id},
+                {"_id": 0, "read_by": 0},
+                session=session
+            ).sort("created_at", -1).to_list(100),
+            get_read_state(db.for_society(user.society_id), user.id, user.society_id)
+        )
+    else:
+        notifications = await notices.find(
+            {"society_id": user.society_id},
+            {"_id": 0, "read_by": 0},
+            session=session
+        ).sort("created_at", -1).to_list(100)
+    
+    for notification in notifications:
+        notification['is_read'] = is_read(read_state, notification.get('seq', 0))
     return notifications
 
+@api_router.get("/notifications/stream")
+async def stream_notifications(current_user: User = Depends(get_stream_user)):
+    if not current_user.society_id:
+        raise HTTPException(status_code=400, detail="You are not part of any society")
+    
+    subscription = notification_hub.subscribe(current_user.society_id)
+    return StreamingResponse(
+        notification_hub.sse_events(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/notifications/unread-count")
+async def get_unread_count(current_user: User = Depends(get_current_user)):
+    if not current_user.society_id:
+        return {"unread": 0}
+    
+    return {"unread": await unread_count(db.for_society(current_user.society_id), current_user.id, current_user.society_id)}
+
 @api_router.post("/notifications/mark-read")
 async def mark_notifications_read(request: MarkNotificationReadRequest, current_user: User = Depends(get_current_user)):
-    await db.notifications.update_many(
-        {"id": {"$in": request.notification_ids}},
-        {"$addToSet": {"read_by": current_user.id}}
-    )
+    if not current_user.society_id:
+        raise HTTPException(status_code=400, detail="You are not part of any society")
+    
+    society_db = db.for_society(current_user.society_id)
+    notifications = await society_db.notifications.find(
+        {"id": {"$in": request.notification_ids}, "society_id": current_user.society_id},
+        {"_id": 0, "seq": 1}
+    ).to_list(len(request.notification_ids))
+    await mark_read(society_db, current_user.id, current_user.society_id, [n.get('seq', 0) for n in notifications])
     
     return {"message": "Notifications marked as read"}
 
+# ===================== DASHBOARD ROUTES =====================
+
+@api_router.get("/dashboard/user")
+async def get_user_dashboard(request: Request, current_user: User = Depends(get_current_user)):
+    if not current_user.society_id:
+        return tagged_response({"user": current_user, "society": None})
+    
+    fence = CausalFence(client)
+    society_db = db.for_society(current_user.society_id)
+    society, read_state = await asyncio.gather(
+        fence.run(db.societies.find_one, {"id": current_user.society_id}, {"_id": 0}),
+        get_read_state(society_db, current_user.id, current_user.society_id)
+    )
+    if not society:
+        raise HTTPException(status_code=404, detail="Society not found")
+    
+    # Checked before the heavy reads so an unchanged dashboard costs two point reads.
+    # The month is in scope because the due shown rolls over with it.
+    month = utcnow().strftime("%Y-%m")
+    etag = society_etag(society['id'], society.get('version', 0), "dashboard-user", current_user.id, read_state['v'], month)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    (receipts, receipts_cursor), notifications, due = await asyncio.gather(
+        fence.run(
+            fetch_page, stale_db.for_society(current_user.society_id).payments,
+            {"user_id": current_user.id, "status": "completed"}, None, DEFAULT_PAGE_SIZE
+        ),
+        fence.run(load_notifications, current_user, read_state),
+        find_due(society_db, current_user.id, month)
+    )
+    
+    maintenance = maintenance_due(current_user, society, due)
+    return tagged_response({
+        "user": current_user,
+        "society": public_society(society),
+        "maintenance": maintenance,
+        "receipts": receipts,
+        "receipts_cursor": receipts_cursor,
+        "notifications": notifications
+    }, etag)
+
+@api_router.get("/dashboard/chairman")
+async def get_chairman_dashboard(request: Request, current_user: User = Depends(get_current_user)):
+    if current_user.role != "chairman":
+        raise HTTPException(status_code=403, detail="Only chairmen can view the chairman dashboard")
+    
+    if not current_user.society_id:
+        return tagged_response({"user": current_user, "society": None})
+    
+    society_id = current_user.society_id
+    fence = CausalFence(client)
+    society = await fence.run(db.societies.find_one, {"id": society_id}, {"_id": 0})
+    if not society:
+        raise HTTPException(status_code=404, detail="Society not found")
+    if society['chairman_id'] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the chairman can view this dashboard")
+    
+    year = utcnow().year
+    etag = society_etag(society_id, society.get('version', 0), "dashboard-chairman", year)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    members, (payments, payments_cursor), ledger = await asyncio.gather(
+        db.users.find({"society_id": society_id, "role": "user"}, {"_id": 0}).to_list(1000),
+        fence.run(fetch_page, stale_db.for_society(society_id).payments, {"society_id": society_id}, None, DEFAULT_PAGE_SIZE),
+        get_year(db.for_society(society_id), society_id, year)
+    )
+    
+    return tagged_response({
+        "user": current_user,
+        "society": public_society(society),
+        "members": members,
+        "payments": payments,
+        "payments_cursor": payments_cursor,
+        "ledger": ledger
+    }, etag)
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -577,8 +1256,40 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Retry-After"],
 )
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+app.add_middleware(MetricsMiddleware)
+
+def _service_gauges() -> dict:
+    auth = auth_cache_stats()
+    hub = notification_hub.stats()
+    return {
+        "auth_token_cache_hits_total": auth["tokens"]["hits"],
+        "auth_token_cache_misses_total": auth["tokens"]["misses"],
+        "auth_user_cache_hits_total": auth["users"]["hits"],
+        "auth_user_cache_misses_total": auth["users"]["misses"],
+        "auth_revocation_checks_total": auth["revocations"]["checks"],
+        "auth_revocation_bloom_false_positives_total": auth["revocations"]["false_positives"],
+        "analytics_cache_hits_total": analytics_cache.hits,
+        "analytics_cache_misses_total": analytics_cache.misses,
+        "notification_stream_connections": hub["connections"],
+        "notification_stream_dropped_total": hub["dropped"],
+        **{f'rate_limit_rejected_total{{policy="{name}"}}': n for name, n in rate_limiter.rejected.items()},
+    }
+
+metrics_registry.add_gauges(_service_gauges)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return render_prometheus()
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    if not getattr(app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
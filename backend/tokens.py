@@ -0,0 +1,226 @@
+"""Access/refresh tokens, signing-key rotation and revocation.
+
+Every login opens a session (``sid``). It yields a short-lived access token
+and a refresh token, both HS256 JWTs carrying the session id. Each
+``/auth/refresh`` rotates the refresh token. Presenting an already-rotated
+refresh token means it leaked, and the whole session is revoked.
+
+Signing keys are listed in ``JWT_KEYS`` as ``kid:secret`` pairs. New tokens
+are signed with ``JWT_ACTIVE_KID``; any listed key verifies. To rotate, add
+the new key, make it active, and drop the old one once
+``JWT_REFRESH_TTL_DAYS`` has passed. Without ``JWT_KEYS`` the single
+``JWT_SECRET`` is used under kid ``default``.
+
+Revoked sessions are stored in ``revoked_sessions`` (TTL'd at the refresh
+expiry) and mirrored in a per-process Bloom filter. The per-request check
+is a few hash probes. Only a filter hit costs a Mongo lookup to rule out a
+false positive. Other workers' revocations are pulled in every
+``REVOCATION_SYNC_SECONDS``.
+"""
+import asyncio
+import hashlib
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import jwt
+
+from codec import utcnow
+
+logger = logging.getLogger(__name__)
+
+REVOKED_COLLECTION = "revoked_sessions"
+SESSIONS_COLLECTION = "refresh_sessions"
+JWT_ALGORITHM = "HS256"
+
+
+class TokenError(Exception):
+    """The token is missing, malformed, expired or revoked; maps to a 401."""
+
+
+class KeyRing:
+    def __init__(self, keys: Dict[str, str], active_kid: str):
+        if active_kid not in keys:
+            raise ValueError(f"JWT_ACTIVE_KID {active_kid!r} is not in JWT_KEYS")
+        self.keys = keys
+        self.active_kid = active_kid
+
+    @classmethod
+    def from_spec(cls, spec: str, active_kid: Optional[str], fallback_secret: str) -> "KeyRing":
+        keys = {}
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            kid, secret = item.split(":", 1)
+            keys[kid.strip()] = secret.strip()
+        if not keys:
+            keys = {"default": fallback_secret}
+        return cls(keys, active_kid or next(iter(keys)))
+
+    def sign(self, payload: dict) -> str:
+        return jwt.encode(payload, self.keys[self.active_kid], algorithm=JWT_ALGORITHM,
+                          headers={"kid": self.active_kid})
+
+    def decode(self, token: str) -> dict:
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            key = self.keys.get(kid)
+            if key is None:
+                raise TokenError("Invalid token")
+            return jwt.decode(token, key, algorithms=[JWT_ALGORITHM],
+                              options={"require": ["exp", "jti", "sid", "typ"]})
+        except jwt.ExpiredSignatureError:
+            raise TokenError("Token expired")
+        except jwt.InvalidTokenError:
+            raise TokenError("Invalid token")
+
+
+class BloomFilter:
+    def __init__(self, bits: int = 1 << 20, hashes: int = 7):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray(bits // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        # Double hashing: k positions from two 64-bit halves
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationList:
+    def __init__(self, db, bits: int = 1 << 20, sync_seconds: float = 10, rebuild_seconds: float = 3600):
+        self.db = db
+        self.bits = bits
+        self.sync_seconds = sync_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.bloom = BloomFilter(bits)
+        self.loaded = False
+        self._synced_to: Optional[datetime] = None
+        self.stats = {"checks": 0, "bloom_hits": 0, "false_positives": 0}
+
+    async def _pull(self, bloom: BloomFilter, since: Optional[datetime]) -> datetime:
+        now = utcnow()
+        query = {"revoked_at": {"$gt": since}} if since else {}
+        async for doc in self.db[REVOKED_COLLECTION].find(query, {"_id": 0, "sid": 1}):
+            bloom.add(doc['sid'])
+        return now
+
+    async def load(self) -> None:
+        """Rebuild the filter from scratch, which also forgets revocations that have expired."""
+        bloom = BloomFilter(self.bits)
+        synced_to = await self._pull(bloom, None)
+        self.bloom, self._synced_to, self.loaded = bloom, synced_to, True
+
+    async def run_sync(self) -> None:
+        """Keep the filter current; run as a background task."""
+        rebuilt_at = asyncio.get_running_loop().time()
+        while True:
+            try:
+                if not self.loaded or asyncio.get_running_loop().time() - rebuilt_at > self.rebuild_seconds:
+                    await self.load()
+                    rebuilt_at = asyncio.get_running_loop().time()
+                else:
+                    # Overlap one interval so clock skew between workers can't hide an entry
+                    self._synced_to = await self._pull(self.bloom, self._synced_to - timedelta(seconds=self.sync_seconds))
+            except Exception as e:
+                logger.error(f"Revocation sync failed: {e}")
+            await asyncio.sleep(self.sync_seconds)
+
+    async def revoke(self, sid: str, until: datetime) -> None:
+        await self.db[REVOKED_COLLECTION].update_one(
+            {"sid": sid},
+            {"$set": {"revoked_at": utcnow(), "expires_at": until}},
+            upsert=True
+        )
+        self.bloom.add(sid)
+
+    async def is_revoked(self, sid: str) -> bool:
+        self.stats["checks"] += 1
+        if self.loaded and sid not in self.bloom:
+            return False
+        if self.loaded:
+            self.stats["bloom_hits"] += 1
+        revoked = await self.db[REVOKED_COLLECTION].find_one({"sid": sid}, {"_id": 1}) is not None
+        if self.loaded and not revoked:
+            self.stats["false_positives"] += 1
+        return revoked
+
+
+class TokenService:
+    def __init__(self, db, keyring: KeyRing, revocations: RevocationList,
+                 access_ttl: timedelta = timedelta(minutes=15), refresh_ttl: timedelta = timedelta(days=30)):
+        self.db = db
+        self.keyring = keyring
+        self.revocations = revocations
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+
+    def _token(self, typ: str, claims: dict, sid: str, ttl: timedelta, jti: Optional[str] = None) -> str:
+        now = utcnow()
+        return self.keyring.sign({
+            **claims,
+            "typ": typ,
+            "sid": sid,
+            "jti": jti or uuid.uuid4().hex,
+            "iat": now,
+            "exp": now + ttl
+        })
+
+    def access_token(self, user_id: str, phone_number: str, role: str, sid: Optional[str] = None) -> str:
+        claims = {"user_id": user_id, "phone_number": phone_number, "role": role}
+        return self._token("access", claims, sid or uuid.uuid4().hex, self.access_ttl)
+
+    def _pair(self, claims: dict, sid: str, refresh_jti: str) -> dict:
+        return {
+            "token": self.access_token(claims['user_id'], claims['phone_number'], claims['role'], sid),
+            "refresh_token": self._token("refresh", claims, sid, self.refresh_ttl, refresh_jti),
+            "expires_in": int(self.access_ttl.total_seconds())
+        }
+
+    async def issue(self, user_id: str, phone_number: str, role: str) -> dict:
+        """Open a new session and return its first token pair."""
+        sid, jti = uuid.uuid4().hex, uuid.uuid4().hex
+        await self.db[SESSIONS_COLLECTION].insert_one({
+            "sid": sid,
+            "user_id": user_id,
+            "current_jti": jti,
+            "expires_at": utcnow() + self.refresh_ttl
+        })
+        return self._pair({"user_id": user_id, "phone_number": phone_number, "role": role}, sid, jti)
+
+    async def verify(self, token: str, typ: str = "access") -> dict:
+        payload = self.keyring.decode(token)
+        if payload['typ'] != typ:
+            raise TokenError("Invalid token")
+        if await self.revocations.is_revoked(payload['sid']):
+            raise TokenError("Token revoked")
+        return payload
+
+    async def refresh(self, refresh_token: str) -> dict:
+        """Swap a refresh token for a new pair. Each refresh token works exactly once."""
+        payload = await self.verify(refresh_token, "refresh")
+        jti = uuid.uuid4().hex
+        session = await self.db[SESSIONS_COLLECTION].find_one_and_update(
+            {"sid": payload['sid'], "current_jti": payload['jti']},
+            {"$set": {"current_jti": jti, "expires_at": utcnow() + self.refresh_ttl}}
+        )
+        if session is None:
+            # Already rotated: someone else holds a copy of this refresh token
+            logger.warning(f"Refresh token reuse for session {payload['sid']}, revoking it")
+            await self.logout(payload['sid'])
+            raise TokenError("Token revoked")
+        return self._pair({k: payload[k] for k in ("user_id", "phone_number", "role")}, payload['sid'], jti)
+
+    async def logout(self, sid: str) -> None:
+        await self.revocations.revoke(sid, utcnow() + self.refresh_ttl)
+        await self.db[SESSIONS_COLLECTION].delete_one({"sid": sid})
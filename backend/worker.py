@@ -0,0 +1,39 @@
+"""Out-of-process job worker.
+
+    python -m backend.worker            # from the repository root
+    python worker.py                    # from backend/
+
+Runs the same handlers as the web process (they are registered in
+server.py). Set ``JOB_WORKERS_INLINE=false`` on the web workers when jobs
+should only run here.
+"""
+import asyncio
+import logging
+import signal
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from indexes import ensure_indexes  # noqa: E402
+from server import client, db, job_queue  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await ensure_indexes(db)
+    job_queue.start()
+    await stop.wait()
+    logger.info("Stopping job worker")
+    await job_queue.stop()
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Per-request cost of authenticating a bearer token.
+
+Compares the old path (a full PyJWT decode on every request) with the new
+one: a claims-cache hit followed by the Bloom-filter revocation check. The
+first request for a token still pays the kid lookup and decode, which is
+shown as ``decode``. Also reports the filter's measured false-positive rate
+with ``--revoked`` sessions loaded. Runs in-process; no MongoDB needed.
+
+    python benchmarks/bench_auth.py [--requests 100000] [--revoked 100000]
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import jwt  # noqa: E402
+
+from cache import TTLCache  # noqa: E402
+from tokens import KeyRing, RevocationList, TokenService  # noqa: E402
+
+SECRET = "bench-secret"
+
+
+def per_call_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+async def per_call_us_async(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        await fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+async def run(requests: int, revoked: int) -> None:
+    revocations = RevocationList(db=None)
+    for _ in range(revoked):
+        revocations.bloom.add(uuid.uuid4().hex)
+    revocations.loaded = True
+    service = TokenService(None, KeyRing({"k1": SECRET, "k0": "old-secret"}, "k1"), revocations)
+
+    legacy = jwt.encode({"user_id": "u1", "phone_number": "9000000000", "role": "user", "exp": time.time() + 3600},
+                        SECRET, algorithm="HS256")
+    token = service.access_token("u1", "9000000000", "user")
+    cache = TTLCache(maxsize=10000, ttl=60)
+    cache.set(token, service.keyring.decode(token))
+
+    async def cached_path():
+        payload = cache.get(token)
+        await revocations.is_revoked(payload['sid'])
+
+    rows = [
+        ("legacy jwt.decode", per_call_us(lambda: jwt.decode(legacy, SECRET, algorithms=["HS256"]), requests)),
+        ("decode (cache miss)", per_call_us(lambda: service.keyring.decode(token), requests)),
+        ("bloom check only", per_call_us(lambda: "x" in revocations.bloom, requests)),
+        ("cache hit + revocation", await per_call_us_async(cached_path, requests)),
+    ]
+    for label, us in rows:
+        print(f"{label:<24} {us:8.2f} µs/request")
+
+    probes = [uuid.uuid4().hex for _ in range(100000)]
+    false_positives = sum(sid in revocations.bloom for sid in probes)
+    print(f"bloom: {revoked:,} revoked in {revocations.bits // 8 // 1024} KiB, "
+          f"false-positive rate {false_positives / len(probes):.4%} "
+          f"(each one costs a single indexed Mongo read)")
+    print(f"speedup on cached requests: {rows[0][1] / rows[3][1]:.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--revoked", type=int, default=100000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.revoked))
+
+
+if __name__ == "__main__":
+    main()
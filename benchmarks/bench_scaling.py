@@ -0,0 +1,113 @@
+"""Throughput of backend/run.py as the worker count grows.
+
+For each worker count, starts ``run.py --workers N`` on a local port. Once
+it answers ``/healthz``, it is driven for ``--duration`` seconds by
+``--clients`` load-generating processes, each holding ``--concurrency``
+keep-alive requests in flight. Requests per second are printed per worker
+count.
+
+The load generators share the machine with the server. Give them enough
+cores (or run them from another host with ``--url``) or they, not the
+server, become the ceiling. ``/healthz`` measures the HTTP/ASGI stack
+alone. Pass an authenticated API path to include Mongo, e.g.
+
+    python benchmarks/bench_scaling.py --workers 1,2,4,8
+    python benchmarks/bench_scaling.py --path "/api/society/search?query=green" --token "$TOKEN"
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+RUN_PY = Path(__file__).resolve().parent.parent / "backend" / "run.py"
+
+
+async def _drive(url: str, headers: dict, concurrency: int, duration: float) -> tuple:
+    ok = errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=10) as http:
+        async def loop():
+            nonlocal ok, errors
+            while time.perf_counter() < deadline:
+                try:
+                    response = await http.get(url)
+                    if response.status_code < 400:
+                        ok += 1
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return ok, errors
+
+
+def _client(args: tuple) -> tuple:
+    return asyncio.run(_drive(*args))
+
+
+def wait_healthy(base_url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/healthz", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{base_url} did not become healthy within {timeout}s")
+
+
+def measure(base_url: str, args) -> tuple:
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    job = (f"{base_url}{args.path}", headers, args.concurrency, args.duration)
+    with multiprocessing.Pool(args.clients) as pool:
+        results = pool.map(_client, [job] * args.clients)
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return ok / args.duration, errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4, os.cpu_count() or 1)))
+    parser.add_argument("--path", default="/healthz")
+    parser.add_argument("--token")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="benchmark an already running server instead of starting run.py")
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    if args.url:
+        rps, errors = measure(args.url, args)
+        print(f"{args.url}: {rps:10,.0f} req/s  errors={errors}")
+        return
+
+    baseline = None
+    for workers in sorted({int(n) for n in args.workers.split(",")}):
+        server = subprocess.Popen(
+            [sys.executable, str(RUN_PY), "--workers", str(workers), "--port", str(args.port), "--host", "127.0.0.1",
+             "--allow-per-worker-state"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+        try:
+            wait_healthy(base_url)
+            rps, errors = measure(base_url, args)
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+        baseline = baseline or rps
+        print(f"workers={workers:<3} {rps:10,.0f} req/s  x{rps / baseline:4.2f}  errors={errors}")
+
+
+if __name__ == "__main__":
+    main()
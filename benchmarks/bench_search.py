@@ -0,0 +1,138 @@
+"""Compare the old unanchored regex society search with the token-prefix index.
+
+Both strategies run as MongoDB queries against the database in backend/.env:
+the old case-insensitive ``$regex`` on ``name`` and ``search.find_societies``.
+Societies are seeded into a scratch ``bench_search_<n>`` database, kept
+between runs. Pass ``--model`` for a quick in-memory model instead (no
+database): a Python regex scan over every name against bisecting a sorted
+token list the way MongoDB range-scans the ``name_tokens`` B-tree.
+
+    python benchmarks/bench_search.py [--sizes 10000,100000,1000000] [--model]
+"""
+import argparse
+import asyncio
+import bisect
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from search import normalize, prefix_range, search_fields  # noqa: E402
+
+WORDS = [
+    "green", "valley", "heights", "residency", "park", "royal", "palm", "meadows",
+    "sai", "krishna", "lake", "view", "sunrise", "shanti", "nagar", "towers",
+    "orchid", "enclave", "galaxy", "silver", "oak", "apartments", "gardens", "vihar",
+]
+QUERIES = ["gre", "green val", "palm", "shanti nagar", "tow", "orchid enc", "zzz"]
+
+
+def make_names(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [f"{' '.join(rng.sample(WORDS, rng.randint(2, 4))).title()} {i}" for i in range(n)]
+
+
+def timed(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def in_memory(n: int, repeat: int) -> dict:
+    names = make_names(n)
+    postings = sorted((token, i) for i, name in enumerate(names) for token in search_fields(name)["name_tokens"])
+    keys = [token for token, _ in postings]
+
+    def regex_search(query):
+        pattern = re.compile(query, re.IGNORECASE)
+        return [name for name in names if pattern.search(name)][:20]
+
+    def prefix_search(query):
+        *complete, prefix = normalize(query).split()
+        bounds = prefix_range(prefix)
+        lo = bisect.bisect_left(keys, bounds["$gte"])
+        hi = bisect.bisect_left(keys, bounds["$lt"])
+        hits = []
+        for _, i in postings[lo:hi]:
+            tokens = names[i].lower().split()
+            if all(t in tokens for t in complete):
+                hits.append(names[i])
+                if len(hits) >= 200:
+                    break
+        return hits[:20]
+
+    result = {}
+    for label, fn in (("regex", regex_search), ("prefix", prefix_search)):
+        samples = []
+        for query in QUERIES:
+            samples += timed(lambda: fn(query), repeat)
+        result[label] = samples
+    return result
+
+
+async def against_mongo(n: int, repeat: int) -> dict:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from indexes import ensure_indexes
+    from search import find_societies
+
+    load_dotenv(Path(__file__).resolve().parent.parent / "backend" / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[f"bench_search_{n}"]
+    try:
+        if await db.societies.estimated_document_count() != n:
+            await db.societies.drop()
+            names = make_names(n)
+            for start in range(0, n, 10000):
+                await db.societies.insert_many([
+                    {"id": str(i), "name": name, "address": "", "chairman_id": str(i), **search_fields(name)}
+                    for i, name in enumerate(names[start:start + 10000], start)
+                ])
+        await ensure_indexes(db)
+
+        async def regex_search(query):
+            await db.societies.find({"name": {"$regex": re.escape(query), "$options": "i"}}, {"_id": 0}).to_list(20)
+
+        result = {}
+        for label, fn in (("regex", regex_search), ("prefix", lambda q: find_societies(db, q))):
+            samples = []
+            for query in QUERIES:
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    await fn(query)
+                    samples.append((time.perf_counter() - started) * 1000)
+            result[label] = samples
+        return result
+    finally:
+        client.close()
+
+
+def report(n: int, result: dict) -> None:
+    for label, samples in result.items():
+        samples.sort()
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        print(f"{n:>9,}  {label:<7} p50={statistics.median(samples):9.3f}ms  p95={p95:9.3f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--model", action="store_true", help="time an in-memory model instead of MongoDB")
+    args = parser.parse_args()
+
+    for n in (int(s) for s in args.sizes.split(",")):
+        result = in_memory(n, args.repeat) if args.model else asyncio.run(against_mongo(n, args.repeat))
+        report(n, result)
+
+
+if __name__ == "__main__":
+    main()
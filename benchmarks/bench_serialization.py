@@ -0,0 +1,100 @@
+"""Per-request CPU spent encoding a page of payments.
+
+Encodes one ``/society/{id}/payments`` page (``--page`` documents as read
+from Mongo) three ways:
+
+* ``legacy``: what FastAPI did for a handler returning plain dicts with no
+  ``response_model``. ``jsonable_encoder`` walks the page, then the stdlib
+  ``json`` renders it.
+* ``response_model``: validate against ``List[Payment]`` and serialise with
+  pydantic-core, then render with orjson.
+* ``direct``: ``tagged_response``, i.e. orjson straight from the documents.
+  This is what the read endpoints now return.
+
+Runs in-process; no MongoDB needed.
+
+    python benchmarks/bench_serialization.py [--page 100] [--requests 2000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from codec import ORJSONResponse, store_datetime, utcnow  # noqa: E402
+from server import Payment, tagged_response  # noqa: E402
+
+
+def payment_page(size: int) -> List[dict]:
+    now = utcnow()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "society_id": "s1",
+            "amount": 2500.0,
+            "razorpay_order_id": f"order_{n}",
+            "razorpay_payment_id": f"pay_{n}",
+            "razorpay_signature": uuid.uuid4().hex,
+            "status": "completed",
+            "payment_date": store_datetime(now - timedelta(days=n)),
+            "month": (now - timedelta(days=n)).strftime("%Y-%m"),
+            "user_name": f"Resident {n}",
+            "user_phone": f"90000{n:05d}",
+            "active_key": f"u{n}:2026-10",
+        }
+        for n in range(size)
+    ]
+
+
+def per_call_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    page = payment_page(args.page)
+    field = create_response_field(name="response", type_=List[Payment])
+    loop = asyncio.new_event_loop()
+
+    def legacy():
+        return JSONResponse(jsonable_encoder(page)).body
+
+    def response_model():
+        return ORJSONResponse(loop.run_until_complete(serialize_response(field=field, response_content=page))).body
+
+    def direct():
+        return tagged_response(page, '"etag"').body
+
+    rows = [("legacy", legacy), ("response_model", response_model), ("direct", direct)]
+    baseline = None
+    print(f"{args.page} payments per page, {args.requests} requests")
+    for name, fn in rows:
+        fn()
+        us = per_call_us(fn, args.requests)
+        baseline = baseline or us
+        print(f"{name:<16} {us:10.1f} us/request  x{baseline / us:5.1f}  {len(fn()):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
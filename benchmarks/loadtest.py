@@ -0,0 +1,338 @@
+"""Offline load-testing harness for the /api surface.
+
+Drives the FastAPI app in-process through ``httpx.ASGITransport`` (no
+network, no deployed preview) against a scratch MongoDB database, or against
+``mongomock_motor`` with ``--mongomock`` when no mongod is available
+(``pip install mongomock-motor``).
+
+It seeds N societies with M members and K months of payment history, then
+runs one or more traffic mixes concurrently:
+
+* ``dashboard``  - member and chairman dashboard loads (``/api/dashboard/*``)
+* ``legacy-dashboard`` - the same page views as the four separate calls
+  the dashboards made before, for comparison
+* ``payments``   - month-end burst of create-order + verify
+* ``broadcast``  - chairmen posting notices while members poll them
+
+Per-endpoint p50/p95/p99 latency and req/s are printed and written as JSON
+to ``benchmarks/results/`` so runs can be compared with ``--compare``.
+Responses a real client expects, such as create-order's 400 for a month
+that is already paid, are counted under ``exp`` rather than ``err``.
+
+    python benchmarks/loadtest.py --societies 20 --members 50 --months 12 \\
+        --mix dashboard,payments,broadcast --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    # nearest-rank
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.expected = defaultdict(int)
+
+    async def call(self, http, label: str, method: str, url: str, token: str, expected=None, **kwargs):
+        """``expected(response)`` marks 4xx outcomes that are part of the scenario, not failures."""
+        started = time.perf_counter()
+        response = await http.request(method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+        self.latencies[label].append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            if expected and expected(response):
+                self.expected[label] += 1
+            else:
+                self.errors[label] += 1
+        return response
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for label, samples in sorted(self.latencies.items()):
+            endpoints[label] = {
+                "count": len(samples),
+                "errors": self.errors[label],
+                "expected": self.expected[label],
+                "rps": round(len(samples) / elapsed, 1),
+                "p50_ms": round(percentile(samples, 50), 2),
+                "p95_ms": round(percentile(samples, 95), 2),
+                "p99_ms": round(percentile(samples, 99), 2),
+                "mean_ms": round(statistics.fmean(samples), 2),
+            }
+        return endpoints
+
+
+async def seed(server, societies: int, members: int, months: int) -> dict:
+    db = server.db
+    now = datetime.now(timezone.utc)
+    month_keys = []
+    year, month = now.year, now.month
+    for _ in range(months):
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+        month_keys.append(f"{year}-{month:02d}")
+
+    fixture = {"societies": []}
+    for s in range(societies):
+        chairman = server.User(phone_number=f"90{s:08d}", name=f"Chairman {s}", role="chairman")
+        society = server.Society(
+            name=f"Bench Society {s}",
+            address=f"{s} Bench Road",
+            chairman_id=chairman.id,
+            owner_maintenance_rate=2500.0,
+            tenant_maintenance_rate=2000.0,
+            **server.search_fields(f"Bench Society {s}")
+        )
+        chairman.society_id = society.id
+        users = [chairman]
+        payments = []
+        for m in range(members):
+            user = server.User(
+                phone_number=f"8{s:04d}{m:05d}",
+                name=f"Resident {s}-{m}",
+                role="user",
+                society_id=society.id,
+                user_type=random.choice(["owner", "tenant"])
+            )
+            users.append(user)
+            for month_key in month_keys:
+                payments.append(server.Payment(
+                    user_id=user.id,
+                    society_id=society.id,
+                    amount=2500.0,
+                    razorpay_order_id=f"order_seed_{uuid.uuid4().hex[:12]}",
+                    razorpay_payment_id=f"pay_seed_{uuid.uuid4().hex[:12]}",
+                    status="completed",
+                    month=month_key,
+                    user_name=user.name,
+                    user_phone=user.phone_number
+                ))
+
+        await db.users.insert_many([server.to_document(u) for u in users])
+        await db.societies.insert_one(server.to_document(society))
+        for start in range(0, len(payments), 5000):
+            await db.for_society(society.id).payments.insert_many([
+                server.to_document(p) for p in payments[start:start + 5000]
+            ])
+
+        fixture["societies"].append({
+            "id": society.id,
+            "chairman_token": server.create_jwt_token(chairman.id, chairman.phone_number, chairman.role),
+            "member_tokens": [server.create_jwt_token(u.id, u.phone_number, u.role) for u in users[1:]],
+            # create-order must quote the resident's rate exactly
+            "member_amounts": [
+                society.owner_maintenance_rate if u.user_type == "owner" else society.tenant_maintenance_rate
+                for u in users[1:]
+            ],
+        })
+
+    from ledger import rebuild_ledger
+    try:
+        await rebuild_ledger(db)
+    except Exception as e:  # mongomock has no $merge
+        print(f"ledger rebuild skipped: {e}")
+    return fixture
+
+
+async def dashboard(http, rec: Recorder, fixture: dict) -> None:
+    society = random.choice(fixture["societies"])
+    if random.random() < 0.8:
+        token = random.choice(society["member_tokens"])
+        await rec.call(http, "GET /dashboard/user", "GET", "/api/dashboard/user", token)
+    else:
+        await rec.call(http, "GET /dashboard/chairman", "GET", "/api/dashboard/chairman", society["chairman_token"])
+
+
+async def legacy_dashboard(http, rec: Recorder, fixture: dict) -> None:
+    society = random.choice(fixture["societies"])
+    sid = society["id"]
+    if random.random() < 0.8:
+        token = random.choice(society["member_tokens"])
+        await asyncio.gather(
+            rec.call(http, "GET /society/{id}/details", "GET", f"/api/society/{sid}/details", token),
+            rec.call(http, "GET /user/maintenance", "GET", "/api/user/maintenance", token),
+            rec.call(http, "GET /payment/receipts", "GET", "/api/payment/receipts", token),
+            rec.call(http, "GET /notifications", "GET", "/api/notifications", token),
+        )
+    else:
+        token = society["chairman_token"]
+        await asyncio.gather(
+            rec.call(http, "GET /society/{id}/details", "GET", f"/api/society/{sid}/details", token),
+            rec.call(http, "GET /society/{id}/members", "GET", f"/api/society/{sid}/members", token),
+            rec.call(http, "GET /society/{id}/payments", "GET", f"/api/society/{sid}/payments", token),
+            rec.call(http, "GET /society/{id}/ledger", "GET", f"/api/society/{sid}/ledger", token),
+        )
+
+
+def already_paid_or_in_flight(response) -> bool:
+    # Members tapping pay twice, or again after paying, during the burst
+    if response.status_code == 409:
+        return True
+    return response.status_code == 400 and response.json().get("detail") == "Payment already made for this month"
+
+
+async def payments(http, rec: Recorder, fixture: dict) -> None:
+    society = random.choice(fixture["societies"])
+    member = random.randrange(len(society["member_tokens"]))
+    token = society["member_tokens"][member]
+    month = datetime.now(timezone.utc).strftime("%Y-%m")
+    response = await rec.call(
+        http, "POST /payment/create-order", "POST", "/api/payment/create-order", token,
+        expected=already_paid_or_in_flight,
+        json={"amount": society["member_amounts"][member], "month": month}
+    )
+    if response.status_code == 200:
+        await rec.call(
+            http, "POST /payment/verify", "POST", "/api/payment/verify", token,
+            json={
+                "razorpay_order_id": response.json()["order_id"],
+                "razorpay_payment_id": f"pay_{uuid.uuid4().hex[:12]}",
+                "razorpay_signature": "mock"
+            }
+        )
+
+
+async def broadcast(http, rec: Recorder, fixture: dict) -> None:
+    society = random.choice(fixture["societies"])
+    if random.random() < 0.05:
+        await rec.call(
+            http, "POST /notifications/create", "POST", "/api/notifications/create", society["chairman_token"],
+            json={"message": f"Notice {uuid.uuid4().hex[:6]}"}
+        )
+    else:
+        token = random.choice(society["member_tokens"])
+        await rec.call(http, "GET /notifications", "GET", "/api/notifications", token)
+
+
+MIXES = {"dashboard": dashboard, "legacy-dashboard": legacy_dashboard, "payments": payments, "broadcast": broadcast}
+
+
+class SessionlessFence:
+    """Stand-in for readpref.CausalFence; mongomock has no sessions and no secondaries to fence."""
+
+    def __init__(self, client):
+        pass
+
+    async def run(self, fn, *args, **kwargs):
+        return await fn(*args, **kwargs)
+
+
+async def drop_databases(server) -> None:
+    """The directory database and every society partition."""
+    for name in {server.db.name, *server.db.partition_dbs}:
+        await server.client.drop_database(name)
+
+
+async def run(args) -> dict:
+    os.environ["DB_NAME"] = args.db_name
+    import httpx
+    import server
+
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        server.client = AsyncMongoMockClient(**server.CLIENT_OPTIONS)
+        server.db = server.stale_db = server.SocietyRouter(server.client[args.db_name], list(server.db.partition_dbs))
+        server.token_service.db = server.token_service.revocations.db = server.db
+        server.job_queue.db = server.auth_invalidations.db = server.db
+        server.CausalFence = SessionlessFence
+        # mongomock's find_one_and_update returns None when the pre-image projects
+        # to nothing, as next_notification_seq's does before a society's first notice
+        seed_society_fields = {"notification_seq": 0}
+    else:
+        seed_society_fields = {}
+        await drop_databases(server)
+        await server.ensure_indexes(server.db)
+
+    print(f"seeding {args.societies} societies x {args.members} members x {args.months} months ...")
+    fixture = await seed(server, args.societies, args.members, args.months)
+    if seed_society_fields:
+        await server.db.societies.update_many({}, {"$set": seed_society_fields})
+
+    scenarios = [MIXES[name] for name in args.mix.split(",")]
+    rec = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=server.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        async def one(i: int):
+            async with semaphore:
+                await scenarios[i % len(scenarios)](http, rec, fixture)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+    if not args.mongomock and not args.keep:
+        await drop_databases(server)
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k != "compare"},
+        "elapsed_s": round(elapsed, 3),
+        "total_rps": round(sum(len(s) for s in rec.latencies.values()) / elapsed, 1),
+        "endpoints": rec.summary(elapsed),
+    }
+
+
+def print_report(result: dict, baseline: dict = None) -> None:
+    print(f"\n{'endpoint':<32}{'count':>7}{'err':>5}{'exp':>5}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for label, row in result["endpoints"].items():
+        line = (
+            f"{label:<32}{row['count']:>7}{row['errors']:>5}{row.get('expected', 0):>5}"
+            f"{row['rps']:>9}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+        )
+        old = (baseline or {}).get("endpoints", {}).get(label)
+        if old and old["p95_ms"]:
+            line += f"   p95 {100 * (row['p95_ms'] - old['p95_ms']) / old['p95_ms']:+.1f}%"
+        print(line)
+    print(f"\ntotal: {result['total_rps']} req/s over {result['elapsed_s']}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--societies", type=int, default=10)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--mix", default="dashboard,payments,broadcast")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--db-name", default="society_maintenance_loadtest")
+    parser.add_argument("--mongomock", action="store_true", help="use mongomock_motor instead of a local mongod")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded database afterwards")
+    parser.add_argument("--compare", type=Path, help="earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_report(result, baseline)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    out = RESULTS_DIR / f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    out.write_text(json.dumps(result, indent=2))
+    print(f"results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,45 @@ axios.interceptors.request.use((config) => {
   return config;
 });
 
+// Access tokens are short-lived: on a 401, swap the refresh token once and retry.
+// Concurrent failures share a single refresh call.
+let refreshing = null;
+
+export const refreshTokens = () => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshing = (refreshToken
+      ? axios.post(`${API}/auth/refresh`, { refresh_token: refreshToken }, { skipAuthRefresh: true })
+      : Promise.reject(new Error('No refresh token'))
+    ).then((response) => {
+      localStorage.setItem('token', response.data.token);
+      localStorage.setItem('refresh_token', response.data.refresh_token);
+      return response.data.token;
+    }).catch((error) => {
+      localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
+      throw error;
+    }).finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+};
+
+axios.interceptors.response.use(
+  (response) => response,
+  async (error) => {
+    const config = error.config;
+    if (error.response?.status !== 401 || !config || config.skipAuthRefresh || config._retried) {
+      throw error;
+    }
+    config._retried = true;
+    const token = await refreshTokens();
+    config.headers.Authorization = `Bearer ${token}`;
+    return axios(config);
+  }
+);
+
 function App() {
   const [user, setUser] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -38,18 +77,26 @@ function App() {
         setUser(response.data);
       } catch (error) {
         localStorage.removeItem('token');
+        localStorage.removeItem('refresh_token');
       }
     }
     setLoading(false);
   };
 
-  const handleLogin = (userData, token) => {
+  const handleLogin = (userData, token, refreshToken) => {
     localStorage.setItem('token', token);
+    localStorage.setItem('refresh_token', refreshToken);
     setUser(userData);
   };
 
-  const handleLogout = () => {
+  const handleLogout = async () => {
+    try {
+      await axios.post(`${API}/auth/logout`);
+    } catch (error) {
+      // The session is dropped locally either way
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     setUser(null);
     toast.success('Logged out successfully');
   };
@@ -0,0 +1,25 @@
+import axios from 'axios';
+
+// The largest page the list endpoints serve (MAX_PAGE_SIZE in backend/pagination.py)
+export const MAX_PAGE_SIZE = 500;
+
+// One page of a cursor-paginated list endpoint, with the cursor for the next page (null on the last one)
+export async function fetchPage(url, cursor) {
+  const params = { limit: MAX_PAGE_SIZE };
+  if (cursor) params.cursor = cursor;
+  const response = await axios.get(url, { params });
+  return { rows: response.data, cursor: response.headers['x-next-cursor'] || null };
+}
+
+// Every row of a list endpoint. Pass the page already in hand (e.g. from a dashboard
+// response, with its `*_cursor`) to continue from it instead of starting over.
+export async function fetchAllPages(url, first = null) {
+  let { rows, cursor } = first || await fetchPage(url);
+  rows = [...(rows || [])];
+  while (cursor) {
+    const page = await fetchPage(url, cursor);
+    rows = rows.concat(page.rows);
+    cursor = page.cursor;
+  }
+  return rows;
+}
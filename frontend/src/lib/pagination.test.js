@@ -0,0 +1,41 @@
+import axios from 'axios';
+import { fetchAllPages } from './pagination';
+
+jest.mock('axios', () => ({ get: jest.fn() }));
+
+const PAYMENTS_URL = '/api/society/s1/payments';
+const payments = Array.from({ length: 250 }, (_, n) => ({ id: `pay_${n}`, status: 'completed' }));
+
+// Serves `payments` the way the backend does: `limit` rows after `cursor`, X-Next-Cursor while more remain
+const servePages = (pageSize) => async (url, { params }) => {
+  const start = params.cursor ? Number(params.cursor) : 0;
+  const end = start + Math.min(params.limit || pageSize, pageSize);
+  const headers = end < payments.length ? { 'x-next-cursor': String(end) } : {};
+  return { data: payments.slice(start, end), headers };
+};
+
+beforeEach(() => {
+  axios.get.mockReset();
+});
+
+test('a society with more than 100 payments shows all of them', async () => {
+  axios.get.mockImplementation(servePages(100));
+  const rows = await fetchAllPages(PAYMENTS_URL);
+  expect(rows.map((p) => p.id)).toEqual(payments.map((p) => p.id));
+  expect(axios.get).toHaveBeenCalledTimes(3);
+});
+
+test('continues from the first page a dashboard response carried', async () => {
+  axios.get.mockImplementation(servePages(500));
+  const first = { rows: payments.slice(0, 100), cursor: '100' };
+  const rows = await fetchAllPages(PAYMENTS_URL, first);
+  expect(rows).toHaveLength(250);
+  expect(axios.get).toHaveBeenCalledTimes(1);
+  expect(axios.get.mock.calls[0][1].params.cursor).toBe('100');
+});
+
+test('stops after a single page when there is no cursor', async () => {
+  const rows = await fetchAllPages(PAYMENTS_URL, { rows: payments.slice(0, 3), cursor: null });
+  expect(rows).toHaveLength(3);
+  expect(axios.get).not.toHaveBeenCalled();
+});
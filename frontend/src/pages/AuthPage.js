@@ -59,7 +59,7 @@ const AuthPage = ({ onLogin }) => {
         role: role
       });
       toast.success('Login successful!');
-      onLogin(response.data.user, response.data.token);
+      onLogin(response.data.user, response.data.token, response.data.refresh_token);
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Failed to verify OTP');
     } finally {
@@ -8,6 +8,7 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
 import { toast } from 'sonner';
 import { Building2, Users, CreditCard, Bell, LogOut, IndianRupee, Settings } from 'lucide-react';
+import { fetchAllPages } from '@/lib/pagination';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -16,6 +17,7 @@ const ChairmanDashboard = ({ user, onLogout }) => {
   const [society, setSociety] = useState(null);
   const [members, setMembers] = useState([]);
   const [payments, setPayments] = useState([]);
+  const [ledger, setLedger] = useState(null);
   const [loading, setLoading] = useState(false);
   const [showCreateSociety, setShowCreateSociety] = useState(false);
 
@@ -35,11 +37,20 @@ const ChairmanDashboard = ({ user, onLogout }) => {
 
   const loadData = async () => {
     if (user.society_id) {
-      await Promise.all([
-        loadSociety(),
-        loadMembers(),
-        loadPayments()
-      ]);
+      try {
+        const response = await axios.get(`${API}/dashboard/chairman`);
+        const { society, members, payments, payments_cursor, ledger } = response.data;
+        setSociety(society);
+        setMembers(members || []);
+        setPayments(payments || []);
+        setLedger(ledger || null);
+        // The dashboard carries the first page of payments; fetch the rest behind it
+        if (payments_cursor) {
+          setPayments(await fetchAllPages(`${API}/society/${society.id}/payments`, { rows: payments, cursor: payments_cursor }));
+        }
+      } catch (error) {
+        console.error('Failed to load dashboard:', error);
+      }
     }
   };
 
@@ -52,24 +63,6 @@ const ChairmanDashboard = ({ user, onLogout }) => {
     }
   };
 
-  const loadMembers = async () => {
-    try {
-      const response = await axios.get(`${API}/society/${user.society_id}/members`);
-      setMembers(response.data);
-    } catch (error) {
-      console.error('Failed to load members:', error);
-    }
-  };
-
-  const loadPayments = async () => {
-    try {
-      const response = await axios.get(`${API}/society/${user.society_id}/payments`);
-      setPayments(response.data);
-    } catch (error) {
-      console.error('Failed to load payments:', error);
-    }
-  };
-
   const handleCreateSociety = async (e) => {
     e.preventDefault();
     setLoading(true);
@@ -232,7 +225,7 @@ const ChairmanDashboard = ({ user, onLogout }) => {
                 </div>
                 <div>
                   <p className="text-sm text-gray-600">Total Payments</p>
-                  <p className="text-2xl font-bold" data-testid="total-payments">{payments.filter(p => p.status === 'completed').length}</p>
+                  <p className="text-2xl font-bold" data-testid="total-payments">{ledger ? ledger.totals.paid_count : 0}</p>
                 </div>
               </div>
             </CardContent>
@@ -247,7 +240,7 @@ const ChairmanDashboard = ({ user, onLogout }) => {
                 <div>
                   <p className="text-sm text-gray-600">Total Collected</p>
                   <p className="text-2xl font-bold" data-testid="total-collected">
-                    ₹{payments.filter(p => p.status === 'completed').reduce((sum, p) => sum + p.amount, 0).toLocaleString()}
+                    ₹{(ledger ? ledger.totals.paid_amount : 0).toLocaleString()}
                   </p>
                 </div>
               </div>
@@ -7,6 +7,7 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 import { toast } from 'sonner';
 import { Building2, CreditCard, Bell, LogOut, Search, Download, User, IndianRupee } from 'lucide-react';
+import { fetchAllPages } from '@/lib/pagination';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -32,6 +33,32 @@ const UserDashboard = ({ user, onLogout }) => {
     }
   }, []);
 
+  useEffect(() => {
+    if (!user.society_id) return;
+    let source;
+    let closed = false;
+    const connect = () => {
+      const token = localStorage.getItem('token');
+      source = new EventSource(`${API}/notifications/stream?token=${encodeURIComponent(token)}`);
+      source.addEventListener('notification', (event) => {
+        const notification = JSON.parse(event.data);
+        setNotifications((current) => [notification, ...current.filter(n => n.id !== notification.id)]);
+      });
+      source.onerror = () => {
+        // A rejected (expired) token closes the stream for good; any authed call refreshes it
+        if (source.readyState !== EventSource.CLOSED || closed) return;
+        axios.get(`${API}/auth/me`).then(() => {
+          if (!closed) connect();
+        }).catch(() => {});
+      };
+    };
+    connect();
+    return () => {
+      closed = true;
+      source.close();
+    };
+  }, [user.society_id]);
+
   const loadRazorpayScript = () => {
     const script = document.createElement('script');
     script.src = 'https://checkout.razorpay.com/v1/checkout.js';
@@ -41,50 +68,30 @@ const UserDashboard = ({ user, onLogout }) => {
   };
 
   const loadData = async () => {
-    await Promise.all([
-      loadSociety(),
-      loadMaintenance(),
-      loadReceipts(),
-      loadNotifications()
-    ]);
-  };
-
-  const loadSociety = async () => {
     try {
-      const response = await axios.get(`${API}/society/${user.society_id}/details`);
-      setSociety(response.data);
-    } catch (error) {
-      console.error('Failed to load society:', error);
-    }
-  };
-
-  const loadMaintenance = async () => {
-    try {
-      const response = await axios.get(`${API}/user/maintenance`);
-      setMaintenance(response.data);
+      const response = await axios.get(`${API}/dashboard/user`);
+      const { society, maintenance, receipts, receipts_cursor, notifications } = response.data;
+      setSociety(society);
+      setMaintenance(maintenance);
+      setReceipts(receipts || []);
+      setNotifications(notifications || []);
+      // The dashboard carries the first page of receipts; fetch the rest behind it
+      if (receipts_cursor) {
+        setReceipts(await fetchAllPages(`${API}/payment/receipts`, { rows: receipts, cursor: receipts_cursor }));
+      }
     } catch (error) {
-      console.error('Failed to load maintenance:', error);
+      console.error('Failed to load dashboard:', error);
     }
   };
 
   const loadReceipts = async () => {
     try {
-      const response = await axios.get(`${API}/payment/receipts`);
-      setReceipts(response.data);
+      setReceipts(await fetchAllPages(`${API}/payment/receipts`));
     } catch (error) {
       console.error('Failed to load receipts:', error);
     }
   };
 
-  const loadNotifications = async () => {
-    try {
-      const response = await axios.get(`${API}/notifications`);
-      setNotifications(response.data);
-    } catch (error) {
-      console.error('Failed to load notifications:', error);
-    }
-  };
-
   const handleSearchSociety = async () => {
     if (!searchQuery.trim()) return;
     setLoading(true);
@@ -417,7 +424,7 @@ const UserDashboard = ({ user, onLogout }) => {
                       <div>
                         <p className="text-sm text-gray-600">Unread Notifications</p>
                         <p className="text-2xl font-bold" data-testid="unread-notifications">
-                          {notifications.filter(n => !n.read_by?.includes(user.id)).length}
+                          {notifications.filter(n => !n.is_read).length}
                         </p>
                       </div>
                       <Bell className="w-10 h-10 text-gray-400" />
@@ -486,7 +493,7 @@ const UserDashboard = ({ user, onLogout }) => {
                       <div 
                         key={notification.id} 
                         className={`p-4 rounded-lg border ${
-                          notification.read_by?.includes(user.id) 
+                          notification.is_read
                             ? 'bg-gray-50 border-gray-200' 
                             : 'bg-blue-50 border-blue-200'
                         }`}
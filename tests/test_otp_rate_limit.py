@@ -0,0 +1,67 @@
+"""Brute-force protection on OTP verification.
+
+Needs a reachable MongoDB at MONGO_URL (backend/.env); it runs against a
+scratch database and is skipped when the server or backend deps are missing.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+httpx = pytest.importorskip("httpx")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DB_NAME", f"test_otp_{uuid.uuid4().hex[:8]}")
+
+
+def _mongo_available() -> bool:
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    load_dotenv(BACKEND_DIR / ".env")
+    try:
+        MongoClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=1000).admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not _mongo_available(), reason="MongoDB not reachable")
+
+
+async def _guess():
+    import server
+
+    phone = f"9{uuid.uuid4().int % 10**9:09d}"
+    guesses = server.RATE_LIMIT_POLICIES["otp_verify_phone"].capacity
+    login = {"phone_number": phone, "name": "Resident", "role": "user"}
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        try:
+            sent = await http.post("/api/auth/send-otp", json={"phone_number": phone})
+            assert sent.status_code == 200, sent.text
+            wrong = "000000" if sent.json()["otp"] != "000000" else "111111"
+
+            for _ in range(guesses):
+                response = await http.post("/api/auth/verify-otp", json={**login, "otp": wrong})
+                assert response.status_code == 400, response.text
+
+            blocked = await http.post("/api/auth/verify-otp", json={**login, "otp": wrong})
+            assert blocked.status_code == 429
+            assert int(blocked.headers["Retry-After"]) >= 1
+            # Past the limit even the right code is refused, so guessing on gains nothing
+            right = await http.post("/api/auth/verify-otp", json={**login, "otp": sent.json()["otp"]})
+            assert right.status_code == 429
+        finally:
+            await server.client.drop_database(server.db.name)
+
+
+def test_guess_past_the_limit_is_rejected():
+    asyncio.run(_guess())
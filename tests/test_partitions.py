@@ -0,0 +1,191 @@
+"""Society partitioning (backend/partitions.py).
+
+Placement and routing need only pymongo. The end-to-end check needs a
+reachable MongoDB at MONGO_URL (backend/.env) and is skipped without one;
+it spreads societies over scratch partition databases and drops them after.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("dotenv")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from partitions import SocietyRouter, UnroutedAccess, _plan, move_documents, placement, stranded_collections  # noqa: E402
+
+NAMES = ["society_p0", "society_p1", "society_p2", "society_p3"]
+SOCIETY_IDS = [str(uuid.UUID(int=n)) for n in range(4000)]
+
+
+def _router(names=NAMES):
+    from pymongo import MongoClient
+
+    return SocietyRouter(MongoClient("mongodb://localhost:1", connect=False)["directory"], names)
+
+
+def _mongo_url():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    load_dotenv(BACKEND_DIR / ".env")
+    url = os.environ.get("MONGO_URL")
+    if not url:
+        return None
+    try:
+        MongoClient(url, serverSelectionTimeoutMS=1000).admin.command("ping")
+    except PyMongoError:
+        return None
+    return url
+
+
+def test_placement_is_deterministic_and_even():
+    counts = Counter(placement(society_id, NAMES) for society_id in SOCIETY_IDS)
+    assert set(counts) == set(NAMES)
+    assert all(abs(n - len(SOCIETY_IDS) / len(NAMES)) < len(SOCIETY_IDS) * 0.05 for n in counts.values())
+    assert all(placement(s, NAMES) == placement(s, list(reversed(NAMES))) for s in SOCIETY_IDS[:100])
+
+
+def test_adding_a_partition_moves_only_its_share():
+    moves = _plan(NAMES, NAMES + ["society_p4"], SOCIETY_IDS)
+    assert set(moves) == {f"{name} -> society_p4" for name in NAMES}
+    moved = sum(map(len, moves.values()))
+    assert abs(moved - len(SOCIETY_IDS) / 5) < len(SOCIETY_IDS) * 0.05
+
+
+def test_partitioned_collections_need_a_society():
+    router = _router()
+    with pytest.raises(UnroutedAccess):
+        router.payments
+    with pytest.raises(UnroutedAccess):
+        router["notifications"]
+    with pytest.raises(UnroutedAccess):
+        router.for_society(None)
+    assert router.users.database.name == "directory"
+
+
+def test_society_view_splits_directory_and_partition():
+    router = _router()
+    view = router.for_society(SOCIETY_IDS[0])
+    assert view.name == placement(SOCIETY_IDS[0], NAMES)
+    assert view.payments.database.name == view.name
+    assert view.society_ledger.database.name == view.name
+    assert view.societies.database.name == "directory"
+    assert [db.name for db in router.databases_holding("payments")] == NAMES
+    assert [db.name for db in router.databases_holding("users")] == ["directory"]
+
+
+def test_unpartitioned_router_keeps_everything_in_directory():
+    router = _router(())
+    assert router.for_society(SOCIETY_IDS[0]).payments.database.name == "directory"
+    assert [view.name for view in router.partitions()] == ["directory"]
+
+
+@pytest.mark.skipif(_mongo_url() is None, reason="MongoDB not reachable")
+def test_payments_land_only_in_their_partition(monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("motor")
+    httpx = pytest.importorskip("httpx")
+
+    suffix = uuid.uuid4().hex[:8]
+    names = [f"test_part_{suffix}_{n}" for n in range(3)]
+    monkeypatch.setenv("DB_NAME", f"test_dir_{suffix}")
+    monkeypatch.setenv("SOCIETY_PARTITIONS", ",".join(names))
+
+    async def run():
+        import server
+
+        server.db = server.SocietyRouter.from_env(server.client)
+        server.stale_db = server.db
+        server.token_service.db = server.token_service.revocations.db = server.db
+        server.job_queue.db = server.auth_invalidations.db = server.db
+        await server.ensure_indexes(server.db)
+
+        residents = {}
+        for n in range(6):
+            chairman = server.User(phone_number=f"91{suffix[:4]}{n:04d}", name="Chair", role="chairman")
+            society = server.Society(
+                name=f"Part {n}", address="1 Shard Rd", chairman_id=chairman.id, owner_maintenance_rate=2500.0
+            )
+            resident = server.User(
+                phone_number=f"92{suffix[:4]}{n:04d}", name="Resident", role="user",
+                society_id=society.id, user_type="owner"
+            )
+            await server.db.societies.insert_one(server.to_document(society))
+            await server.db.users.insert_many([server.to_document(chairman), server.to_document(resident)])
+            residents[society.id] = resident
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            try:
+                for society_id, resident in residents.items():
+                    token = server.create_jwt_token(resident.id, resident.phone_number, resident.role)
+                    headers = {"Authorization": f"Bearer {token}"}
+                    order = await http.post(
+                        "/api/payment/create-order", json={"amount": 2500.0, "month": "2026-10"}, headers=headers
+                    )
+                    assert order.status_code == 200, order.text
+                    verify = {
+                        "razorpay_order_id": order.json()["order_id"],
+                        "razorpay_payment_id": f"pay_{society_id[:8]}",
+                        "razorpay_signature": "mock",
+                    }
+                    verified = await http.post("/api/payment/verify", json=verify, headers=headers)
+                    assert verified.status_code == 200, verified.text
+
+                for society_id in residents:
+                    home = server.db.partition_name(society_id)
+                    for name in names:
+                        count = await server.client[name].payments.count_documents({"society_id": society_id})
+                        assert count == (1 if name == home else 0)
+                    ledger = await server.db.for_society(society_id).society_ledger.find_one({"society_id": society_id})
+                    assert ledger["paid_count"] == 1
+                assert await server.client[os.environ["DB_NAME"]].payments.count_documents({}) == 0
+            finally:
+                for name in {server.db.name, *names}:
+                    await server.client.drop_database(name)
+
+    asyncio.run(run())
+
+
+@pytest.mark.skipif(_mongo_url() is None, reason="MongoDB not reachable")
+def test_move_relocates_directory_documents():
+    motor = pytest.importorskip("motor.motor_asyncio")
+
+    async def run():
+        client = motor.AsyncIOMotorClient(_mongo_url())
+        suffix = uuid.uuid4().hex[:8]
+        names = [f"test_move_{suffix}_{n}" for n in range(3)]
+        directory = client[f"test_move_{suffix}_dir"]
+        try:
+            await directory.payments.insert_many([{"society_id": s, "n": n} for s in SOCIETY_IDS[:20] for n in range(3)])
+            router = SocietyRouter(directory, names)
+            assert await stranded_collections(router) == ["payments"]
+
+            moved = await move_documents(router, batch_size=7)
+            assert sum(moved.values()) == 60
+            assert await stranded_collections(router) == []
+            for society_id in SOCIETY_IDS[:20]:
+                assert await router.for_society(society_id).payments.count_documents({"society_id": society_id}) == 3
+            assert await move_documents(router) == {}
+
+            # Dropping a partition empties it into the remaining ones
+            smaller = SocietyRouter(directory, names[:2])
+            await move_documents(smaller, [names[2]])
+            assert await client[names[2]].payments.count_documents({}) == 0
+            for society_id in SOCIETY_IDS[:20]:
+                assert await smaller.for_society(society_id).payments.count_documents({"society_id": society_id}) == 3
+        finally:
+            for name in [directory.name, *names]:
+                await client.drop_database(name)
+            client.close()
+
+    asyncio.run(run())
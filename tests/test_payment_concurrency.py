@@ -0,0 +1,94 @@
+"""Concurrency stress test for the payment state machine.
+
+Needs a reachable MongoDB at MONGO_URL (backend/.env); it runs against a
+scratch database and is skipped when the server or backend deps are missing.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+httpx = pytest.importorskip("httpx")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ["DB_NAME"] = f"test_payments_{uuid.uuid4().hex[:8]}"
+
+CONCURRENCY = 50
+
+
+def _mongo_available() -> bool:
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    load_dotenv(BACKEND_DIR / ".env")
+    try:
+        MongoClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=1000).admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not _mongo_available(), reason="MongoDB not reachable")
+
+
+async def _stress():
+    import server
+
+    await server.ensure_indexes(server.db)
+    chairman = server.User(phone_number="9000000001", name="Chair", role="chairman")
+    society = server.Society(
+        name="Race Society", address="1 Race Rd", chairman_id=chairman.id, owner_maintenance_rate=2500.0
+    )
+    resident = server.User(
+        phone_number="9000000002", name="Resident", role="user", society_id=society.id, user_type="owner"
+    )
+    await server.db.societies.insert_one(server.to_document(society))
+    await server.db.users.insert_many([server.to_document(chairman), server.to_document(resident)])
+    headers = {"Authorization": f"Bearer {server.create_jwt_token(resident.id, resident.phone_number, resident.role)}"}
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        try:
+            underpaid = await http.post("/api/payment/create-order", json={"amount": 1.0, "month": "2026-10"}, headers=headers)
+            assert underpaid.status_code == 400
+
+            orders = await asyncio.gather(*(
+                http.post("/api/payment/create-order", json={"amount": 2500.0, "month": "2026-10"}, headers=headers)
+                for _ in range(CONCURRENCY)
+            ))
+            ok = [r.json()["order_id"] for r in orders if r.status_code == 200]
+            assert ok, [r.text for r in orders]
+            assert all(r.status_code in (200, 409) for r in orders)
+            assert len(set(ok)) == 1
+
+            live = await server.db.for_society(society.id).payments.count_documents({"user_id": resident.id, "month": "2026-10", "status": "pending"})
+            assert live == 1
+
+            verify = {"razorpay_order_id": ok[0], "razorpay_payment_id": "pay_race", "razorpay_signature": "mock"}
+            verified = await asyncio.gather(*(
+                http.post("/api/payment/verify", json=verify, headers=headers) for _ in range(CONCURRENCY)
+            ))
+            assert all(r.status_code == 200 for r in verified), [r.text for r in verified]
+
+            payments = await server.db.for_society(society.id).payments.find({"user_id": resident.id}, {"_id": 0}).to_list(None)
+            assert [p["status"] for p in payments] == ["completed"]
+
+            ledger = await server.db.for_society(society.id).society_ledger.find_one({"society_id": society.id, "month": "2026-10"})
+            assert (ledger["paid_count"], ledger["pending_count"]) == (1, 0)
+
+            again = await http.post("/api/payment/create-order", json={"amount": 2500.0, "month": "2026-10"}, headers=headers)
+            assert again.status_code == 400
+        finally:
+            for name in {server.db.name, *server.db.partition_dbs}:
+                await server.client.drop_database(name)
+
+
+def test_concurrent_orders_and_verifies_never_duplicate():
+    asyncio.run(_stress())
@@ -0,0 +1,87 @@
+"""Read-preference routing and causal fencing (backend/readpref.py).
+
+The policy checks need only pymongo. The rest need a replica set at
+MONGO_URL (backend/.env); a single node is enough:
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 && mongosh --eval "rs.initiate()"
+    MONGO_URL="mongodb://localhost:27017/?replicaSet=rs0" pytest tests/test_read_routing.py
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("dotenv")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from readpref import MIN_MAX_STALENESS_SECONDS, CausalFence, stale_database, stale_read_preference  # noqa: E402
+
+
+def _replica_set_url():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    load_dotenv(BACKEND_DIR / ".env")
+    url = os.environ.get("MONGO_URL")
+    if not url:
+        return None
+    try:
+        hello = MongoClient(url, serverSelectionTimeoutMS=1000).admin.command("hello")
+    except PyMongoError:
+        return None
+    return url if hello.get("setName") else None
+
+
+needs_replica_set = pytest.mark.skipif(_replica_set_url() is None, reason="No MongoDB replica set at MONGO_URL")
+
+
+def test_stale_reads_prefer_secondaries_within_bound():
+    preference = stale_read_preference("secondaryPreferred", 300)
+    assert preference.mongos_mode == "secondaryPreferred"
+    assert preference.max_staleness == 300
+
+
+def test_staleness_bound_is_clamped_to_mongodb_minimum():
+    assert stale_read_preference("nearest", 5).max_staleness == MIN_MAX_STALENESS_SECONDS
+
+
+def test_primary_mode_disables_routing():
+    assert stale_read_preference("primary").mongos_mode == "primary"
+    with pytest.raises(ValueError):
+        stale_read_preference("secondaryish")
+
+
+@needs_replica_set
+def test_fenced_stale_read_sees_preceding_primary_write():
+    motor = pytest.importorskip("motor.motor_asyncio")
+
+    async def run():
+        client = motor.AsyncIOMotorClient(_replica_set_url())
+        db = client[f"test_readpref_{uuid.uuid4().hex[:8]}"]
+        stale = stale_database(db)
+        try:
+            assert stale.read_preference.mongos_mode == "secondaryPreferred"
+            assert stale.name == db.name
+
+            fence = CausalFence(client)
+            for n in range(20):
+                await fence.run(db.societies.update_one, {"id": "s1"}, {"$inc": {"version": 1}}, upsert=True)
+                society = await fence.run(stale.societies.find_one, {"id": "s1"})
+                assert society["version"] == n + 1
+            assert fence.operation_time is not None
+
+            # Concurrent fenced reads each get their own session
+            versions = await asyncio.gather(*(fence.run(stale.societies.find_one, {"id": "s1"}) for _ in range(10)))
+            assert {v["version"] for v in versions} == {20}
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    asyncio.run(run())